@@ -0,0 +1,120 @@
+#!/usr/bin/python
+import sys
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import add_common_arguments, get_environment, get_peak_rss, report, summarize
+
+from wand.color import Color  # noqa: E402
+from wand.drawing import Drawing  # noqa: E402
+from wand.image import Image as WandImage  # noqa: E402
+
+from helpers.image_processor import ImageProcessor  # noqa: E402
+from helpers.metrics import StageTimer  # noqa: E402
+
+# Screenshots: name, page width and height; twit card is drawn in the top left corner like in template page
+SCREENSHOTS = (
+    ("viewport", 1024, 768),
+    ("tall", 1024, 2048),
+    ("hidpi", 2048, 1536),
+)
+CARD_WIDTH, CARD_HEIGHT = 512, 360
+
+OPERATIONS = {
+    "decode_encode": {},
+    "crop": {"crop": {"left": 8, "top": 8, "width": CARD_WIDTH, "height": CARD_HEIGHT}},
+    "trim": {"trim": True},
+    "resize": {"resize_options": {"width": "512"}},
+    "trim_resize": {"trim": True, "resize_options": {"width": "512"}},
+}
+
+
+def make_screenshot(width: int, height: int) -> bytes:
+    """
+    Draws screenshot, similar to screenshot of rendered twit: white page with twit card, avatar and text lines.
+    Drawing is deterministic, so all runs post-process the same images.
+
+    :param width: page width (in px)
+    :param height: page height (in px)
+    :return: PNG image
+    """
+    scale = width // 1024
+    with WandImage(width=width, height=height, background=Color("white")) as img, Drawing() as draw:
+        draw.stroke_color = Color("#cfd9de")
+        draw.fill_color = Color("white")
+        draw.rectangle(left=8 * scale, top=8 * scale, width=CARD_WIDTH * scale, height=CARD_HEIGHT * scale,
+                       radius=12 * scale)
+        draw.stroke_color = Color("none")
+        draw.fill_color = Color("#1d9bf0")
+        draw.circle((40 * scale, 40 * scale), (60 * scale, 40 * scale))
+        draw.fill_color = Color("#0f1419")
+        for line in range(8):
+            line_width = (440 - (line * 37) % 120) * scale
+            draw.rectangle(left=24 * scale, top=(80 + line * 28) * scale, width=line_width, height=14 * scale)
+        draw(img)
+        img.format = "png"
+        return img.make_blob()
+
+
+def run_operation(blob: bytes, operations: dict, out_filename: str, iterations: int) -> dict:
+    """
+    Post-processes screenshot several times in single decode/encode pass, as post-processing stage does.
+
+    :param blob: PNG image
+    :param operations: operations, see ImageProcessor.apply_operations
+    :param out_filename: output image file name
+    :param iterations: number of iterations
+    :return: metrics
+    """
+    timer = StageTimer()
+    for _ in range(iterations):
+        started = time.monotonic()
+        ImageProcessor.post_process_image(out_filename, blob=blob, **operations)
+        timer.record(time.monotonic() - started)
+    metrics = summarize(timer, "latency")
+    metrics["ops_per_sec"] = timer.count / timer.total if timer.total else 0.0
+    return metrics
+
+
+def main():
+    """
+    The entry point of image post-processing microbenchmarks
+    """
+    parser = argparse.ArgumentParser(description="Microbenchmarks of trim and resize of twit screenshots.")
+    parser.add_argument("--iterations", nargs="?", type=int, default=20,
+                        help="Number of iterations of every operation. Default: 20")
+    parser.add_argument("--operations", nargs="*", default=sorted(OPERATIONS), choices=sorted(OPERATIONS),
+                        help="Operations to benchmark. Default: all")
+    add_common_arguments(parser)
+    command_line_args = parser.parse_args()
+
+    metrics = dict()
+    with tempfile.TemporaryDirectory(prefix="twits-benchmark-") as out_path:
+        out_filename = os.path.join(out_path, "out.png")
+        for name, width, height in SCREENSHOTS:
+            blob = make_screenshot(width, height)
+            # Warm up: first decoding loads ImageMagick coders
+            ImageProcessor.post_process_image(out_filename, blob=blob)
+            for operation in command_line_args.operations:
+                results = run_operation(blob, OPERATIONS[operation], out_filename, command_line_args.iterations)
+                for key, value in results.items():
+                    metrics[f"{name}_{operation}_{key}"] = value
+    metrics.update(get_peak_rss())
+
+    results = {
+        "parameters": {
+            "iterations": command_line_args.iterations,
+            "operations": sorted(command_line_args.operations),
+            "screenshots": [list(screenshot) for screenshot in SCREENSHOTS],
+        },
+        "environment": get_environment(),
+        "metrics": metrics,
+    }
+    sys.exit(report("image", results, command_line_args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+import sys
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from common import add_common_arguments, get_environment, get_peak_rss, report, summarize
+from fake_oembed_server import FakeOEmbedServer, WIDGETS_URL
+
+import exceptions  # noqa: E402
+import helpers.headless_browser as headless_browser  # noqa: E402
+import models  # noqa: E402
+from helpers.metrics import StageTimer  # noqa: E402
+from processor import TwitProcessor  # noqa: E402
+
+FIRST_TWIT_ID = 1000000000000000000
+
+
+class BrowserMemorySampler(threading.Thread):
+    def __init__(self, processor: TwitProcessor, interval: float = 0.2):
+        """
+        Samples total resident memory of pool browsers in background and keeps its peak.
+
+        :param processor: twit processor
+        :param interval: sampling interval (in sec)
+        """
+        super().__init__(name="memory-sampler", daemon=True)
+        self.processor = processor
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            memory = 0
+            for worker in self.processor.pool.workers:
+                browser = worker.browser
+                usage = browser.get_memory_usage() if browser is not None else None
+                memory += usage or 0
+            self.peak = max(self.peak, memory)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def get_twits(count: int, first_id: int) -> list:
+    return [models.Twit({"url": f"https://twitter.com/bench/status/{first_id + no}"}) for no in range(count)]
+
+
+def run_pipeline(processor: TwitProcessor, twits: list) -> dict:
+    """
+    Processes twits and measures throughput and latency of every twit, from taking it by pipeline to its result.
+
+    :param processor: twit processor
+    :param twits: Twit objects
+    :return: metrics
+    """
+    taken = dict()
+
+    def take(twits_to_take: list):
+        for twit in twits_to_take:
+            taken[twit.url] = time.monotonic()
+            yield twit
+
+    latency = StageTimer()
+    failed = 0
+    started = time.monotonic()
+    for twit, status in processor.process_twits(take(twits), update=True):
+        latency.record(time.monotonic() - taken.pop(twit.url))
+        if status != TwitProcessor.STATUS_PROCESSED:
+            failed += 1
+    duration = time.monotonic() - started
+
+    metrics = {
+        "twits": len(twits),
+        "failed": failed,
+        "duration_sec": duration,
+        "throughput": len(twits) / duration if duration else 0.0,
+    }
+    metrics.update(summarize(latency, "latency"))
+    for stage, summary in processor.metrics.summary().items():
+        metrics[f"stage_{stage}_p50_ms"] = summary["p50"] * 1000
+        metrics[f"stage_{stage}_p99_ms"] = summary["p99"] * 1000
+    return metrics
+
+
+def main():
+    """
+    The entry point of pipeline benchmark: full twit processing against local fake oEmbed API
+    """
+    logger = logging.getLogger("downloadTwits")
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    # noinspection SpellCheckingInspection
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s')
+    stdout_handler.setFormatter(formatter)
+    logger.addHandler(stdout_handler)
+
+    parser = argparse.ArgumentParser(description="Benchmark of twit render and post-processing pipeline.")
+    parser.add_argument("--config-file", nargs="?", default="config.json",
+                        help="Application configuration file; embed API and download settings are overridden")
+    parser.add_argument("--twits", nargs="?", type=int, default=100, help="Number of twits. Default: 100")
+    parser.add_argument("--warmup", nargs="?", type=int, default=5,
+                        help="Number of twits, processed before measuring. Default: 5")
+    parser.add_argument("--pool-size", nargs="?", type=int, default=None,
+                        help="Number of browsers. Default: from configuration")
+    parser.add_argument("--latency", nargs="?", type=float, default=0.05,
+                        help="Latency of fake oEmbed API, in seconds. Default: 0.05")
+    parser.add_argument("--logging", nargs="?", default="WARNING", help="Logging level. Default: WARNING")
+    add_common_arguments(parser)
+    command_line_args = parser.parse_args()
+    logger.setLevel(command_line_args.logging)
+
+    try:
+        app_config = models.AppConfig.load_from_file(command_line_args.config_file)
+    except Exception as e:
+        logger.error(f"Unexpected error while reading application config: {e}")
+        sys.exit(1)
+
+    server = FakeOEmbedServer(latency=command_line_args.latency)
+    server.start()
+    # Template page loads stub of Twitter widgets from fake server
+    headless_browser.WIDGETS_SCRIPT = headless_browser.WIDGETS_SCRIPT.replace(WIDGETS_URL, server.widgets_url)
+    app_config.embed_api.url = server.oembed_url
+    app_config.embed_cache = None
+    if command_line_args.pool_size:
+        app_config.headless_browser.pool_size = command_line_args.pool_size
+
+    with tempfile.TemporaryDirectory(prefix="twits-benchmark-") as download_path:
+        app_config.download.template = os.path.join(download_path, "{id}.png")
+        try:
+            processor = TwitProcessor(app_config, logger=logger)
+        except (exceptions.HeadlessBrowserException, exceptions.EmbedCacheException) as e:
+            logger.error(f"Unable to initialize twit processor: {e}")
+            server.stop()
+            sys.exit(1)
+        sampler = BrowserMemorySampler(processor)
+        try:
+            if command_line_args.warmup:
+                for _ in processor.process_twits(get_twits(command_line_args.warmup, FIRST_TWIT_ID), update=True):
+                    pass
+                processor.metrics.reset()
+            sampler.start()
+            metrics = run_pipeline(
+                processor,
+                get_twits(command_line_args.twits, FIRST_TWIT_ID + command_line_args.warmup)
+            )
+        finally:
+            if sampler.is_alive():
+                sampler.stop()
+            processor.close()
+            server.stop()
+
+    metrics["peak_browsers_rss_mb"] = sampler.peak / (1024 * 1024)
+    metrics.update(get_peak_rss())
+    if metrics["failed"]:
+        logger.warning(f"{metrics['failed']} twits are failed; results are not representative.")
+    postprocess_config = app_config.postprocess
+    results = {
+        "parameters": {
+            "twits": command_line_args.twits,
+            "latency": command_line_args.latency,
+            "browser": app_config.headless_browser.name,
+            "pool_size": app_config.headless_browser.pool_size,
+            "render_mode": app_config.headless_browser.render_mode,
+            "wait_mode": app_config.headless_browser.wait_mode,
+            "capture": app_config.headless_browser.capture,
+            "postprocess": postprocess_config.to_primitive() if postprocess_config else None,
+        },
+        "environment": get_environment(),
+        "metrics": metrics,
+    }
+    sys.exit(report("pipeline", results, command_line_args))
+
+
+if __name__ == "__main__":
+    main()
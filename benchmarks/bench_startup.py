@@ -0,0 +1,126 @@
+#!/usr/bin/python
+import sys
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+from common import SRC_PATH, add_common_arguments, get_environment, get_peak_rss, report, summarize
+
+import models  # noqa: E402
+from helpers.metrics import StageTimer  # noqa: E402
+
+IMPORT_TIME_REGEXP = re.compile(r"import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<module>.+)$")
+
+# Commands, which start-up time is measured; they are run in src directory
+COMMANDS = {
+    "cli_help": [sys.executable, "cli.py", "--help"],
+    "import_processor": [sys.executable, "-c", "import processor"],
+    "import_service": [sys.executable, "-c", "import service"],
+}
+
+
+def measure_command(command: list, runs: int) -> StageTimer:
+    """
+    Runs command several times in new interpreter and measures wall time of every run.
+
+    :param command: command arguments
+    :param runs: number of runs
+    :return: durations
+    """
+    timer = StageTimer()
+    for _ in range(runs):
+        started = time.monotonic()
+        subprocess.run(command, cwd=SRC_PATH, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timer.record(time.monotonic() - started)
+    return timer
+
+
+def get_slowest_imports(command: list, count: int) -> list:
+    """
+    Returns modules with the longest cumulative import time, reported by python -X importtime.
+
+    :param command: command arguments
+    :param count: number of modules
+    :return: module names and cumulative import times (in ms)
+    """
+    result = subprocess.run([command[0], "-X", "importtime", *command[1:]], cwd=SRC_PATH,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    imports = list()
+    for line in result.stderr.splitlines():
+        found = IMPORT_TIME_REGEXP.match(line)
+        if found is not None:
+            imports.append((found.group('module').strip(), int(found.group('cumulative')) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def measure_records(count: int) -> dict:
+    """
+    Measures reading and writing twits JSON Lines files, where every record is validated.
+
+    :param count: number of twits
+    :return: metrics
+    """
+    metrics = dict()
+    with tempfile.TemporaryDirectory(prefix="twits-benchmark-") as path:
+        in_filename, out_filename = os.path.join(path, "in.jsonl"), os.path.join(path, "out.jsonl")
+        with open(in_filename, 'w', encoding='utf-8') as f:
+            for no in range(count):
+                f.write(json.dumps({"url": f"https://twitter.com/bench/status/{no}", "image": f"{no}.png"}) + "\n")
+
+        started = time.monotonic()
+        twits = list(models.Twits.iter_from_file(in_filename))
+        duration = time.monotonic() - started
+        metrics["records_read_ops_per_sec"] = count / duration if duration else 0.0
+
+        started = time.monotonic()
+        with models.TwitsWriter(out_filename) as writer:
+            for twit in twits:
+                writer.write(twit)
+        duration = time.monotonic() - started
+        metrics["records_write_ops_per_sec"] = count / duration if duration else 0.0
+    return metrics
+
+
+def main():
+    """
+    The entry point of start-up benchmark: time of CLI start and imports, and validation of twit records
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of CLI start-up and twit records validation.")
+    parser.add_argument("--runs", nargs="?", type=int, default=10,
+                        help="Number of runs of every command. Default: 10")
+    parser.add_argument("--records", nargs="?", type=int, default=10000,
+                        help="Number of twit records to read and write. Default: 10000")
+    parser.add_argument("--slowest-imports", nargs="?", type=int, default=10,
+                        help="Number of the slowest imports of CLI to print. Default: 10")
+    add_common_arguments(parser)
+    command_line_args = parser.parse_args()
+
+    metrics = dict()
+    for name, command in COMMANDS.items():
+        metrics.update(summarize(measure_command(command, command_line_args.runs), name))
+    metrics.update(measure_records(command_line_args.records))
+    metrics.update(get_peak_rss())
+
+    if command_line_args.slowest_imports:
+        print(f"The slowest imports of {' '.join(COMMANDS['cli_help'][1:])}:")
+        for module, cumulative in get_slowest_imports(COMMANDS["cli_help"], command_line_args.slowest_imports):
+            print(f"  {module:<40} {cumulative:12.3f} ms")
+
+    results = {
+        "parameters": {
+            "runs": command_line_args.runs,
+            "records": command_line_args.records,
+        },
+        "environment": get_environment(),
+        "metrics": metrics,
+    }
+    sys.exit(report("startup", results, command_line_args))
+
+
+if __name__ == "__main__":
+    main()
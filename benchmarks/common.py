@@ -0,0 +1,147 @@
+import sys
+
+import json
+import os
+import platform
+import resource
+
+# Benchmarks use application modules the same way as src/cli.py does
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from helpers.metrics import StageTimer  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASELINE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Metrics, for which bigger value is better; for other metrics (durations, memory) smaller value is better
+HIGHER_IS_BETTER_SUFFIXES = ("throughput", "ops_per_sec")
+# Durations shorter than this (in ms) are dominated by noise and aren't compared
+MIN_COMPARED_DURATION = 1.0
+
+
+def summarize(timer: StageTimer, prefix: str) -> dict:
+    """
+    Returns latency percentiles of timer as flat benchmark metrics.
+
+    :param timer: durations
+    :param prefix: metric name prefix
+    :return: metrics (durations in ms)
+    """
+    summary = timer.summary()
+    return {f"{prefix}_{key}_ms": summary[key] * 1000 for key in ("mean", "p50", "p90", "p99", "max")}
+
+
+def get_peak_rss() -> dict:
+    """
+    Returns peak resident memory of benchmark process and its finished child processes.
+
+    :return: metrics (in MB)
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on Mac OS X
+    unit = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+        "peak_children_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit,
+    }
+
+
+def get_environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baseline(filename: str) -> dict:
+    if not os.path.exists(filename):
+        return dict()
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(filename: str, benchmark: str, results: dict):
+    """
+    Saves results of benchmark to baseline file; results of other benchmarks are kept.
+
+    :param filename: baseline file name
+    :param benchmark: benchmark name
+    :param results: benchmark results
+    """
+    baseline = load_baseline(filename)
+    baseline[benchmark] = results
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+    os.replace(temp_filename, filename)
+
+
+def compare(metrics: dict, baseline_metrics: dict, tolerance: float) -> list:
+    """
+    Compares benchmark metrics with baseline.
+
+    :param metrics: current metrics
+    :param baseline_metrics: baseline metrics
+    :param tolerance: allowed relative degradation, e.g. 0.1 for 10%
+    :return: rows (metric, baseline value, current value, change, is regression)
+    """
+    rows = list()
+    for name, value in sorted(metrics.items()):
+        baseline_value = baseline_metrics.get(name, None)
+        if not isinstance(baseline_value, (int, float)) or not baseline_value:
+            continue
+        if name.endswith("_ms") and max(value, baseline_value) < MIN_COMPARED_DURATION:
+            continue
+        change = (value - baseline_value) / baseline_value
+        higher_is_better = name.endswith(HIGHER_IS_BETTER_SUFFIXES)
+        regression = (-change if higher_is_better else change) > tolerance
+        rows.append((name, baseline_value, value, change, regression))
+    return rows
+
+
+def report(benchmark: str, results: dict, command_line_args) -> int:
+    """
+    Prints benchmark results, compares them with baseline and saves them, if requested.
+
+    :param benchmark: benchmark name
+    :param results: results: benchmark parameters, environment and metrics
+    :param command_line_args: parsed common arguments, see add_common_arguments
+    :return: exit code: 1, if any metric is regressed; 0 otherwise
+    """
+    print(f"Benchmark {benchmark}:")
+    for name, value in sorted(results["metrics"].items()):
+        print(f"  {name:<40} {value:12.3f}")
+    if command_line_args.output_file:
+        with open(command_line_args.output_file, 'w', encoding='utf-8') as f:
+            json.dump({benchmark: results}, f, indent=4, sort_keys=True)
+
+    exit_code = 0
+    baseline = load_baseline(command_line_args.baseline_file).get(benchmark, None)
+    if command_line_args.save_baseline:
+        save_baseline(command_line_args.baseline_file, benchmark, results)
+        print(f"Baseline is saved to {command_line_args.baseline_file}.")
+    elif baseline is None:
+        print(f"No baseline of {benchmark} in {command_line_args.baseline_file}; use --save-baseline to store it.")
+    else:
+        if baseline.get("parameters") != results["parameters"]:
+            print(f"Warning: baseline is measured with other parameters: {baseline.get('parameters')}.")
+        print(f"Comparison with baseline (tolerance {command_line_args.tolerance:.0%}):")
+        for name, baseline_value, value, change, regression in compare(
+                results["metrics"], baseline.get("metrics", {}), command_line_args.tolerance):
+            mark = "REGRESSION" if regression else ""
+            print(f"  {name:<40} {baseline_value:12.3f} -> {value:12.3f} {change:+8.1%} {mark}")
+            if regression:
+                exit_code = 1
+    return exit_code
+
+
+def add_common_arguments(parser):
+    parser.add_argument("--baseline-file", nargs="?", default=BASELINE_FILENAME,
+                        help="Baseline results file. Default: benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action='store_const', const=True,
+                        help="Save results as new baseline instead of comparing with it.")
+    parser.add_argument("--tolerance", nargs="?", type=float, default=0.1,
+                        help="Allowed degradation relative to baseline. Default: 0.1")
+    parser.add_argument("--output-file", nargs="?", default=None, help="JSON file, where results are saved.")
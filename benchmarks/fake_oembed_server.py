@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common import FIXTURES_PATH
+
+TWIT_ID_REGEXP = re.compile(r"/status/(?P<id>[0-9]+)")
+WIDGETS_URL = "https://platform.twitter.com/widgets.js"
+
+
+def load_embed_fixtures() -> list:
+    """
+    Returns canned embed HTML fixtures, sorted by file name.
+    """
+    embeds_path = os.path.join(FIXTURES_PATH, "embeds")
+    embeds = list()
+    for filename in sorted(os.listdir(embeds_path)):
+        if filename.endswith(".html"):
+            with open(os.path.join(embeds_path, filename), 'r', encoding='utf-8') as f:
+                embeds.append(f.read())
+    return embeds
+
+
+class FakeOEmbedRequestHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOEmbed/1.0"
+
+    def do_GET(self):
+        request_url = urlparse(self.path)
+        if request_url.path == "/widgets.js":
+            self.send_body(200, self.server.widgets_script, "application/javascript")
+            return
+        if request_url.path != "/oembed":
+            self.send_body(404, b"Not found.", "text/plain")
+            return
+        found = TWIT_ID_REGEXP.search(parse_qs(request_url.query).get('url', [""])[0])
+        if found is None:
+            self.send_body(404, b'{"error": "Twit is not found."}', "application/json")
+            return
+        self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        # Every twit gets the same fixture on every run, so results are reproducible
+        embeds = self.server.embeds
+        html = embeds[int(found.group('id')) % len(embeds)].replace(WIDGETS_URL, self.server.widgets_url)
+        self.send_body(200, json.dumps({"html": html, "type": "rich", "version": "1.0"}).encode('utf-8'),
+                       "application/json")
+
+    def send_body(self, status_code: int, body: bytes, content_type: str):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOEmbedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        """
+        Local Twitter oEmbed API, that returns canned embed fixtures; also serves stub of widgets.js,
+        so twits are rendered without network.
+
+        :param host: HTTP host
+        :param port: HTTP port; if 0, free port is used
+        :param latency: response delay (in sec), that simulates network and API latency
+        """
+        super().__init__((host, port), FakeOEmbedRequestHandler)
+        self.latency = latency
+        self.embeds = load_embed_fixtures()
+        with open(os.path.join(FIXTURES_PATH, "widgets.js"), 'rb') as f:
+            self.widgets_script = f.read()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def oembed_url(self) -> str:
+        return f"{self.base_url}/oembed"
+
+    @property
+    def widgets_url(self) -> str:
+        return f"{self.base_url}/widgets.js"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-oembed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,12 @@
+// Stub of Twitter widgets.js for benchmarks: marks twit blockquotes as rendered widgets without network requests,
+// so readiness waiting of the application works the same way as with real widgets.
+(function () {
+    function load(element) {
+        var blockquotes = (element || document).querySelectorAll('blockquote.twitter-tweet');
+        Array.prototype.forEach.call(blockquotes, function (blockquote) {
+            blockquote.className += ' twitter-tweet-rendered';
+        });
+    }
+    window.twttr = {widgets: {load: load}};
+    load(document);
+})();
@@ -6,8 +6,6 @@ import logging
 import os
 
 import exceptions
-import models
-from processor import TwitProcessor
 
 CURRENT_PATH = os.getcwd()
 
@@ -36,9 +34,25 @@ def main():
                         help="Name of image file. If several files in config, _1, _2 and etc. suffix added.")
     parser.add_argument("--update", action='store_const', const=True,
                         help="Update twit images, if they are already exist.")
+    parser.add_argument("--no-embed-cache", action='store_const', const=True,
+                        help="Don't use cache of Twitter embeds, even if it's configured.")
+    parser.add_argument("--refresh-embed-cache", action='store_const', const=True,
+                        help="Get Twitter embeds from API and update them in cache.")
+    parser.add_argument("--text-only", action='store_const', const=True,
+                        help="Get text and metadata of twits from Twitter embeds without rendering images.")
+    parser.add_argument("--manifest", nargs="?", default=None,
+                        help="Manifest file to resume processing; unchanged since last run twits are skipped.")
+    parser.add_argument("--metrics-file", nargs="?", default=None,
+                        help="JSON file, where durations of processing stages are saved.")
+    parser.add_argument("--prometheus-file", nargs="?", default=None,
+                        help="File, where durations of processing stages are saved in Prometheus text format.")
     parser.add_argument("twit", metavar="URL", type=str, nargs='?', default=None, help="Twit URL or JSON twits file")
     command_line_args = parser.parse_args()
 
+    # Models and processor import heavy dependencies, so they are imported after arguments are parsed
+    import models
+    from processor import TwitProcessor
+
     # # Sets application config
     try:
         app_config = models.AppConfig.load_from_file(command_line_args.config_file)
@@ -56,25 +70,41 @@ def main():
     if command_line_args.twits_file:
         # Reading twits from file
         logger.info(f"Getting twits from file {command_line_args.twits_file}...")
-        try:
-            twits = models.Twits.load_from_file(command_line_args.twits_file)
-        except exceptions.TwitsConfigValidationError as e:
-            logger.info(f"Unable to parse file {command_line_args.twits_file}, errors: {e}.")
-            sys.exit(1)
+        if models.Twits.is_json_lines_file(command_line_args.twits_file):
+            # Twits are read and validated one by one while processing
+            twits = models.Twits.iter_from_file(command_line_args.twits_file)
         else:
-            logger.info(f"Read {len(twits.twits)} twits from file {command_line_args.twits_file}")
+            try:
+                twits = models.Twits.load_from_file(command_line_args.twits_file).twits
+            except exceptions.TwitsConfigValidationError as e:
+                logger.info(f"Unable to parse file {command_line_args.twits_file}, errors: {e}.")
+                sys.exit(1)
+            else:
+                logger.info(f"Read {len(twits)} twits from file {command_line_args.twits_file}")
     else:
         logger.info(f"Getting twits from command line...")
-        twits = models.Twits()
-        twits.twits = list()
-        twits.twits.append(
-            models.Twit({"url": command_line_args.twit})
-        )
-        logger.info(f"Read {len(twits.twits)} twits from command line.")
+        twits = [models.Twit({"url": command_line_args.twit})]
+        logger.info(f"Read {len(twits)} twits from command line.")
 
     # Initializing twit processor
-    logger.info(f"Initializing twit processor for headless browser {app_config.headless_browser.name}...")
-    processor = TwitProcessor(app_config, logger=logger)
+    if command_line_args.text_only:
+        logger.info(f"Initializing twit processor in text only mode...")
+    else:
+        logger.info(f"Initializing twit processor for headless browser {app_config.headless_browser.name}...")
+    try:
+        processor = TwitProcessor(
+            app_config,
+            logger=logger,
+            use_embed_cache=not command_line_args.no_embed_cache,
+            refresh_embed_cache=bool(command_line_args.refresh_embed_cache),
+            manifest_file=command_line_args.manifest,
+            text_only=bool(command_line_args.text_only)
+        )
+    except exceptions.HeadlessBrowserException:
+        sys.exit(1)
+    except (exceptions.EmbedCacheException, exceptions.ManifestException) as e:
+        logger.error(f"{e}")
+        sys.exit(1)
 
     # Detecting saved file template
     if command_line_args.output_file:
@@ -84,34 +114,56 @@ def main():
     logger.debug(f"Image file template {app_config.download.template}")
 
     # Processing twits
-    updated_twits = models.Twits()
-    updated_twits.twits = list()
-    for twit in twits.twits:
-        twit_image_exists = bool(twit.get('image', None) and os.path.exists(os.path.join(
-            CURRENT_PATH,
-            app_config.download.path,
-            twit.get('image', None)
-        )))
-        if twit_image_exists and command_line_args.update != "update":
-            logger.info(f"Twit {twit.url} is already exist; skip.")
-            updated_twits.twits.append(twit)
+    updated_twits = None
+    twits_writer = None
+    if command_line_args.output_twits_file:
+        if models.Twits.is_json_lines_file(command_line_args.output_twits_file):
+            # Twits are written one by one after processing
+            logger.info(f"Saving twits to {command_line_args.output_twits_file} while processing...")
+            twits_writer = models.TwitsWriter(command_line_args.output_twits_file)
         else:
-            logger.info(f"Twit {twit.url} processing...")
-            updated_twit = processor.process_twit(twit)
-            if app_config.get('postprocess', None):
-                updated_twit = processor.post_process_twit(updated_twit)
-            if twit:
+            updated_twits = models.Twits()
+            updated_twits.twits = list()
+    twits_count = 0
+    try:
+        for twit, status in processor.process_twits(twits, update=bool(command_line_args.update)):
+            twits_count += 1
+            if status == TwitProcessor.STATUS_SKIPPED:
+                logger.info(f"Twit {twit.url} is already exist; skip.")
+            elif status == TwitProcessor.STATUS_PROCESSED and command_line_args.text_only:
+                logger.info(f"Twit {twit.url} text is updated successfully!")
+            elif status == TwitProcessor.STATUS_PROCESSED:
                 logger.info(f"Twit {twit.url} is updated successfully and saved to {twit.image}!")
-                updated_twits.twits.append(updated_twit)
             else:
                 logger.info(f"Twit {twit.url} can't updated. Check logs.")
+            if twits_writer is not None:
+                twits_writer.write(twit)
+            elif updated_twits is not None:
                 updated_twits.twits.append(twit)
+    except exceptions.TwitsConfigValidationError as e:
+        logger.error(f"Unable to process twits, errors: {e}.")
+        sys.exit(1)
+    finally:
+        processor.close()
+        if twits_writer is not None:
+            twits_writer.close()
 
-    if command_line_args.output_twits_file:
+    if updated_twits is not None:
         logger.info(f"Saving twits to {command_line_args.output_twits_file}...")
         updated_twits.save_to_file(command_line_args.output_twits_file)
 
-    logger.info(f"Finished. Thanks.")
+    logger.debug(f"Stage durations: {processor.metrics.summary()}")
+    try:
+        if command_line_args.metrics_file:
+            logger.info(f"Saving metrics to {command_line_args.metrics_file}...")
+            processor.metrics.save_json(command_line_args.metrics_file)
+        if command_line_args.prometheus_file:
+            logger.info(f"Saving metrics to {command_line_args.prometheus_file}...")
+            processor.metrics.save_prometheus(command_line_args.prometheus_file)
+    except OSError as e:
+        logger.error(f"Unable to save metrics: {e}.")
+
+    logger.info(f"Finished {twits_count} twits. Stats: {processor.stats()}. Thanks.")
 
 
 if __name__ == "__main__":
@@ -18,3 +18,21 @@ class HeadlessBrowserException(Exception):
 
 class TwitsConfigValidationError(Exception):
     pass
+
+
+class EmbedCacheException(Exception):
+    pass
+
+
+class ManifestException(Exception):
+    pass
+
+
+class RenderServiceRequestError(Exception):
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+class ShardQueueException(Exception):
+    pass
@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+import exceptions
+import models
+from helpers.headless_browser import HeadlessBrowser, create_browser
+
+
+class BrowserWorker:
+    def __init__(self, no: int, browser: HeadlessBrowser):
+        """
+
+        :param no: worker number in pool
+        :param browser: headless browser of worker
+        """
+        self.no = no
+        self.browser = browser
+        self.rendered = 0
+        self.render_time = 0.0
+        self.restarts = 0
+        self.renders_since_start = 0
+        self.restart_reason = None
+
+    @property
+    def average_render_time(self) -> float:
+        return self.render_time / self.rendered if self.rendered else 0.0
+
+    def record(self, render_time: float):
+        """
+        Records statistics of rendered twit.
+
+        :param render_time: twit render time (in sec)
+        """
+        self.rendered += 1
+        self.render_time += render_time
+
+    def kill(self):
+        """
+        Kills hung browser; it's restarted on next use.
+        """
+        self.restart_reason = "render timeout"
+        self.browser.kill()
+
+    def stats(self) -> str:
+        return f"browser #{self.no}: {self.rendered} twits, {self.average_render_time:.2f} sec avg, " \
+               f"{self.restarts} restarts"
+
+
+class BrowserPool:
+    def __init__(self, headless_browser_config: models.HeadlessBrowserConfig, size: int = 1, **kwargs):
+        """
+        Pool of supervised browsers: browsers are checked before every twit and restarted, if they don't respond,
+        hang longer than render timeout, rendered too many twits or use too much memory.
+
+        :param headless_browser_config: config of browsers in pool
+        :param size: number of browsers in pool
+        :param logger: application logger
+        """
+        self.config = headless_browser_config
+        self.size = size
+        self.logger = kwargs.get('logger', logging.getLogger("downloadTwits"))
+        self.workers = list()
+        self._idle_workers = queue.Queue()
+        # Number of browsers, that render at the same time; other browsers are idle
+        self.limit = size
+        self.contended = 0
+        self._active = 0
+        self._limit_condition = threading.Condition()
+        try:
+            for no in range(1, size + 1):
+                worker = BrowserWorker(no, create_browser(headless_browser_config))
+                self.workers.append(worker)
+                self._idle_workers.put(worker)
+        except Exception:
+            self.close()
+            raise
+
+    def restart(self, worker: BrowserWorker):
+        """
+        Restarts browser of worker.
+
+        :param worker: browser worker
+        """
+        self.logger.warning(f"Restarting browser #{worker.no}: {worker.restart_reason}.")
+        if worker.browser is not None:
+            worker.browser.quit()
+            worker.browser = None
+        worker.restarts += 1
+        error = None
+        for _ in range(self.config.restart_attempts):
+            try:
+                worker.browser = create_browser(self.config)
+            except exceptions.HeadlessBrowserException as e:
+                error = e
+            else:
+                worker.renders_since_start = 0
+                worker.restart_reason = None
+                return
+        raise exceptions.HeadlessBrowserException(f"Can't restart browser #{worker.no}: {error}")
+
+    def get_recycle_reason(self, worker: BrowserWorker) -> str or None:
+        """
+        Returns reason to recycle browser of worker: too many rendered twits or too much memory usage.
+
+        :param worker: browser worker
+        :return: reason or None, if browser shouldn't be recycled
+        """
+        if self.config.max_renders and worker.renders_since_start >= self.config.max_renders:
+            return f"{worker.renders_since_start} twits rendered"
+        if self.config.max_memory:
+            memory = worker.browser.get_memory_usage()
+            if memory is not None and memory > self.config.max_memory * 1024 * 1024:
+                return f"{memory // (1024 * 1024)} MB memory used"
+        return None
+
+    def set_limit(self, limit: int):
+        """
+        Sets number of browsers, that render at the same time.
+
+        :param limit: number of browsers, from 1 to pool size
+        """
+        with self._limit_condition:
+            self.limit = max(1, min(limit, self.size))
+            self._limit_condition.notify_all()
+
+    @contextmanager
+    def acquire(self) -> BrowserWorker:
+        """
+        Takes idle browser worker from pool, waits if all workers are busy or limit of rendering browsers is reached.
+        Browser is restarted, if it doesn't respond; browser is killed, if it's not released in render timeout.
+
+        :return: browser worker
+        """
+        with self._limit_condition:
+            if self._active >= self.limit:
+                self.contended += 1
+            while self._active >= self.limit:
+                self._limit_condition.wait()
+            self._active += 1
+        worker = self._idle_workers.get()
+        watchdog = None
+        try:
+            if worker.restart_reason is None and (worker.browser is None or not worker.browser.is_alive()):
+                worker.restart_reason = "browser is not responding"
+            if worker.restart_reason is not None:
+                self.restart(worker)
+            if self.config.render_timeout:
+                watchdog = threading.Timer(self.config.render_timeout, worker.kill)
+                watchdog.daemon = True
+                watchdog.start()
+            yield worker
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if worker.browser is not None:
+                worker.renders_since_start += 1
+                if worker.restart_reason is None:
+                    worker.restart_reason = self.get_recycle_reason(worker)
+            self._idle_workers.put(worker)
+            self._release_slot()
+
+    def _release_slot(self):
+        with self._limit_condition:
+            self._active -= 1
+            self._limit_condition.notify()
+
+    def stats(self) -> str:
+        return "; ".join(worker.stats() for worker in self.workers)
+
+    def close(self):
+        for worker in self.workers:
+            if worker.browser is not None:
+                worker.browser.quit()
@@ -0,0 +1,164 @@
+from typing import TYPE_CHECKING
+
+import exceptions
+from helpers.embed_parser import EmbedData, EmbedParser
+from helpers.headless_browser import HeadlessBrowser
+
+if TYPE_CHECKING:
+    from wand.drawing import Drawing
+    from wand.image import Image as WandImage
+
+CARD_WIDTH = 550
+CARD_PADDING = 20
+CARD_RADIUS = 12
+
+NAME_FONT_SIZE = 16
+TEXT_FONT_SIZE = 18
+TEXT_LINE_HEIGHT = 26
+DATE_FONT_SIZE = 14
+
+BACKGROUND_COLOR = "#ffffff"
+BORDER_COLOR = "#cfd9de"
+TEXT_COLOR = "#0f1419"
+SECONDARY_TEXT_COLOR = "#536471"
+
+
+class CardRenderer(HeadlessBrowser):
+    def __init__(self, **options):
+        """
+        Draws twit card from oEmbed HTML with ImageMagick, without browser: author, text and date of twit
+        are laid out by built-in card template. Card has no media, so twits with media should be rendered by browser.
+
+        :param font: font name or font file for card text; if not set, ImageMagick default font is used
+        """
+        super().__init__(**options)
+        try:
+            import wand.image  # noqa: F401
+        except ImportError:
+            raise exceptions.HeadlessBrowserException(
+                "ImageMagick is not installed in your system; required for card renderer."
+            )
+        self.embed_data = None
+
+    def render_html(self, embed_html: str) -> bool:
+        self.embed_data = EmbedParser.parse(embed_html)
+        return True
+
+    def wait_for_delay(self, delay: float) -> float:
+        # Card is drawn, when screenshot is taken
+        return 0.0
+
+    def wait_until_rendered(self, timeout: float, settle: float = 0.5, poll_interval: float = 0.1,
+                            count: int = 1) -> float:
+        return 0.0
+
+    def get_element_text(self, xpath: str) -> str or None:
+        # Card contains twit text only, so text is the same for XPaths of any embed layout
+        return self.embed_data.text if self.embed_data is not None else None
+
+    def get_screenshot_png(self) -> bytes:
+        if self.embed_data is None:
+            raise exceptions.HeadlessBrowserException("Twit is not rendered.")
+        return self.draw_card(self.embed_data)
+
+    def get_element_screenshot_png(self, css_selector: str) -> (bytes, dict or None) or None:
+        # Card is twit element itself
+        return self.get_screenshot_png(), None
+
+    def is_alive(self) -> bool:
+        return True
+
+    def quit(self):
+        self.embed_data = None
+
+    def set_font(self, draw: 'Drawing', font_size: int, color: str, bold: bool = False):
+        from wand.color import Color
+
+        if self.options.get('font'):
+            draw.font = self.options['font']
+        draw.font_size = font_size
+        draw.font_weight = 700 if bold else 400
+        draw.fill_color = Color(color)
+
+    @staticmethod
+    def wrap_text(draw: 'Drawing', img: 'WandImage', text: str, width: int) -> list:
+        """
+        Splits text into lines, which fit in width; words longer than width are broken.
+
+        :param draw: drawing with text font
+        :param img: image, used to measure text
+        :param text: text; new lines are kept
+        :param width: line width (in pixels)
+        :return: lines
+        """
+        def fits(line: str) -> bool:
+            return draw.get_font_metrics(img, line).text_width <= width
+
+        lines = list()
+        for paragraph in text.split("\n"):
+            line = ""
+            for word in paragraph.split():
+                candidate = f"{line} {word}" if line else word
+                if fits(candidate):
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                line = word
+                while len(line) > 1 and not fits(line):
+                    # Long word (e.g. link) is broken by characters
+                    cut = len(line) - 1
+                    while cut > 1 and not fits(line[:cut]):
+                        cut -= 1
+                    lines.append(line[:cut])
+                    line = line[cut:]
+            lines.append(line)
+        return lines
+
+    def draw_card(self, embed_data: EmbedData) -> bytes:
+        """
+        Draws twit card.
+
+        :param embed_data: twit data from oEmbed HTML
+        :return: PNG image
+        """
+        from wand.color import Color
+        from wand.drawing import Drawing
+        from wand.image import Image as WandImage
+
+        text_width = CARD_WIDTH - 2 * CARD_PADDING
+        with WandImage(width=1, height=1) as measure_img, Drawing() as measure_draw:
+            self.set_font(measure_draw, TEXT_FONT_SIZE, TEXT_COLOR)
+            lines = self.wrap_text(measure_draw, measure_img, embed_data.text or "", text_width)
+        header_height = NAME_FONT_SIZE * 2 + CARD_PADDING // 2
+        footer_height = CARD_PADDING // 2 + DATE_FONT_SIZE
+        height = 2 * CARD_PADDING + header_height + len(lines) * TEXT_LINE_HEIGHT + footer_height
+
+        with WandImage(width=CARD_WIDTH, height=height, background=Color(BACKGROUND_COLOR)) as img:
+            with Drawing() as draw:
+                draw.stroke_color = Color(BORDER_COLOR)
+                draw.fill_color = Color(BACKGROUND_COLOR)
+                draw.rectangle(left=0, top=0, right=CARD_WIDTH - 1, bottom=height - 1, radius=CARD_RADIUS)
+                draw.stroke_color = Color("none")
+
+                y = CARD_PADDING + NAME_FONT_SIZE
+                if embed_data.author_name:
+                    self.set_font(draw, NAME_FONT_SIZE, TEXT_COLOR, bold=True)
+                    draw.text(CARD_PADDING, y, embed_data.author_name)
+                if embed_data.author_screen_name:
+                    self.set_font(draw, NAME_FONT_SIZE, SECONDARY_TEXT_COLOR)
+                    draw.text(CARD_PADDING, y + NAME_FONT_SIZE + 4, f"@{embed_data.author_screen_name}")
+
+                y = CARD_PADDING + header_height + TEXT_FONT_SIZE
+                self.set_font(draw, TEXT_FONT_SIZE, TEXT_COLOR)
+                for line in lines:
+                    if line:
+                        draw.text(CARD_PADDING, y, line)
+                    y += TEXT_LINE_HEIGHT
+
+                if embed_data.date:
+                    self.set_font(draw, DATE_FONT_SIZE, SECONDARY_TEXT_COLOR)
+                    draw.text(CARD_PADDING, height - CARD_PADDING, embed_data.date)
+                draw(img)
+            img.format = "png"
+            return img.make_blob()
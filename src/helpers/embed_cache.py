@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import exceptions
+import models
+
+
+class EmbedCache:
+    def __init__(self, path: str, ttl: int = 604800, max_size: int = 67108864):
+        """
+        Persistent cache of Twitter embed HTML, stored in SQLite database.
+
+        :param path: database file path
+        :param ttl: time to live of cached embed (in sec)
+        :param max_size: maximum total size of cached embeds (in bytes); least recently used are evicted
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeds ("
+                "key TEXT PRIMARY KEY, html TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS embeds_accessed ON embeds (accessed)")
+            self._connection.commit()
+        except sqlite3.Error as e:
+            raise exceptions.EmbedCacheException(f"Can't open embed cache {path} because of error: {e}.")
+
+    @classmethod
+    def from_config(cls, embed_cache_config: models.EmbedCacheConfig):
+        return cls(embed_cache_config.path, ttl=embed_cache_config.ttl, max_size=embed_cache_config.max_size)
+
+    @staticmethod
+    def get_key(twit_id: str, embed_params: dict) -> str:
+        """
+        Returns cache key of twit embed.
+
+        :param twit_id: twit id
+        :param embed_params: Twitter embed parameters
+        :return: key (SHA-256 hex digest)
+        """
+        key_data = json.dumps([twit_id, sorted((embed_params or {}).items())], ensure_ascii=False)
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> str or None:
+        """
+        Returns cached embed HTML, if it is found and not expired; None otherwise.
+
+        :param key: cache key
+        :return: embed HTML or None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT html, created FROM embeds WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            html, created = row
+            if now - created > self.ttl:
+                self._connection.execute("DELETE FROM embeds WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            self._connection.execute("UPDATE embeds SET accessed = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+        return html
+
+    def put(self, key: str, html: str):
+        """
+        Saves embed HTML to cache and evicts expired and least recently used embeds.
+
+        :param key: cache key
+        :param html: embed HTML
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embeds (key, html, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, html, len(html.encode('utf-8')), now, now)
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float):
+        self._connection.execute("DELETE FROM embeds WHERE created < ?", (now - self.ttl,))
+        total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM embeds").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        evicted_keys = list()
+        for key, size in self._connection.execute("SELECT key, size FROM embeds ORDER BY accessed"):
+            if total_size <= self.max_size:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+        self._connection.executemany("DELETE FROM embeds WHERE key = ?", evicted_keys)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,132 @@
+import collections
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Data of twit from oEmbed blockquote
+EmbedData = collections.namedtuple(
+    "EmbedData", ["text", "author_name", "author_screen_name", "date", "lang", "links", "emoji", "has_media"]
+)
+
+AUTHOR_REGEXP = re.compile(r"^\s*(?:—|&mdash;|-)?\s*(?P<name>.*?)\s*\(@(?P<screen_name>\w+)\)\s*$", re.DOTALL)
+MEDIA_URL_REGEXP = re.compile(r"^(?:https?://)?pic\.twitter\.com/|/(?:photo|video)/\d+$")
+# Emoji with skin tone modifiers and variation selectors, joined emoji sequences, flags and keycaps
+EMOJI_REGEXP = re.compile(
+    "[\U0001F1E6-\U0001F1FF]{2}"
+    "|[#*0-9]\uFE0F?\u20E3"
+    "|[\u2300-\u23FF\u2600-\u27BF\u2B00-\u2BFF\U0001F000-\U0001FAFF]\uFE0F?[\U0001F3FB-\U0001F3FF]?"
+    "(?:\u200D[\u2600-\u27BF\U0001F000-\U0001FAFF]\uFE0F?[\U0001F3FB-\U0001F3FF]?)*"
+)
+# Tracking parameter, which Twitter adds to links of embed
+TRACKING_PARAMETERS = {"ref_src"}
+
+
+class EmbedParser(HTMLParser):
+    def __init__(self):
+        """
+        Parses twit text, author, date, language and links from oEmbed blockquote of Twitter API:
+        <blockquote><p lang="en">text</p>&mdash; name (@screen_name) <a href="twit URL">date</a></blockquote>
+        Parser is streaming: only blockquote data is kept, and everything after blockquote is skipped.
+        """
+        super().__init__(convert_charrefs=True)
+        self.blockquote_depth = 0
+        self.finished = False
+        self.in_paragraph = False
+        self.link_href = None
+        self.text_parts = list()
+        self.footer_parts = list()
+        self.date = None
+        self.lang = None
+        self.links = list()
+        self.has_media = False
+        self._link_parts = list()
+
+    def handle_starttag(self, tag, attrs):
+        if self.finished:
+            return
+        if tag == "blockquote":
+            self.blockquote_depth += 1
+        elif not self.blockquote_depth:
+            return
+        elif tag == "p" and not self.text_parts:
+            self.in_paragraph = True
+            self.lang = dict(attrs).get("lang", None) or None
+        elif tag == "br" and self.in_paragraph:
+            self.text_parts.append("\n")
+        elif tag == "a":
+            self.link_href = dict(attrs).get("href", "") or ""
+            self._link_parts = list()
+
+    def handle_endtag(self, tag):
+        if self.finished or not self.blockquote_depth:
+            return
+        if tag == "blockquote":
+            self.blockquote_depth -= 1
+            self.finished = not self.blockquote_depth
+        elif tag == "p":
+            self.in_paragraph = False
+        elif tag == "a" and self.link_href is not None:
+            link_text = "".join(self._link_parts).strip()
+            if self.in_paragraph:
+                if MEDIA_URL_REGEXP.search(link_text) or MEDIA_URL_REGEXP.search(self.link_href):
+                    self.has_media = True
+                if self.link_href:
+                    self.links.append(self.clean_url(self.link_href))
+            else:
+                # The last link after paragraph is twit date
+                self.date = link_text
+            self.link_href = None
+
+    def handle_data(self, data):
+        if self.finished or not self.blockquote_depth:
+            return
+        if self.link_href is not None:
+            self._link_parts.append(data)
+        if self.in_paragraph:
+            self.text_parts.append(data)
+        elif self.link_href is None:
+            self.footer_parts.append(data)
+
+    @staticmethod
+    def clean_url(url: str) -> str:
+        """
+        Removes tracking parameters of Twitter from URL.
+
+        :param url: URL
+        :return: URL without tracking parameters
+        """
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if key not in TRACKING_PARAMETERS]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def get_embed_data(self) -> EmbedData:
+        text = "".join(self.text_parts).strip() or None
+        author = AUTHOR_REGEXP.match("".join(self.footer_parts))
+        return EmbedData(
+            text=text,
+            author_name=author.group("name") if author else None,
+            author_screen_name=author.group("screen_name") if author else None,
+            date=self.date,
+            lang=self.lang,
+            links=self.links,
+            emoji="".join(EMOJI_REGEXP.findall(text)) if text else "",
+            has_media=self.has_media,
+        )
+
+    @classmethod
+    def parse(cls, embed_html: str) -> EmbedData:
+        """
+        Parses oEmbed HTML of twit.
+
+        :param embed_html: twit embed HTML
+        :return: twit data; fields, which are not found, are None
+        """
+        parser = cls()
+        # Scripts after blockquote are not required
+        end = embed_html.rfind("</blockquote>")
+        parser.feed(embed_html[:end + len("</blockquote>")] if end >= 0 else embed_html)
+        parser.close()
+        return parser.get_embed_data()
@@ -0,0 +1,65 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import models
+from helpers.embed_cache import EmbedCache
+from helpers.metrics import Metrics
+from helpers.rate_limiter import RateLimiter
+from helpers.twitter_embed_api import TwitterEmbedAPI
+
+
+class EmbedPrefetcher:
+    def __init__(self, embed_api_config: models.EmbedApiConfig, embed_params: dict,
+                 cache: EmbedCache = None, refresh_cache: bool = False, metrics: Metrics = None):
+        """
+        Gets Twitter embeds concurrently over shared keep-alive session.
+
+        :param embed_api_config: Twitter oEmbed API config
+        :param embed_params: Twitter embed parameters
+        :param cache: embeds cache; if not set, embeds aren't cached
+        :param refresh_cache: get embeds from API even if they are cached
+        :param metrics: if set, durations of getting embeds are recorded to it
+        """
+        self.embed_api_config = embed_api_config
+        self.embed_params = embed_params
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Requests aren't limited, unless rate is set, e.g. by throughput controller
+        self.rate_limiter = RateLimiter()
+        self.session = TwitterEmbedAPI.create_session(pool_size=embed_api_config.workers)
+        self.executor = ThreadPoolExecutor(max_workers=embed_api_config.workers, thread_name_prefix="embed")
+
+    def fetch(self, url: str, embed_params: dict = None) -> str:
+        """
+        Gets twit embed HTML in current thread.
+
+        :param url: twit URL
+        :param embed_params: Twitter embed parameters; if not set, default parameters are used
+        :return: embed HTML
+        """
+        with self.metrics.time("embed_fetch"):
+            return TwitterEmbedAPI.get_twit_embed_html(
+                url,
+                self.embed_params if embed_params is None else embed_params,
+                api_url=self.embed_api_config.url,
+                session=self.session,
+                cache=self.cache,
+                refresh_cache=self.refresh_cache,
+                max_retries=self.embed_api_config.max_retries,
+                backoff_factor=self.embed_api_config.backoff_factor,
+                timeout=self.embed_api_config.timeout,
+                rate_limiter=self.rate_limiter
+            )
+
+    def submit(self, url: str) -> Future:
+        """
+        Starts getting twit embed HTML in background.
+
+        :param url: twit URL
+        :return: future with embed HTML
+        """
+        return self.executor.submit(self.fetch, url)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: numbers are allocated atomically only inside one process
+    fcntl = None
+
+import exceptions
+
+NO_KEY = "{no}"
+
+
+class FilenameAllocator:
+    def __init__(self, counters_path: str = ".cache/filename-counters", directory_size: int = 0):
+        """
+        Allocates {no} numbers of image file names. Directory is scanned once, when numbers of template are
+        allocated first time; then the last number of every template is kept in counters file of directory,
+        so allocation takes constant time. Counters file is locked while number is allocated, so workers
+        in several processes (or hosts with shared file system) don't get the same number.
+        Counters files are kept in own directory, not in directories of images.
+
+        :param counters_path: directory of counters files
+        :param directory_size: maximal number of numbered images in directory; if set, images are saved
+                               to numbered subdirectories 0001, 0002 and etc.
+        """
+        self.counters_path = counters_path
+        self.directory_size = directory_size
+        self._lock = threading.Lock()
+        # Cached directory listing: file names in directory and its numbered subdirectories
+        self._listings = dict()
+
+    def get_subdirectory(self, no: int) -> str:
+        return f"{(no - 1) // self.directory_size + 1:04d}" if self.directory_size else ""
+
+    def allocate(self, filename: str) -> str:
+        """
+        Replaces {no} in file name with the next number of the same file name template.
+
+        :param filename: file name with {no} substitution in file name (not in directory)
+        :return: file name; if directory size is set, file is in subdirectory, which is created
+        """
+        directory, template = os.path.split(filename)
+        if NO_KEY in directory:
+            raise exceptions.TwitsConfigValidationError(f"{NO_KEY} is supported in file name only: {filename}")
+        with self._lock:
+            try:
+                os.makedirs(self.counters_path, exist_ok=True)
+            except OSError as e:
+                raise exceptions.TwitsConfigValidationError(
+                    f"Can't create directory {self.counters_path} of file name counters because of error: {e}."
+                )
+            with self._lock_directory(directory):
+                allocated_filename = self._allocate(directory, template)
+        if self.directory_size:
+            os.makedirs(os.path.dirname(allocated_filename), exist_ok=True)
+        return allocated_filename
+
+    def _allocate(self, directory: str, template: str) -> str:
+        counters = self._read_counters(directory)
+        no = counters.get(template, None)
+        if no is None:
+            no = self._scan(directory, template)
+        while True:
+            no += 1
+            allocated_filename = os.path.join(directory, self.get_subdirectory(no), template.replace(NO_KEY, str(no)))
+            # Files can be added by other tools after scan
+            if not os.path.exists(allocated_filename):
+                break
+        counters[template] = no
+        self._write_counters(directory, counters)
+        return allocated_filename
+
+    def get_counters_filename(self, directory: str, extension: str = ".json") -> str:
+        """
+        Returns counters file of images directory; directories are distinguished by absolute path.
+
+        :param directory: images directory
+        :param extension: file extension: .json for counters, .lock for lock file
+        :return: file name in counters directory
+        """
+        key = hashlib.sha256(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.counters_path, f"{key}{extension}")
+
+    def _lock_directory(self, directory: str):
+        if fcntl is None:
+            return _NullLock()
+        return _FileLock(self.get_counters_filename(directory, ".lock"))
+
+    def _read_counters(self, directory: str) -> dict:
+        # Counters are read under lock every time, because they can be changed by other process
+        try:
+            with open(self.get_counters_filename(directory), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Numbers are restored by scan of directory
+            return dict()
+
+    def _write_counters(self, directory: str, counters: dict):
+        counters_filename = self.get_counters_filename(directory)
+        temp_filename = f"{counters_filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            json.dump(counters, f)
+        os.replace(temp_filename, counters_filename)
+
+    def _scan(self, directory: str, template: str) -> int:
+        """
+        Returns the greatest number of existing files of template.
+
+        :param directory: directory
+        :param template: file name with {no} substitution
+        :return: number or 0, if there are no files
+        """
+        if directory not in self._listings:
+            filenames = list()
+            for name in os.listdir(directory or os.curdir):
+                if self.directory_size and name.isdigit() and os.path.isdir(os.path.join(directory, name)):
+                    filenames.extend(os.listdir(os.path.join(directory, name)))
+                else:
+                    filenames.append(name)
+            self._listings[directory] = filenames
+        prefix, suffix = template.split(NO_KEY, 1)
+        pattern = re.compile(f"^{re.escape(prefix)}([0-9]+){re.escape(suffix)}$")
+        numbers = (int(match.group(1)) for match in map(pattern.match, self._listings[directory]) if match)
+        return max(numbers, default=0)
+
+
+class _FileLock:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.filename, 'a')
+        fcntl.lockf(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        fcntl.lockf(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
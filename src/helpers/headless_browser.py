@@ -1,16 +1,178 @@
 import time
 
+import functools
 import os
-import random
-import string
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+import re
+import signal
+import tempfile
 
 import exceptions
 import models
 
 CURRENT_PATH = os.getcwd()
 
+TEMPLATE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template.html")
+WIDGETS_SCRIPT = '<script async src="https://platform.twitter.com/widgets.js" charset="utf-8"></script>'
+SCRIPT_TAG_REGEXP = re.compile(r"<script[^>]*>.*?</script>", re.IGNORECASE | re.DOTALL)
+
+# Replaces content of twit container in opened template page and initializes Twitter widget in it.
+INJECT_SCRIPT = """
+var container = document.getElementById('twit-container');
+if (container === null) {
+    return false;
+}
+container.innerHTML = arguments[0];
+window.twitsLastMutation = Date.now();
+if (window.twttr && window.twttr.widgets) {
+    window.twttr.widgets.load(container);
+}
+return true;
+"""
+
+# Replaces content of twit container with several twits, every twit in own item, and initializes Twitter widgets.
+INJECT_BATCH_SCRIPT = """
+var container = document.getElementById('twit-container');
+if (container === null) {
+    return false;
+}
+container.innerHTML = arguments[0].map(function (html, no) {
+    return '<div class="twit-item" id="twit-item-' + no + '">' + html + '</div>';
+}).join('');
+window.twitsLastMutation = Date.now();
+if (window.twttr && window.twttr.widgets) {
+    window.twttr.widgets.load(container);
+}
+return true;
+"""
+
+# Rendered twit element: Twitter widget, or twit blockquote, if widget is not initialized.
+TWIT_ELEMENT_SELECTOR = "#twit-container .twitter-tweet-rendered, #twit-container twitter-widget, " \
+                        "#twit-container blockquote.twitter-tweet"
+
+# Item of twit in batch page; selectors are tried in order: rendered twit element in it, or item itself,
+# if twit is not rendered.
+TWIT_ITEM_ID = "twit-item-{no}"
+TWIT_ITEM_ELEMENT_SELECTORS = ["#twit-item-{no} .twitter-tweet-rendered", "#twit-item-{no} twitter-widget",
+                               "#twit-item-{no} blockquote.twitter-tweet", "#twit-item-{no}"]
+
+# Returns bounding box of element in page screenshot pixels, or null if element is not found.
+ELEMENT_RECT_SCRIPT = """
+var element = document.querySelector(arguments[0]);
+if (element === null) {
+    return null;
+}
+var rect = element.getBoundingClientRect();
+var ratio = window.devicePixelRatio || 1;
+return {
+    left: Math.floor((rect.left + window.pageXOffset) * ratio),
+    top: Math.floor((rect.top + window.pageYOffset) * ratio),
+    width: Math.ceil(rect.width * ratio),
+    height: Math.ceil(rect.height * ratio)
+};
+"""
+
+# Returns bounding box of the first element, found by CSS selectors, in page screenshot pixels for every list
+# of selectors (null, if element is not found), after page is scrolled to the top.
+ELEMENTS_RECTS_SCRIPT = """
+window.scrollTo(0, 0);
+var ratio = window.devicePixelRatio || 1;
+return arguments[0].map(function (selectors) {
+    var element = null;
+    for (var i = 0; i < selectors.length && element === null; i++) {
+        element = document.querySelector(selectors[i]);
+    }
+    if (element === null) {
+        return null;
+    }
+    var rect = element.getBoundingClientRect();
+    return {
+        left: Math.floor((rect.left + window.pageXOffset) * ratio),
+        top: Math.floor((rect.top + window.pageYOffset) * ratio),
+        width: Math.ceil(rect.width * ratio),
+        height: Math.ceil(rect.height * ratio)
+    };
+});
+"""
+
+PAGE_HEIGHT_SCRIPT = "return document.documentElement.scrollHeight;"
+
+# Returns text of the first element, found by XPath queries, for every list of queries; null, if text is not found.
+ELEMENTS_TEXTS_SCRIPT = """
+return arguments[0].map(function (queries) {
+    for (var i = 0; i < queries.length; i++) {
+        var element = document.evaluate(
+            queries[i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+        ).singleNodeValue;
+        if (element !== null) {
+            return element.innerText || element.textContent;
+        }
+    }
+    return null;
+});
+"""
+
+# Returns readiness state of the rendered twits: widgets of all twits (number is passed as argument)
+# are initialized, images and fonts are loaded, and time (in ms) since the last DOM mutation
+# (tracked by observer in template.html).
+READINESS_SCRIPT = """
+var widgets = Array.prototype.filter.call(
+    document.querySelectorAll('.twitter-tweet-rendered, twitter-widget'),
+    function (widget) { return widget.getBoundingClientRect().height > 0; }
+);
+var images = Array.prototype.every.call(document.images, function (img) { return img.complete; });
+var fonts = !document.fonts || document.fonts.status === 'loaded';
+var lastMutation = window.twitsLastMutation || 0;
+return {
+    rendered: widgets.length >= (arguments[0] || 1),
+    images: images,
+    fonts: fonts,
+    idle: Date.now() - lastMutation
+};
+"""
+
+
+def get_process_tree(pid: int) -> list:
+    """
+    Returns process id and ids of all its descendants; works only in Linux.
+
+    :param pid: process id
+    :return: process ids
+    """
+    pids, unvisited = list(), [pid]
+    while unvisited:
+        current_pid = unvisited.pop()
+        pids.append(current_pid)
+        try:
+            for task in os.listdir(f"/proc/{current_pid}/task"):
+                with open(f"/proc/{current_pid}/task/{task}/children", 'r') as f:
+                    unvisited.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return pids
+
+
+def get_process_memory(pid: int) -> int:
+    """
+    Returns resident memory of process (in bytes); works only in Linux.
+
+    :param pid: process id
+    :return: memory or 0, if it can't be measured
+    """
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+@functools.lru_cache(maxsize=None)
+def load_page_template() -> str:
+    with open(TEMPLATE_FILENAME, 'r', encoding='utf-8') as template_file:
+        return template_file.read()
+
 
 class HeadlessBrowser:
     def __init__(self, **options: dict):
@@ -24,43 +186,206 @@ class HeadlessBrowser:
         self.current_opened_page = None
         self.options = options
 
+    @staticmethod
+    def get_page_html(embed_html: str, scripts: str = "") -> str:
+        """
+        Returns web page HTML from template.
+
+        :param embed_html: string with embed HTML
+        :param scripts: scripts, added to the end of page
+        :return: web page HTML
+        """
+        return load_page_template().replace("{% embed %}", embed_html).replace("{% scripts %}", scripts)
+
+    def write_page(self, html_content: str) -> str:
+        """
+        Writes web page to temporary file.
+
+        :param html_content: web page HTML
+        :return: file name
+        """
+        try:
+            file_descriptor, html_filename = tempfile.mkstemp(suffix=".html")
+            with os.fdopen(file_descriptor, "w", encoding='utf-8') as f:
+                f.write(html_content)
+        except Exception as e:
+            raise exceptions.HeadlessBrowserException(f"Can't create web page file because of error: {e}.")
+        return html_filename
+
+    def open_page(self, html_filename: str):
+        """
+        Opens web page file in browser; previously opened page file is removed.
+
+        :param html_filename: web page file name
+        """
+        self.remove_opened_page()
+        self.current_opened_page = html_filename
+        try:
+            self.browser.get(f"file://{html_filename}")
+        except Exception as e:
+            self.remove_opened_page()
+            raise exceptions.HeadlessBrowserException(f"Can't open web page {html_filename} because of error: {e}.")
+
+    def remove_opened_page(self):
+        if self.current_opened_page:
+            try:
+                os.remove(self.current_opened_page)
+            except OSError:
+                pass
+            self.current_opened_page = None
+
     def render_html(self, embed_html: str) -> bool:
         """
         Renders sample web page with embedded HTML and opens it in browser.
+        In "inject" render mode, page is opened once, and embed HTML is injected into opened page.
 
         :param embed_html: string with embed HTML
         :return: True if operation is successful; False otherwise
         """
-        operation_id = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(12))
-        html_filename = f"/tmp/{operation_id}.html"
-        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "template.html"), 'r') as template_file:
-            page_template = "".join(template_file.readlines())
-            try:
-                with open(html_filename, "w", encoding='utf-8') as f:
-                    html_content = page_template.replace("{% embed %}", embed_html)
-                    f.writelines(html_content)
-            except Exception as e:
-                raise exceptions.HeadlessBrowserException(f"Can't create file {html_filename} because of error: {e}.")
+        if self.options.get('render_mode') == 'inject':
+            return self.inject_html(embed_html)
+        html_filename = self.write_page(self.get_page_html(embed_html))
+        self.open_page(html_filename)
+        return True
+
+    def inject_html(self, embed_html: str) -> bool:
+        """
+        Injects embedded HTML into opened template page; opens template page, if it's not opened.
+
+        :param embed_html: string with embed HTML
+        :return: True if operation is successful; False otherwise
+        """
+        return self.inject(INJECT_SCRIPT, SCRIPT_TAG_REGEXP.sub("", embed_html))
+
+    def render_batch(self, embed_htmls: list) -> bool:
+        """
+        Injects several embedded HTMLs into opened template page, every twit into own item (see TWIT_ITEM_ID),
+        so they are rendered at once; opens template page, if it's not opened.
+
+        :param embed_htmls: strings with embed HTML
+        :return: True if operation is successful; False otherwise
+        """
+        return self.inject(INJECT_BATCH_SCRIPT, [SCRIPT_TAG_REGEXP.sub("", embed_html) for embed_html in embed_htmls])
+
+    def inject(self, script: str, argument) -> bool:
+        """
+        Runs inject script in opened template page; opens template page, if it's not opened.
+
+        :param script: inject script, returns false, if template page is not opened
+        :param argument: script argument
+        :return: True if operation is successful; False otherwise
+        """
+        for _ in range(2):
+            if not self.current_opened_page:
+                self.open_page(self.write_page(self.get_page_html("", scripts=WIDGETS_SCRIPT)))
             try:
-                self.browser.get(f"file://{html_filename}")
+                if self.browser.execute_script(script, argument):
+                    return True
             except Exception as e:
-                raise exceptions.HeadlessBrowserException(f"Can't open web page {html_filename} because of error: {e}.")
-            else:
-                self.current_opened_page = html_filename
-                return True
+                raise exceptions.HeadlessBrowserException(f"Can't inject embed HTML because of error: {e}.")
+            # Template page is not opened anymore, so it's reopened
+            self.remove_opened_page()
+        raise exceptions.HeadlessBrowserException("Can't inject embed HTML: template page is not opened.")
 
-    def take_screenshot(self, image_filename: str, delay: int = 0) -> bool:
+    def wait_for_delay(self, delay: float) -> float:
         """
-        Takes screenshot after delay and saves it to file.
+        Waits for fixed delay.
 
-        :param image_filename: image file path
-        :param delay: delay before screenshot (in sec)
-        :return: True, if operation is successful; False otherwise
+        :param delay: delay (in sec)
+        :return: real waiting time (in sec)
         """
+        started = time.monotonic()
         time.sleep(delay)
-        self.browser.save_screenshot(image_filename)
-        # os.remove(self.current_opened_page)
-        return True
+        return time.monotonic() - started
+
+    def wait_until_rendered(self, timeout: float, settle: float = 0.5, poll_interval: float = 0.1,
+                            count: int = 1) -> float:
+        """
+        Waits until embedded twits are rendered: widgets are initialized, images and fonts are loaded
+        and DOM mutations are settled. Stops waiting after timeout.
+
+        :param timeout: upper bound of waiting (in sec)
+        :param settle: time without DOM mutations, required for twit to be rendered (in sec)
+        :param poll_interval: interval between readiness checks (in sec)
+        :param count: number of twits on page
+        :return: real waiting time (in sec)
+        """
+        started = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= timeout:
+                return elapsed
+            try:
+                state = self.browser.execute_script(READINESS_SCRIPT, count)
+            except Exception:
+                state = None
+            if state and state.get('rendered') and state.get('images') and state.get('fonts') \
+                    and state.get('idle', 0) >= settle * 1000:
+                return elapsed
+            time.sleep(poll_interval)
+
+    def get_screenshot_png(self) -> bytes:
+        """
+        Takes screenshot and returns it as PNG.
+
+        :return: PNG image
+        """
+        return self.browser.get_screenshot_as_png()
+
+    def get_element_screenshot_png(self, css_selector: str) -> (bytes, dict or None) or None:
+        """
+        Takes screenshot of element and returns it as PNG. If browser can't take screenshot of element,
+        screenshot of page is returned with element bounding box to crop.
+
+        :param css_selector: CSS selector of element
+        :return: PNG image and crop box (left, top, width, height) or None; None, if element is not found
+        """
+        try:
+            rect = self.browser.execute_script(ELEMENT_RECT_SCRIPT, css_selector)
+        except Exception:
+            return None
+        if not rect or rect['width'] <= 0 or rect['height'] <= 0:
+            return None
+        try:
+            return self.browser.find_element_by_css_selector(css_selector).screenshot_as_png, None
+        except Exception:
+            return self.get_screenshot_png(), rect
+
+    def get_elements_screenshot_png(self, css_selectors: list) -> (bytes, list):
+        """
+        Takes one screenshot of whole page and returns it with bounding boxes of elements to crop.
+        Browser window is extended to page height, because some browsers capture only visible part of page.
+
+        :param css_selectors: CSS selectors of every element, which are tried in order
+        :return: PNG image and crop boxes (left, top, width, height); crop box is None, if element is not found
+        """
+        try:
+            page_height = int(self.browser.execute_script(PAGE_HEIGHT_SCRIPT))
+            window_size = self.browser.get_window_size()
+            if page_height > window_size['height']:
+                self.browser.set_window_size(window_size['width'], page_height)
+        except Exception:
+            # Elements below visible part of page are not captured
+            pass
+        try:
+            rects = self.browser.execute_script(ELEMENTS_RECTS_SCRIPT, css_selectors) or []
+        except Exception as e:
+            raise exceptions.HeadlessBrowserException(f"Can't get elements of page because of error: {e}.")
+        rects = [rect if rect and rect['width'] > 0 and rect['height'] > 0 else None for rect in rects]
+        return self.get_screenshot_png(), rects
+
+    def get_elements_texts(self, xpath_queries: list) -> list:
+        """
+        Finds text of several elements in one call; for every element, XPath queries are tried in order.
+
+        :param xpath_queries: XPath queries of every element
+        :return: text of every element or None, if it's not found
+        """
+        try:
+            texts = self.browser.execute_script(ELEMENTS_TEXTS_SCRIPT, xpath_queries)
+        except Exception:
+            texts = None
+        return texts if texts and len(texts) == len(xpath_queries) else [None] * len(xpath_queries)
 
     def get_element_text(self, xpath: str) -> str or None:
         """
@@ -75,10 +400,77 @@ class HeadlessBrowser:
             return None
         return twit_text
 
+    def set_timeouts(self, timeout: int):
+        """
+        Sets page load and script timeouts of browser.
+
+        :param timeout: timeout (in sec); if 0, timeouts are not set
+        """
+        if not timeout:
+            return
+        try:
+            self.browser.set_page_load_timeout(timeout)
+            self.browser.set_script_timeout(timeout)
+        except Exception:
+            pass
+
+    def is_alive(self) -> bool:
+        """
+        Checks, that browser responds.
+
+        :return: True, if browser is alive
+        """
+        try:
+            return self.browser.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def get_process_id(self) -> int or None:
+        try:
+            return self.browser.service.process.pid
+        except AttributeError:
+            return None
+
+    def get_memory_usage(self) -> int or None:
+        """
+        Returns resident memory of browser and its driver processes; works only in Linux.
+
+        :return: memory (in bytes) or None, if it can't be measured
+        """
+        pid = self.get_process_id()
+        if pid is None or not os.path.isdir("/proc"):
+            return None
+        return sum(get_process_memory(process_id) for process_id in get_process_tree(pid))
+
+    def kill(self):
+        """
+        Kills browser and its driver processes; used, if browser hangs.
+        """
+        pid = self.get_process_id()
+        if pid is None:
+            return
+        for process_id in reversed(get_process_tree(pid)):
+            try:
+                os.kill(process_id, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def quit(self):
+        """
+        Closes browser and removes opened page file.
+        """
+        try:
+            self.browser.quit()
+        except Exception:
+            pass
+        self.remove_opened_page()
+
 
 class PhantomJSBrowser(HeadlessBrowser):
     def __init__(self, **options):
         super().__init__(**options)
+        # Selenium is imported only when browser is started, so CLI starts faster
+        from selenium import webdriver
 
         executable_path = os.path.join(CURRENT_PATH, options.get('executable_path'))
 
@@ -86,11 +478,14 @@ class PhantomJSBrowser(HeadlessBrowser):
             executable_path=executable_path,
             service_log_path="/dev/null"
         )
+        self.set_timeouts(options.get('render_timeout', 0))
 
 
 class ChromeBrowser(HeadlessBrowser):
     def __init__(self, **options):
         super().__init__(**options)
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
 
         executable_path = os.path.join(CURRENT_PATH, options.get('executable_path'))
 
@@ -103,12 +498,21 @@ class ChromeBrowser(HeadlessBrowser):
             chrome_options=chrome_options,
             service_log_path="/dev/null"
         )
+        self.set_timeouts(options.get('render_timeout', 0))
 
 
 def create_browser(options: models.HeadlessBrowserConfig):
     if options.name == 'phantomjs':
-        return PhantomJSBrowser(**options.to_primitive())
+        browser_class = PhantomJSBrowser
     elif options.name == 'chrome':
-        return ChromeBrowser(**options.to_primitive())
+        browser_class = ChromeBrowser
+    elif options.name == 'card':
+        # Card renderer is based on HeadlessBrowser, so it's imported here
+        from helpers.card_renderer import CardRenderer
+        browser_class = CardRenderer
     else:
         raise exceptions.HeadlessBrowserException("Browser is not supported.")
+    try:
+        return browser_class(**options.to_primitive())
+    except Exception as e:
+        raise exceptions.HeadlessBrowserException(f"Can't start browser {options.name} because of error: {e}.")
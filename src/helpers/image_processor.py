@@ -1,76 +1,160 @@
-from wand.image import Image as WandImage
+import os
+from typing import TYPE_CHECKING
 
 import exceptions
+from helpers.image_store import ImageStore
+from helpers.metrics import measure
+
+IMAGE_FORMATS = {"png": "png", "jpg": "jpeg", "jpeg": "jpeg", "webp": "webp", "gif": "gif"}
+
+if TYPE_CHECKING:
+    # Wand loads ImageMagick library, so it's imported only when images are post-processed
+    from wand.image import Image as WandImage
 
 
 class ImageProcessor:
     @staticmethod
-    def resize_image(in_filename: str, out_filename: str or None, size: dict):
+    def get_resized_size(old_width: int, old_height: int, size: dict) -> (int, int):
         """
-        Resize image with aspect ratio
+        Returns new image size with aspect ratio
 
-        :param in_filename:
-        :param out_filename: if not set, in_filename value used
+        :param old_width: current image width
+        :param old_height: current image height
         :param size: Width and/or height
-        :return:
+        :return: new width and height
         """
-
-        if not out_filename:
-            out_filename = in_filename
-
-        try:
-            with WandImage(filename=in_filename) as img:
-                old_size = {
-                    "width": img.width,
-                    "height": img.height,
-                }
-        except ImportError:
-            raise exceptions.ImageProcessorException(
-                "ImageMagick is not installed in your system; required for TRIM option."
-            )
-        except Exception as e:
-            raise exceptions.ImageProcessorException(f"Unhandled exception: {e}")
-
         width, height = int(size.get("width", 0)), int(size.get("height", 0))
 
         if width and height and width > 0 and height > 0:
-            new_size = {
-                "width": width,
-                "height": height
-            }
+            return width, height
         elif width and width > 0:
-            resize_percent = float(float(width) / old_size["width"])
-            new_size = {
-                "width": width,
-                "height": int(float(old_size["height"]) * resize_percent)
-            }
+            resize_percent = float(float(width) / old_width)
+            return width, int(float(old_height) * resize_percent)
         elif height and height > 0:
-            resize_percent = float(float(height) / old_size["height"])
-            new_size = {
-                "width": int(float(old_size["width"]) * resize_percent),
-                "height": height
-            }
+            resize_percent = float(float(height) / old_height)
+            return int(float(old_width) * resize_percent), height
         else:
             raise exceptions.ImageProcessorException(f"Incorrect parameters: (width = {width}, height = {height})")
-        try:
-            with WandImage(filename=in_filename) as img:
-                img.resize(new_size["width"], new_size["height"])
-                img.save(filename=out_filename)
-        except Exception as e:
-            raise exceptions.ImageProcessorException(str(e))
 
     @staticmethod
-    def trim_image(in_filename: str, out_filename: str or None):
-        if not out_filename:
-            out_filename = in_filename
-        try:
-            with WandImage(filename=in_filename) as img:
+    def apply_operations(img: 'WandImage', crop: dict or None = None, trim: bool = False,
+                         resize_options: dict or None = None, timings: dict or None = None):
+        """
+        Applies post-processing operations to decoded image in memory
+
+        :param img: Wand image
+        :param crop: crop box (left, top, width, height); if not set, image is not cropped
+        :param trim: trim image
+        :param resize_options: width and/or height; if not set, image is not resized
+        :param timings: if set, durations of operations are added to it
+        """
+        if crop:
+            left, top = max(0, int(crop["left"])), max(0, int(crop["top"]))
+            width = min(int(crop["width"]), img.width - left)
+            height = min(int(crop["height"]), img.height - top)
+            if width <= 0 or height <= 0:
+                raise exceptions.ImageProcessorException(f"Crop box {crop} is out of image")
+            with measure(timings, "crop"):
+                img.crop(left=left, top=top, width=width, height=height)
+        if trim:
+            with measure(timings, "trim"):
                 # noinspection PyTypeChecker
                 img.trim(color=None, fuzz=0)
-                img.save(filename=out_filename)
+        if resize_options is not None:
+            width, height = ImageProcessor.get_resized_size(img.width, img.height, resize_options)
+            with measure(timings, "resize"):
+                img.resize(width, height)
+
+    @staticmethod
+    def encode(img: 'WandImage', filename: str) -> bytes:
+        """
+        Encodes image in format of file extension; the same image is always encoded to the same bytes
+
+        :param img: Wand image
+        :param filename: image file path
+        :return: encoded image
+        """
+        extension = os.path.splitext(filename)[1].lstrip(".").lower()
+        if extension in IMAGE_FORMATS:
+            img.format = IMAGE_FORMATS[extension]
+        if img.format.lower() == "png":
+            # PNG encoder saves creation and modification time, so the same image would be written on every run
+            img.options["png:exclude-chunk"] = "date,time"
+        return img.make_blob()
+
+    @staticmethod
+    def save(img: 'WandImage', filename: str, timings: dict or None = None) -> str:
+        """
+        Encodes image and writes it, if file doesn't contain the same image
+
+        :param img: Wand image
+        :param filename: image file path
+        :param timings: if set, durations of encoding and writing are added to it
+        :return: SHA-256 hash of image
+        """
+        with measure(timings, "encode"):
+            blob = ImageProcessor.encode(img, filename)
+        image_hash, _ = ImageStore.write(filename, blob, timings)
+        return image_hash
+
+    @staticmethod
+    def save_variant(img: 'WandImage', filename: str, resize_options: dict or None = None,
+                     image_format: str = "png", quality: int or None = None) -> str:
+        """
+        Saves resized and/or converted copy of decoded image; image itself is not changed
+
+        :param img: Wand image
+        :param filename: variant image file path
+        :param resize_options: width and/or height; if not set, variant is not resized
+        :param image_format: png, webp or jpeg
+        :param quality: compression quality (1-100); if not set, default quality of format is used
+        :return: SHA-256 hash of variant image
+        """
+        with img.clone() as variant_img:
+            if resize_options:
+                width, height = ImageProcessor.get_resized_size(variant_img.width, variant_img.height, resize_options)
+                variant_img.resize(width, height)
+            variant_img.format = image_format
+            if quality:
+                variant_img.compression_quality = quality
+            blob = ImageProcessor.encode(variant_img, filename)
+        image_hash, _ = ImageStore.write(filename, blob)
+        return image_hash
+
+    @staticmethod
+    def post_process_image(out_filename: str, blob: bytes = None, in_filename: str = None, **operations):
+        """
+        Decodes image once, applies post-processing operations in memory and encodes it once.
+        Variants are made from cropped and trimmed image before it's resized, in the same pass.
+
+        :param out_filename: output image file path
+        :param blob: encoded image; if not set, image is read from in_filename
+        :param in_filename: input image file path
+        :param operations: operations and timings, see apply_operations; variants - list of save_variant arguments
+        :return: SHA-256 hashes of saved images by file paths
+        """
+        operations = dict(operations)
+        timings = operations.get("timings", None)
+        resize_options = operations.pop("resize_options", None)
+        variants = operations.pop("variants", None) or []
+        try:
+            from wand.image import Image as WandImage
+            with measure(timings, "decode"):
+                img = WandImage(blob=blob) if blob is not None else WandImage(filename=in_filename)
+            with img:
+                ImageProcessor.apply_operations(img, **operations)
+                image_hashes = dict()
+                with measure(timings, "variants"):
+                    for variant in variants:
+                        image_hashes[variant["filename"]] = ImageProcessor.save_variant(img, **variant)
+                ImageProcessor.apply_operations(img, resize_options=resize_options, timings=timings)
+                image_hashes[out_filename] = ImageProcessor.save(img, out_filename, timings)
+            return image_hashes
         except ImportError:
             raise exceptions.ImageProcessorException(
-                "ImageMagick is not installed in your system; required for TRIM option."
+                "ImageMagick is not installed in your system; required for post-processing."
             )
+        except exceptions.ImageProcessorException:
+            raise
         except Exception as e:
             raise exceptions.ImageProcessorException(f"Unhandled exception: {e}")
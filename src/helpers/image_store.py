@@ -0,0 +1,63 @@
+import hashlib
+import os
+import threading
+
+from helpers.metrics import measure
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ImageStore:
+    @staticmethod
+    def get_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def get_file_hash(filename: str) -> str or None:
+        """
+        Returns SHA-256 hash of file content.
+
+        :param filename: file path
+        :return: hash or None, if file doesn't exist
+        """
+        file_hash = hashlib.sha256()
+        try:
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    file_hash.update(chunk)
+        except FileNotFoundError:
+            return None
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def write(filename: str, data: bytes, timings: dict or None = None) -> (str, bool):
+        """
+        Writes image by content hash: if file already contains the same image, it's not rewritten,
+        so its modification time is kept and downstream sync doesn't move it. New content is written
+        to temporary file and renamed, so readers never see partially written image.
+
+        :param filename: image file path
+        :param data: encoded image
+        :param timings: if set, durations of hashing and writing are added to it
+        :return: SHA-256 hash of image and True, if file is written
+        """
+        with measure(timings, "store_hash"):
+            image_hash = ImageStore.get_hash(data)
+            try:
+                unchanged = os.path.getsize(filename) == len(data) and \
+                    ImageStore.get_file_hash(filename) == image_hash
+            except OSError:
+                unchanged = False
+        if unchanged:
+            return image_hash, False
+        with measure(timings, "store_write"):
+            temp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temp_filename, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_filename, filename)
+            except Exception:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+                raise
+        return image_hash, True
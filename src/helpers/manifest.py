@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+
+import exceptions
+
+
+class Manifest:
+    STATUS_PROCESSED = "processed"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, path: str):
+        """
+        Append-only JSON Lines log of processed twits. Every line is a record of twit processing;
+        the last record of twit is actual.
+
+        :param path: manifest file path
+        """
+        self.path = path
+        self.records = dict()
+        self._lock = threading.Lock()
+        lines, damaged = self._load()
+        try:
+            # Superseded records are dropped, so manifest doesn't grow with every run; incomplete last line
+            # is dropped, so next record isn't appended to it
+            if damaged or lines > 2 * len(self.records):
+                self._rewrite()
+            self._file = open(path, 'a', encoding='utf-8')
+        except OSError as e:
+            raise exceptions.ManifestException(f"Can't open manifest {path} because of error: {e}.")
+
+    @staticmethod
+    def get_hash(data) -> str:
+        """
+        Returns hash of string or JSON-serializable data.
+
+        :param data: string or data
+        :return: SHA-256 hex digest
+        """
+        if not isinstance(data, str):
+            data = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _load(self) -> (int, bool):
+        """
+        Reads records of manifest.
+
+        :return: number of lines and whether manifest has invalid or incomplete lines
+        """
+        if not os.path.exists(self.path):
+            return 0, False
+        lines = 0
+        damaged = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    # Last line can be incomplete, if previous run was interrupted
+                    if not line.endswith("\n"):
+                        damaged = True
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        damaged = True
+                        continue
+                    if isinstance(record, dict) and record.get('url'):
+                        self.records[record['url']] = record
+        except OSError as e:
+            raise exceptions.ManifestException(f"Can't read manifest {self.path} because of error: {e}.")
+        return lines, damaged
+
+    def _rewrite(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+
+    def get(self, url: str) -> dict or None:
+        with self._lock:
+            return self.records.get(url)
+
+    def record(self, url: str, status: str, **data):
+        """
+        Appends twit record to manifest and flushes it to disk.
+
+        :param url: twit URL
+        :param status: processing status
+        :param data: embed_hash, config_hash, image, text and other record data
+        """
+        record = dict(url=url, status=status, **data)
+        with self._lock:
+            self.records[url] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
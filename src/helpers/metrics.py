@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+PERCENTILES = (50, 90, 99)
+
+
+@contextmanager
+def measure(timings: dict or None, stage: str):
+    """
+    Measures duration of code block and adds it to timings dict; used where Metrics can't be shared
+    (e.g. in worker processes).
+
+    :param timings: stage durations (in sec); if None, nothing is measured
+    :param stage: stage name
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.monotonic() - started
+
+
+class StageTimer:
+    def __init__(self, max_samples: int = 10000):
+        """
+        Durations of one processing stage. Count, sum and maximum are exact; percentiles are calculated
+        from random sample of durations, so memory usage doesn't depend on number of twits.
+
+        :param max_samples: maximum number of samples for percentiles
+        """
+        self.max_samples = max_samples
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = list()
+
+    def record(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(duration)
+        else:
+            # Reservoir sampling keeps every duration in sample with equal probability
+            index = random.randrange(self.count)
+            if index < self.max_samples:
+                self.samples[index] = duration
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def summary(self) -> dict:
+        summary = {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+        return summary
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Per-stage timers of twit processing.
+        """
+        self.stages = dict()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration: float):
+        """
+        Records duration of stage.
+
+        :param stage: stage name
+        :param duration: duration (in sec)
+        """
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = StageTimer()
+            self.stages[stage].record(duration)
+
+    def record_all(self, durations: dict):
+        for stage, duration in durations.items():
+            self.record(stage, duration)
+
+    @contextmanager
+    def time(self, stage: str):
+        """
+        Measures duration of code block as stage.
+
+        :param stage: stage name
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started)
+
+    def reset(self):
+        with self._lock:
+            self.stages = dict()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {stage: timer.summary() for stage, timer in sorted(self.stages.items())}
+
+    def totals(self) -> dict:
+        """
+        Returns count and sum of durations (in sec) by stages; unlike summary, percentiles aren't calculated.
+        """
+        with self._lock:
+            return {stage: (timer.count, timer.total) for stage, timer in self.stages.items()}
+
+    def to_prometheus(self) -> str:
+        """
+        Returns metrics in Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP twits_stage_duration_seconds Duration of twit processing stages.",
+            "# TYPE twits_stage_duration_seconds summary",
+        ]
+        for stage, summary in self.summary().items():
+            for percent in PERCENTILES:
+                lines.append(
+                    f'twits_stage_duration_seconds{{stage="{stage}",quantile="{percent / 100}"}} {summary[f"p{percent}"]}'
+                )
+            lines.append(f'twits_stage_duration_seconds_sum{{stage="{stage}"}} {summary["sum"]}')
+            lines.append(f'twits_stage_duration_seconds_count{{stage="{stage}"}} {summary["count"]}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write_file(filename: str, content: str):
+        # File is replaced atomically, so collectors never read incomplete file
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_filename, filename)
+
+    def save_json(self, filename: str):
+        self._write_file(filename, json.dumps(self.summary(), indent=4))
+
+    def save_prometheus(self, filename: str):
+        self._write_file(filename, self.to_prometheus())
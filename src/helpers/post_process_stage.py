@@ -0,0 +1,148 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from helpers.image_processor import ImageProcessor
+from helpers.metrics import Metrics
+
+# Durations of post-processing stages (in sec) and SHA-256 hashes of saved images by file paths
+PostProcessResult = collections.namedtuple("PostProcessResult", ["timings", "image_hashes"])
+
+
+def post_process_image(out_filename: str, blob: bytes, operations: dict) -> PostProcessResult:
+    """
+    Post-processes image in worker process.
+
+    :param out_filename: output image file path
+    :param blob: encoded image
+    :param operations: operations, see ImageProcessor.apply_operations
+    :return: result of post-processing
+    """
+    started = time.monotonic()
+    timings = dict()
+    image_hashes = ImageProcessor.post_process_image(out_filename, blob=blob, timings=timings, **operations)
+    timings = {f"image_{stage}": duration for stage, duration in timings.items()}
+    timings["post_process"] = time.monotonic() - started
+    return PostProcessResult(timings, image_hashes)
+
+
+class PostProcessStage:
+    def __init__(self, workers: int = 2, max_pending: int = 8, metrics: Metrics = None):
+        """
+        Post-processes screenshots in process pool, while browsers render next twits.
+
+        :param workers: number of worker processes; if 0, images are post-processed in calling thread
+        :param max_pending: maximum number of screenshots, that wait for post-processing;
+            if reached, submitting is blocked until some screenshot is processed
+        :param metrics: if set, durations of post-processing stages are recorded to it
+        """
+        self.metrics = metrics
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+        self._pending_slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.process_time = 0.0
+        # Screenshots are submitted to worker processes by dispatcher thread, so no more than limit
+        # screenshots are post-processed at the same time; other screenshots wait in queue
+        self.limit = workers
+        self.contended = 0
+        self._running = 0
+        self._queued = collections.deque()
+        self._closed = False
+        self._dispatch_condition = threading.Condition()
+        self._dispatcher = None
+        if self.executor is not None:
+            self._dispatcher = threading.Thread(target=self._dispatch, name="post-process-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    @property
+    def average_process_time(self) -> float:
+        return self.process_time / self.processed if self.processed else 0.0
+
+    def submit(self, out_filename: str, blob: bytes, operations: dict) -> Future:
+        """
+        Submits screenshot for post-processing; blocks, if too many screenshots are pending.
+
+        :param out_filename: output image file path
+        :param blob: encoded image
+        :param operations: operations, see ImageProcessor.apply_operations
+        :return: future with result of post-processing
+        """
+        self._pending_slots.acquire()
+        if self.executor is None:
+            future = Future()
+            try:
+                future.set_result(post_process_image(out_filename, blob, operations))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = Future()
+            with self._dispatch_condition:
+                if self._queued or self._running >= self.limit:
+                    self.contended += 1
+                self._queued.append((future, (out_filename, blob, operations)))
+                self._dispatch_condition.notify_all()
+        future.add_done_callback(self._on_done)
+        return future
+
+    def set_limit(self, limit: int):
+        """
+        Sets number of screenshots, that are post-processed at the same time.
+
+        :param limit: number of screenshots, from 1 to number of worker processes
+        """
+        with self._dispatch_condition:
+            self.limit = max(1, min(limit, self.workers))
+            self._dispatch_condition.notify_all()
+
+    def _dispatch(self):
+        while True:
+            with self._dispatch_condition:
+                while not self._closed and (not self._queued or self._running >= self.limit):
+                    self._dispatch_condition.wait()
+                if not self._queued:
+                    return
+                future, arguments = self._queued.popleft()
+                self._running += 1
+            try:
+                executor_future = self.executor.submit(post_process_image, *arguments)
+            except Exception as e:
+                self._on_executed(None, future, e)
+            else:
+                executor_future.add_done_callback(lambda f, result_future=future: self._on_executed(f, result_future))
+
+    def _on_executed(self, executor_future: Future or None, future: Future, error: Exception = None):
+        with self._dispatch_condition:
+            self._running -= 1
+            self._dispatch_condition.notify_all()
+        if error is None and executor_future.cancelled():
+            future.cancel()
+        elif error is not None or executor_future.exception() is not None:
+            future.set_exception(error or executor_future.exception())
+        else:
+            future.set_result(executor_future.result())
+
+    def _on_done(self, future: Future):
+        self._pending_slots.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+        timings = future.result().timings
+        with self._lock:
+            self.processed += 1
+            self.process_time += timings["post_process"]
+        if self.metrics is not None:
+            self.metrics.record_all(timings)
+
+    def stats(self) -> str:
+        return f"post-processing: {self.processed} images, {self.average_process_time:.2f} sec avg"
+
+    def close(self):
+        if self.executor is not None:
+            with self._dispatch_condition:
+                self._closed = True
+                self._dispatch_condition.notify_all()
+            # Queued screenshots are submitted before worker processes are stopped
+            self._dispatcher.join()
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate: float = 0.0):
+        """
+        Spaces requests evenly, so no more than rate requests per second are sent; shared between threads.
+        Also counts requests and throttled responses (rate limit, server errors and connection errors).
+
+        :param rate: maximum number of requests per second; if 0, requests aren't limited
+        """
+        self.rate = rate
+        self.requests = 0
+        self.throttled = 0
+        self.delayed = 0
+        self._next_request = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self.rate = rate
+
+    def wait(self) -> float:
+        """
+        Waits until next request is allowed.
+
+        :return: waiting time (in sec)
+        """
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + 1.0 / self.rate
+            delay = start - now
+            if delay > 0:
+                self.delayed += 1
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def record(self, throttled: bool):
+        """
+        Records response of request.
+
+        :param throttled: request is rejected because of rate limit or server overload
+        """
+        with self._lock:
+            self.requests += 1
+            if throttled:
+                self.throttled += 1
@@ -0,0 +1,81 @@
+import threading
+from typing import Callable
+
+
+class RenderBatcher:
+    def __init__(self, batch_size: int, submit: Callable[[list], None], wait: float = 0.5):
+        """
+        Groups twits, which are ready to render, into batches: batch is submitted, when it's full,
+        or when its first twit waits for other twits longer than wait time, e.g. at the end of twits.
+
+        :param batch_size: maximal number of twits in batch
+        :param submit: function, that starts rendering of batch
+        :param wait: maximal waiting time of twit for batch (in sec)
+        """
+        self.batch_size = batch_size
+        self.submit = submit
+        self.wait = wait
+        self._batch = list()
+        self._timer = None
+        self._expected = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def expect(self):
+        """
+        Registers twit, which can be added to batch later, e.g. when its embed is received.
+        """
+        with self._lock:
+            self._expected += 1
+
+    def arrive(self):
+        """
+        Registers, that expected twit is added to batch or won't be added to it. After batcher is closed,
+        the last batch is submitted as soon as all expected twits are arrived.
+        """
+        with self._lock:
+            self._expected -= 1
+            last = self._closed and not self._expected
+        if last:
+            self.flush()
+
+    def add(self, item):
+        """
+        Adds twit to current batch.
+
+        :param item: twit to render, passed to submit function
+        """
+        with self._lock:
+            self._batch.append(item)
+            if len(self._batch) < self.batch_size:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            batch = self._take_batch()
+        self.submit(batch)
+
+    def flush(self):
+        """
+        Submits current batch, even if it's not full.
+        """
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self.submit(batch)
+
+    def _take_batch(self) -> list:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, list()
+        return batch
+
+    def close(self):
+        """
+        Submits current batch; if twits are still expected, the last batch is submitted, when they are arrived.
+        """
+        with self._lock:
+            self._closed = True
+        self.flush()
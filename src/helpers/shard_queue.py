@@ -0,0 +1,238 @@
+import collections
+import json
+import os
+import threading
+import time
+from typing import Iterable, Iterator
+
+import exceptions
+import models
+
+# Shard name and path of its twits file, claimed by worker
+Shard = collections.namedtuple("Shard", ["name", "path"])
+
+
+class ShardQueue:
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    DONE = "done"
+
+    INFO_FILENAME = "queue.json"
+    SHARD_EXTENSION = ".jsonl"
+
+    def __init__(self, path: str, lease_timeout: int = 300):
+        """
+        Queue of twit shards in shared directory; workers on one or several hosts claim shards by atomic
+        rename from pending to claimed directory, so every shard is claimed by one worker only.
+        Claimed shard is leased: worker touches it while shard is processed, and shard of dead worker
+        is returned to pending after lease timeout.
+
+        :param path: queue directory; should be on file system, shared by all workers
+        :param lease_timeout: time (in sec), after which shard without heartbeat is claimed again
+        """
+        self.path = path
+        self.lease_timeout = lease_timeout
+        try:
+            with open(os.path.join(path, self.INFO_FILENAME), 'r', encoding='utf-8') as f:
+                self.info = json.load(f)
+        except (OSError, ValueError) as e:
+            raise exceptions.ShardQueueException(f"Can't open shard queue {path} because of error: {e}.")
+
+    @classmethod
+    def create(cls, path: str, twits: Iterable[models.Twit], shard_size: int = 100, **kwargs):
+        """
+        Splits twits into shards and creates queue.
+
+        :param path: queue directory; should not contain other queue
+        :param twits: Twit objects
+        :param shard_size: number of twits in shard
+        :param lease_timeout: time (in sec), after which shard without heartbeat is claimed again
+        :return: ShardQueue object
+        """
+        if os.path.exists(os.path.join(path, cls.INFO_FILENAME)):
+            raise exceptions.ShardQueueException(f"Shard queue {path} already exists.")
+        try:
+            for state in (cls.PENDING, cls.CLAIMED, cls.DONE):
+                os.makedirs(os.path.join(path, state), exist_ok=True)
+            shards, twits_count, writer = 0, 0, None
+            for twit in twits:
+                if twits_count % shard_size == 0:
+                    if writer is not None:
+                        writer.close()
+                    shards += 1
+                    writer = models.TwitsWriter(os.path.join(path, cls.PENDING, cls.get_shard_name(shards)))
+                writer.write(twit)
+                twits_count += 1
+            if writer is not None:
+                writer.close()
+            # Info file is written last, so workers don't claim shards of incomplete queue
+            cls._write_json(os.path.join(path, cls.INFO_FILENAME), {
+                "shards": shards,
+                "twits": twits_count,
+                "shard_size": shard_size,
+                "created": time.time(),
+            })
+        except OSError as e:
+            raise exceptions.ShardQueueException(f"Can't create shard queue {path} because of error: {e}.")
+        return cls(path, **kwargs)
+
+    @classmethod
+    def get_shard_name(cls, no: int) -> str:
+        return f"shard-{no:06d}{cls.SHARD_EXTENSION}"
+
+    @staticmethod
+    def _write_json(filename: str, data: dict):
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_filename, filename)
+
+    def _list(self, state: str) -> list:
+        try:
+            return sorted(name for name in os.listdir(os.path.join(self.path, state)) if not name.endswith(".tmp"))
+        except OSError as e:
+            raise exceptions.ShardQueueException(f"Can't read shard queue {self.path} because of error: {e}.")
+
+    def claim(self, worker_id: str) -> Shard or None:
+        """
+        Claims the first pending shard; shards of dead workers are returned to pending before.
+
+        :param worker_id: worker id, unique among all hosts
+        :return: claimed shard or None, if there are no pending shards
+        """
+        self.requeue_expired()
+        for name in self._list(self.PENDING):
+            pending_path = os.path.join(self.path, self.PENDING, name)
+            claimed_path = os.path.join(self.path, self.CLAIMED, f"{name}.{worker_id}")
+            try:
+                # Lease starts from claim time, not from time shard was created; rename keeps modification time
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+            except FileNotFoundError:
+                # Shard is claimed by other worker
+                continue
+            return Shard(name, claimed_path)
+        return None
+
+    def heartbeat(self, shard: Shard):
+        """
+        Extends lease of claimed shard.
+
+        :param shard: claimed shard
+        """
+        try:
+            os.utime(shard.path)
+        except FileNotFoundError:
+            pass
+
+    def complete(self, shard: Shard, output_filename: str):
+        """
+        Marks shard as done; output twits file is moved to queue.
+
+        :param shard: claimed shard
+        :param output_filename: processed twits of shard (JSON Lines), on the same file system as queue
+        """
+        os.replace(output_filename, os.path.join(self.path, self.DONE, shard.name))
+        try:
+            os.remove(shard.path)
+        except FileNotFoundError:
+            # Lease is expired, and shard is returned to pending or claimed by other worker; it's done anyway
+            pending_path = os.path.join(self.path, self.PENDING, shard.name)
+            if os.path.exists(pending_path):
+                os.remove(pending_path)
+
+    def release(self, shard: Shard):
+        """
+        Returns unfinished shard to pending, e.g. if worker is stopped.
+
+        :param shard: claimed shard
+        """
+        try:
+            os.rename(shard.path, os.path.join(self.path, self.PENDING, shard.name))
+        except FileNotFoundError:
+            pass
+
+    def requeue_expired(self) -> int:
+        """
+        Returns claimed shards, which lease is expired, to pending.
+
+        :return: number of returned shards
+        """
+        requeued = 0
+        expired = time.time() - self.lease_timeout
+        for claimed_name in self._list(self.CLAIMED):
+            claimed_path = os.path.join(self.path, self.CLAIMED, claimed_name)
+            name = claimed_name[:claimed_name.index(self.SHARD_EXTENSION) + len(self.SHARD_EXTENSION)]
+            try:
+                if os.path.getmtime(claimed_path) >= expired:
+                    continue
+                if os.path.exists(os.path.join(self.path, self.DONE, name)):
+                    os.remove(claimed_path)
+                else:
+                    os.rename(claimed_path, os.path.join(self.path, self.PENDING, name))
+                    requeued += 1
+            except FileNotFoundError:
+                # Shard is completed or requeued by other worker
+                continue
+        return requeued
+
+    def status(self) -> dict:
+        return {
+            "shards": self.info["shards"],
+            self.PENDING: len(self._list(self.PENDING)),
+            self.CLAIMED: len(self._list(self.CLAIMED)),
+            self.DONE: len(self._list(self.DONE)),
+        }
+
+    def is_finished(self) -> bool:
+        return len(self._list(self.DONE)) >= self.info["shards"]
+
+    def get_output_filename(self, worker_id: str, shard: Shard) -> str:
+        """
+        Returns temporary file name for processed twits of shard, on the same file system as queue.
+
+        :param worker_id: worker id
+        :param shard: claimed shard
+        :return: file name
+        """
+        return os.path.join(self.path, self.DONE, f"{shard.name}.{worker_id}.tmp")
+
+    def iter_results(self, partial: bool = False) -> Iterator[models.Twit]:
+        """
+        Reads processed twits of all shards in order of shards.
+
+        :param partial: skip shards, that are not done; otherwise queue should be finished
+        :return: iterator of Twit objects
+        """
+        if not partial and not self.is_finished():
+            status = self.status()
+            raise exceptions.ShardQueueException(
+                f"Shard queue {self.path} is not finished: {status[self.DONE]} of {status['shards']} shards are done."
+            )
+        for no in range(1, self.info["shards"] + 1):
+            filename = os.path.join(self.path, self.DONE, self.get_shard_name(no))
+            if partial and not os.path.exists(filename):
+                continue
+            yield from models.Twits.iter_from_file(filename)
+
+
+class ShardHeartbeat(threading.Thread):
+    def __init__(self, queue: ShardQueue, shard: Shard):
+        """
+        Extends lease of claimed shard in background, while worker processes it.
+
+        :param queue: shard queue
+        :param shard: claimed shard
+        """
+        super().__init__(name="shard-heartbeat", daemon=True)
+        self.queue = queue
+        self.shard = shard
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(max(1.0, self.queue.lease_timeout / 3)):
+            self.queue.heartbeat(self.shard)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
@@ -0,0 +1,264 @@
+import logging
+import os
+import threading
+import time
+
+import models
+from helpers.browser_pool import BrowserPool
+from helpers.embed_prefetcher import EmbedPrefetcher
+from helpers.metrics import Metrics
+from helpers.post_process_stage import PostProcessStage
+
+# Stages, which durations are render latency of browser: one twit or batch of twits
+RENDER_STAGES = ("render", "render_batch")
+MEMINFO_FILE = "/proc/meminfo"
+
+
+class ThroughputController:
+    def __init__(self, config: models.AutotuneConfig, pool: BrowserPool or None, prefetcher: EmbedPrefetcher,
+                 post_process_stage: PostProcessStage, metrics: Metrics, **kwargs):
+        """
+        Tunes concurrency of processing stages, while twits are processed, to get the most twits per minute.
+        Every interval throughput, render latency, error rates, CPU load and available memory of host are checked,
+        and parallel renders, oEmbed request rate and post-processing workers are adjusted by AIMD:
+        limit of stage is increased by one step, while stage has more work, than it's allowed to do,
+        and is multiplied by decrease factor, when host is overloaded, or errors or latency of stage grow.
+        Renders and post-processing workers start from one and grow up to configured pool size and workers,
+        so latency of one render is known, before browsers compete for host. Settings are tuned only between
+        start and stop; after stop, configured settings are restored.
+
+        :param config: autotune config
+        :param pool: browser pool; if not set, renders aren't tuned
+        :param prefetcher: twit embeds prefetcher
+        :param post_process_stage: post-processing stage; if it has no workers, post-processing isn't tuned
+        :param metrics: durations of processing stages
+        :param logger: application logger
+        """
+        self.config = config
+        self.pool = pool
+        self.prefetcher = prefetcher
+        self.post_process_stage = post_process_stage
+        self.metrics = metrics
+        self.logger = kwargs.get('logger', logging.getLogger("downloadTwits"))
+        self.processed = 0
+        self.failed = 0
+        self.best_render_latency = None
+        self.best_throughput = None
+        self.best_settings = None
+        self._lock = threading.Lock()
+        self._counters = None
+        self._window_started = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._configured_settings = None
+
+    def record_twit(self, processed: bool):
+        """
+        Records result of twit processing.
+
+        :param processed: twit is processed successfully; otherwise it's failed
+        """
+        with self._lock:
+            if processed:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def start(self):
+        """
+        Starts tuning in background thread.
+        """
+        self._configured_settings = (
+            self.pool.limit if self.pool is not None else None,
+            self.prefetcher.rate_limiter.rate,
+            self.post_process_stage.limit
+        )
+        self.prefetcher.rate_limiter.set_rate(self.config.embed_rate)
+        if self.pool is not None:
+            self.pool.set_limit(1)
+        if self.post_process_stage.executor is not None:
+            self.post_process_stage.set_limit(1)
+        self._counters = self.get_counters()
+        self._window_started = time.monotonic()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="autotune", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Autotune: started with {self.format_settings()}.")
+
+    def stop(self):
+        """
+        Stops tuning, restores configured settings and logs settings with the best throughput.
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        pool_limit, embed_rate, post_process_limit = self._configured_settings
+        if self.pool is not None:
+            self.pool.set_limit(pool_limit)
+        self.prefetcher.rate_limiter.set_rate(embed_rate)
+        if self.post_process_stage.executor is not None:
+            self.post_process_stage.set_limit(post_process_limit)
+        if self.best_settings is not None:
+            self.logger.info(
+                f"Autotune: the best throughput {self.best_throughput:.1f} twits/min was reached with "
+                f"{self.best_settings}."
+            )
+
+    def _run(self):
+        while not self._stopped.wait(self.config.interval):
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.error(f"Autotune: unable to adjust settings: {e}")
+
+    def get_counters(self) -> dict:
+        totals = self.metrics.totals()
+        with self._lock:
+            counters = {"processed": self.processed, "failed": self.failed}
+        counters["render_count"] = sum(totals.get(stage, (0, 0.0))[0] for stage in RENDER_STAGES)
+        counters["render_time"] = sum(totals.get(stage, (0, 0.0))[1] for stage in RENDER_STAGES)
+        counters["render_contended"] = self.pool.contended if self.pool is not None else 0
+        counters["post_process_contended"] = self.post_process_stage.contended
+        counters["embed_requests"] = self.prefetcher.rate_limiter.requests
+        counters["embed_throttled"] = self.prefetcher.rate_limiter.throttled
+        counters["embed_delayed"] = self.prefetcher.rate_limiter.delayed
+        return counters
+
+    def format_settings(self) -> str:
+        settings = list()
+        if self.pool is not None:
+            settings.append(f"parallel renders {self.pool.limit}")
+        settings.append(f"oEmbed rate {self.prefetcher.rate_limiter.rate:.1f} requests/sec")
+        if self.post_process_stage.executor is not None:
+            settings.append(f"post-processing workers {self.post_process_stage.limit}")
+        return ", ".join(settings)
+
+    def step(self):
+        """
+        Checks stages and host for last interval and adjusts settings.
+        """
+        now = time.monotonic()
+        counters = self.get_counters()
+        window = {name: value - self._counters[name] for name, value in counters.items()}
+        elapsed = now - self._window_started
+        self._counters, self._window_started = counters, now
+        if elapsed <= 0:
+            return
+
+        throughput = window["processed"] * 60 / elapsed
+        finished = window["processed"] + window["failed"]
+        error_rate = window["failed"] / finished if finished else 0.0
+        embed_error_rate = window["embed_throttled"] / window["embed_requests"] if window["embed_requests"] else 0.0
+        render_latency = window["render_time"] / window["render_count"] if window["render_count"] else None
+        if render_latency is not None and (self.best_render_latency is None
+                                           or render_latency < self.best_render_latency):
+            self.best_render_latency = render_latency
+        load = self.get_cpu_load()
+        memory = self.get_available_memory()
+        self.logger.debug(
+            f"Autotune: {throughput:.1f} twits/min, {error_rate:.0%} twits failed, "
+            f"{embed_error_rate:.0%} oEmbed requests throttled, render latency "
+            f"{render_latency if render_latency is not None else 0.0:.2f} sec, CPU load "
+            f"{load if load is not None else 0.0:.2f} per core, "
+            f"{memory // (1024 * 1024) if memory is not None else '-'} MB memory available."
+        )
+        settings = self.format_settings()
+        if finished and (self.best_throughput is None or throughput > self.best_throughput):
+            self.best_throughput, self.best_settings = throughput, settings
+
+        overload = None
+        if load is not None and load > self.config.max_load:
+            overload = f"CPU load {load:.2f} per core"
+        elif memory is not None and memory < self.config.min_memory * 1024 * 1024:
+            overload = f"{memory // (1024 * 1024)} MB memory available"
+
+        if self.pool is not None:
+            reason = overload
+            if reason is None and error_rate > self.config.max_error_rate:
+                reason = f"{error_rate:.0%} twits failed"
+            if reason is None and render_latency is not None and self.pool.limit > 1 and \
+                    render_latency > self.best_render_latency * self.config.max_latency_growth:
+                reason = f"render latency {render_latency:.2f} sec, the best is {self.best_render_latency:.2f} sec"
+            if reason is not None:
+                self.set_renders(self.decrease(self.pool.limit), reason, throughput)
+            elif window["render_contended"]:
+                self.set_renders(self.pool.limit + 1, "twits wait for browsers", throughput)
+
+        if self.post_process_stage.executor is not None:
+            if overload is not None:
+                self.set_post_process_workers(self.decrease(self.post_process_stage.limit), overload, throughput)
+            elif window["post_process_contended"]:
+                self.set_post_process_workers(
+                    self.post_process_stage.limit + 1, "screenshots wait for post-processing", throughput
+                )
+
+        rate = self.prefetcher.rate_limiter.rate
+        if embed_error_rate > self.config.max_error_rate:
+            self.set_embed_rate(
+                max(self.config.min_embed_rate, rate * self.config.decrease),
+                f"{embed_error_rate:.0%} oEmbed requests throttled",
+                throughput
+            )
+        elif window["embed_delayed"]:
+            self.set_embed_rate(
+                min(self.config.max_embed_rate, rate + self.config.embed_rate_step),
+                "oEmbed requests wait for rate limit",
+                throughput
+            )
+
+    def decrease(self, limit: int) -> int:
+        return max(1, int(limit * self.config.decrease))
+
+    def set_renders(self, limit: int, reason: str, throughput: float):
+        old_limit = self.pool.limit
+        self.pool.set_limit(limit)
+        if self.pool.limit != old_limit:
+            self.logger.info(
+                f"Autotune: parallel renders {old_limit} -> {self.pool.limit}: {reason}; "
+                f"throughput {throughput:.1f} twits/min."
+            )
+
+    def set_post_process_workers(self, limit: int, reason: str, throughput: float):
+        old_limit = self.post_process_stage.limit
+        self.post_process_stage.set_limit(limit)
+        if self.post_process_stage.limit != old_limit:
+            self.logger.info(
+                f"Autotune: post-processing workers {old_limit} -> {self.post_process_stage.limit}: {reason}; "
+                f"throughput {throughput:.1f} twits/min."
+            )
+
+    def set_embed_rate(self, rate: float, reason: str, throughput: float):
+        old_rate = self.prefetcher.rate_limiter.rate
+        if rate == old_rate:
+            return
+        self.prefetcher.rate_limiter.set_rate(rate)
+        self.logger.info(
+            f"Autotune: oEmbed rate {old_rate:.1f} -> {rate:.1f} requests/sec: {reason}; "
+            f"throughput {throughput:.1f} twits/min."
+        )
+
+    @staticmethod
+    def get_cpu_load() -> float or None:
+        """
+        Returns 1 minute load average of host per CPU core; None, if it's not supported by OS.
+        """
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return None
+
+    @staticmethod
+    def get_available_memory() -> int or None:
+        """
+        Returns memory, available for new processes (in bytes); None, if it's not supported by OS.
+        """
+        try:
+            with open(MEMINFO_FILE, 'r') as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            return None
+        return None
@@ -1,9 +1,18 @@
 import re
-import requests
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
 
 import exceptions
 
+if TYPE_CHECKING:
+    # Requests is imported only when Twitter API is requested, so CLI starts faster
+    import requests
+
 TWITTER_URL_DATA_REGEXP = r"(http)?(s)?(:\/\/)?twitter\.com\/(?P<author>[A-Z,a-z,0-9,_]+)\/status\/(?P<id>[0-9]+)(\/)?"
+TWITTER_OEMBED_URL = "https://publish.twitter.com/oembed"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 
 class TwitterEmbedAPI:
@@ -14,10 +23,101 @@ class TwitterEmbedAPI:
         return found.groupdict()
 
     @staticmethod
-    def get_twit_embed_html(url: str, embed_params: dict) -> str:
-        embed_params['url'] = url
-        r = requests.get('https://publish.twitter.com/oembed', params=embed_params)
+    def create_session(pool_size: int = 10) -> 'requests.Session':
+        """
+        Creates HTTP session with keep-alive connections, shared between threads.
+
+        :param pool_size: maximum number of connections in pool
+        :return: session
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def get_retry_delay(response: 'requests.Response' or None, attempt: int, backoff_factor: float) -> float:
+        """
+        Returns delay before next request: Retry-After header value if set, exponential backoff otherwise.
+
+        :param response: failed response; None, if request is failed because of connection error
+        :param attempt: number of failed attempt, starting from 0
+        :param backoff_factor: backoff factor (in sec)
+        :return: delay (in sec)
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+        return backoff_factor * (2 ** attempt)
+
+    @staticmethod
+    def get_twit_embed_html(url: str, embed_params: dict, api_url: str = TWITTER_OEMBED_URL, **kwargs) -> str:
+        """
+        Returns embed HTML of twit from Twitter oEmbed API.
+
+        :param url: twit URL
+        :param embed_params: Twitter embed parameters
+        :param api_url: Twitter oEmbed API URL
+        :param session: requests session; if not set, new connection is used
+        :param cache: EmbedCache object; if set, embed HTML is cached
+        :param refresh_cache: get embed HTML from API even if it's cached
+        :param max_retries: number of retries, if API is rate-limited or unavailable
+        :param backoff_factor: initial delay between retries (in sec), doubled on every retry
+        :param timeout: request timeout (in sec)
+        :param rate_limiter: RateLimiter object; if set, requests are spaced by it and their responses are recorded
+        :return: embed HTML
+        """
+        import requests
+
+        cache = kwargs.get('cache', None)
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.get_key(TwitterEmbedAPI.get_twit_url_data(url)['id'], embed_params)
+            if not kwargs.get('refresh_cache', False):
+                cached_html = cache.get(cache_key)
+                if cached_html is not None:
+                    return cached_html
+
+        session = kwargs.get('session', None) or requests
+        rate_limiter = kwargs.get('rate_limiter', None)
+        max_retries = kwargs.get('max_retries', 0)
+        backoff_factor = kwargs.get('backoff_factor', 1.0)
+        params = dict(embed_params or {})
+        params['url'] = url
+        for attempt in range(max_retries + 1):
+            if rate_limiter is not None:
+                rate_limiter.wait()
+            try:
+                r = session.get(api_url, params=params, timeout=kwargs.get('timeout', None))
+            except requests.RequestException as e:
+                if rate_limiter is not None:
+                    rate_limiter.record(throttled=True)
+                if attempt >= max_retries:
+                    raise exceptions.TwitterAPIRequestError(api_url, "GET", None, str(e))
+                time.sleep(TwitterEmbedAPI.get_retry_delay(None, attempt, backoff_factor))
+                continue
+            if rate_limiter is not None:
+                rate_limiter.record(throttled=r.status_code in RETRY_STATUS_CODES)
+            if r.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+                time.sleep(TwitterEmbedAPI.get_retry_delay(r, attempt, backoff_factor))
+                continue
+            break
         r.encoding = 'utf-8'
         if r.status_code != 200 or not r.json() or 'html' not in r.json():
             raise exceptions.TwitterAPIRequestError(r.url, "GET", r.status_code, r.text)
-        return r.json().get('html')
+        html = r.json().get('html')
+
+        if cache is not None:
+            cache.put(cache_key, html)
+        return html
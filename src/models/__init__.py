@@ -1,2 +1,3 @@
-from .app_config import HeadlessBrowserConfig, DownloadConfig, PostProcessConfig, AppConfig
-from .twits import Twit, Twits
+from .app_config import HeadlessBrowserConfig, DownloadConfig, VariantConfig, PostProcessConfig, EmbedApiConfig, \
+    EmbedCacheConfig, AutotuneConfig, AppConfig
+from .twits import Twit, Twits, TwitsWriter
@@ -1,17 +1,33 @@
 import json
+import re
+
 from schematics.exceptions import ValidationError
 # noinspection PyProtectedMember
 from schematics.models import Model
-from schematics.types import StringType, DictType, ModelType, BooleanType
+from schematics.types import StringType, DictType, ModelType, ListType, BooleanType, IntType, FloatType
 
 import exceptions
 
 
 class HeadlessBrowserConfig(Model):
     name = StringType(required=True)
-    executable_path = StringType(required=True)
+    executable_path = StringType()
+    fallback = StringType(choices=["phantomjs", "chrome"])
+    font = StringType()
+    wait_mode = StringType(default="ready", choices=["ready", "delay"])
+    delay = IntType(default=20)
+    ready_timeout = IntType(default=20)
+    pool_size = IntType(default=1, min_value=1)
+    render_mode = StringType(default="inject", choices=["inject", "file"])
+    capture = StringType(default="viewport", choices=["viewport", "element"])
+    render_timeout = IntType(default=60, min_value=0)
+    max_renders = IntType(default=500, min_value=0)
+    max_memory = IntType(default=0, min_value=0)
+    restart_attempts = IntType(default=3, min_value=1)
+    batch_size = IntType(default=1, min_value=1)
+    batch_wait = FloatType(default=0.5, min_value=0)
 
-    SUPPORTED_BROWSERS = ['phantomjs', 'chrome']
+    SUPPORTED_BROWSERS = ['phantomjs', 'chrome', 'card']
 
     def validate_name(self, data, value):
         if value not in self.SUPPORTED_BROWSERS:
@@ -21,23 +37,115 @@ class HeadlessBrowserConfig(Model):
             )
         return value
 
+    def validate_render_timeout(self, data, value):
+        # Browser is killed by render timeout, so twit should be rendered before it, including waiting time
+        if not value:
+            return value
+        if data.get('wait_mode') == "delay":
+            wait_option, wait_time = "delay", data.get('delay')
+        else:
+            wait_option, wait_time = "ready_timeout", data.get('ready_timeout')
+        if wait_time is not None and wait_time >= value:
+            raise ValidationError(
+                f"Render timeout {value} should be greater than {wait_option} {wait_time}, data: {data}"
+            )
+        return value
+
+    def validate_executable_path(self, data, value):
+        # Card renderer doesn't need browser, unless twits with media are rendered by fallback browser
+        if not value and (data.get('name') != 'card' or data.get('fallback')):
+            raise ValidationError(f"Executable path of browser is required, data: {data}")
+        return value
+
 
 class DownloadConfig(Model):
     path = StringType(required=True)
     template = StringType(default="{id}.png")
+    duplicates = StringType(default="reference", choices=["reference", "link"])
+    directory_size = IntType(default=0, min_value=0)
+    counters_path = StringType(default=".cache/filename-counters")
+
+
+class VariantConfig(Model):
+    name = StringType(required=True)
+    width = IntType(min_value=1)
+    height = IntType(min_value=1)
+    format = StringType(default="png", choices=["png", "webp", "jpeg"])
+    quality = IntType(min_value=1, max_value=100)
+
+    FILE_EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+    def validate_name(self, data, value):
+        if not re.match(r"^[A-Za-z0-9_-]+$", value):
+            raise ValidationError(f"Variant name {value} should contain only letters, digits, _ and -")
+        return value
+
+    @property
+    def file_extension(self) -> str:
+        return self.FILE_EXTENSIONS[self.format]
+
+    @property
+    def resize_options(self) -> dict or None:
+        size = {key: str(value) for key, value in (("width", self.width), ("height", self.height)) if value}
+        return size or None
 
 
 class PostProcessConfig(Model):
     resize = BooleanType(default=False)
     resize_options = DictType(StringType)
     trim = BooleanType(default=False)
+    variants = ListType(ModelType(VariantConfig), default=list)
+    workers = IntType(default=2, min_value=0)
+    max_pending = IntType(default=8, min_value=1)
+
+    def validate_variants(self, data, value):
+        names = [variant.name for variant in value or []]
+        if len(names) != len(set(names)):
+            raise ValidationError(f"Variant names should be unique: {', '.join(names)}")
+        return value
+
+
+class EmbedApiConfig(Model):
+    url = StringType(default="https://publish.twitter.com/oembed")
+    workers = IntType(default=8, min_value=1)
+    prefetch = IntType(default=32, min_value=1)
+    max_retries = IntType(default=5, min_value=0)
+    backoff_factor = FloatType(default=1.0, min_value=0)
+    timeout = IntType(default=30, min_value=1)
+
+
+class EmbedCacheConfig(Model):
+    path = StringType(default=".cache/embeds.sqlite")
+    ttl = IntType(default=604800, min_value=0)
+    max_size = IntType(default=67108864, min_value=0)
+
+
+class AutotuneConfig(Model):
+    interval = FloatType(default=10.0, min_value=1)
+    max_load = FloatType(default=0.9, min_value=0.1)
+    min_memory = IntType(default=512, min_value=0)
+    max_error_rate = FloatType(default=0.05, min_value=0, max_value=1)
+    max_latency_growth = FloatType(default=2.0, min_value=1)
+    decrease = FloatType(default=0.5, min_value=0.1, max_value=0.9)
+    embed_rate = FloatType(default=10.0, min_value=0.1)
+    min_embed_rate = FloatType(default=0.5, min_value=0.1)
+    max_embed_rate = FloatType(default=50.0, min_value=0.1)
+    embed_rate_step = FloatType(default=1.0, min_value=0.1)
+
+    def validate_max_embed_rate(self, data, value):
+        if value is not None and data.get('min_embed_rate') is not None and value < data['min_embed_rate']:
+            raise ValidationError(f"Maximum embed rate {value} is less than minimum embed rate, data: {data}")
+        return value
 
 
 class AppConfig(Model):
     headless_browser = ModelType(HeadlessBrowserConfig, required=True)
     twit_embed = DictType(StringType)
+    embed_api = ModelType(EmbedApiConfig, default=EmbedApiConfig)
+    embed_cache = ModelType(EmbedCacheConfig)
     download = ModelType(DownloadConfig, required=True)
     postprocess = ModelType(PostProcessConfig)
+    autotune = ModelType(AutotuneConfig)
 
     @classmethod
     def load_from_file(cls, json_file: str):
@@ -1,8 +1,10 @@
 import json
+from typing import Iterator
+
 from schematics.exceptions import ValidationError
 # noinspection PyProtectedMember
 from schematics.models import Model
-from schematics.types import StringType, ModelType, ListType
+from schematics.types import StringType, ModelType, ListType, DictType
 
 import exceptions
 
@@ -12,16 +14,125 @@ class Twit(Model):
     emoji = StringType(default="")
     image = StringType(default="")
     text = StringType(default="")
+    author = StringType()
+    author_name = StringType()
+    date = StringType()
+    lang = StringType()
+    links = ListType(StringType)
+    variants = DictType(StringType)
+    image_hash = StringType()
+    variant_hashes = DictType(StringType)
+
+    @classmethod
+    def is_valid_data(cls, data) -> bool:
+        """
+        Fast check of twit data with plain type checks; schematics validation is much slower, so it's used
+        only for data, that doesn't pass this check, to get detailed errors.
+
+        :param data: twit data
+        :return: True if data is valid twit
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('url', None), str) or not data['url']:
+            return False
+        for key, value in data.items():
+            field = cls._fields.get(key, None)
+            if field is None:
+                return False
+            if value is None:
+                continue
+            if isinstance(field, StringType):
+                if not isinstance(value, str):
+                    return False
+            elif isinstance(field, ListType):
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    return False
+            elif not isinstance(value, dict) or \
+                    not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+                return False
+        return True
+
+    @classmethod
+    def from_data(cls, data: dict):
+        """
+        Creates validated Twit object.
+
+        :param data: twit data
+        :return: Twit object
+        """
+        twit = cls(data)
+        if not cls.is_valid_data(data):
+            twit.validate()
+        return twit
+
+    def to_data(self) -> dict:
+        """
+        Returns validated twit data; faster than validate() and to_primitive().
+
+        :return: twit data
+        """
+        data = {name: self.get(name) for name in self._fields}
+        if self.is_valid_data(data):
+            return {name: dict(value) if isinstance(value, dict) else list(value) if isinstance(value, list) else value
+                    for name, value in data.items()}
+        self.validate()
+        return self.to_primitive()
 
 
 class Twits(Model):
     twits = ListType(ModelType(Twit))
 
+    JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+    @classmethod
+    def is_json_lines_file(cls, filename: str) -> bool:
+        return filename.lower().endswith(cls.JSON_LINES_EXTENSIONS)
+
+    @staticmethod
+    def iter_from_file(jsonl_file: str) -> Iterator[Twit]:
+        """
+        Reads twits from JSON Lines file one by one; every line is twit object.
+
+        :param jsonl_file: JSON Lines file path
+        :return: iterator of validated Twit objects
+        """
+        try:
+            with open(jsonl_file, 'r', encoding='utf-8') as twits_file:
+                for line_no, line in enumerate(twits_file, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        twit = Twit.from_data(json.loads(line))
+                    except ValidationError as e:
+                        raise exceptions.TwitsConfigValidationError(
+                            f"File {jsonl_file} can't validated at line {line_no}: errors {e}"
+                        )
+                    except Exception as e:
+                        raise exceptions.TwitsConfigValidationError(
+                            f"Unexpected error {e} at line {line_no}."
+                        )
+                    yield twit
+        except FileNotFoundError:
+            raise exceptions.TwitsConfigValidationError(
+                f"File {jsonl_file} is not found."
+            )
+
+    @staticmethod
+    def is_valid_data(data) -> bool:
+        """
+        Fast check of twits data, see Twit.is_valid_data.
+
+        :param data: twits data
+        :return: True if data is valid twits
+        """
+        return isinstance(data, dict) and set(data) <= {"twits"} and isinstance(data.get("twits", None), list) and \
+            all(Twit.is_valid_data(twit_data) for twit_data in data["twits"])
+
     @classmethod
     def load_from_file(cls, json_file: str):
         try:
             with open(json_file, 'r', encoding='utf-8') as twits_file:
-                twits = Twits(json.loads("".join(twits_file.readlines())))
+                data = json.loads("".join(twits_file.readlines()))
+                twits = Twits(data)
         except FileNotFoundError:
             raise exceptions.TwitsConfigValidationError(
                 f"File {json_file} is not found."
@@ -31,7 +142,8 @@ class Twits(Model):
                 f"Unexpected error {e}."
             )
         try:
-            twits.validate()
+            if not cls.is_valid_data(data):
+                twits.validate()
         except ValidationError as e:
             raise exceptions.TwitsConfigValidationError(
                 f"File {json_file} can't validated: errors {e}"
@@ -44,7 +156,7 @@ class Twits(Model):
 
     def save_to_file(self, json_file: str) -> bool:
         try:
-            self.validate()
+            data = {"twits": [twit.to_data() for twit in self.twits] if self.twits is not None else None}
         except ValidationError as e:
             raise exceptions.TwitsConfigValidationError(
                 f"Twits can't validated before saving: errors {e}"
@@ -55,9 +167,43 @@ class Twits(Model):
             )
         try:
             with open(json_file, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(self.to_primitive(), ensure_ascii=False, indent=4))
+                f.write(json.dumps(data, ensure_ascii=False, indent=4))
         except Exception as e:
             raise exceptions.TwitsConfigValidationError(
                 f"Unexpected error {str(e)}."
             )
         return True
+
+
+class TwitsWriter:
+    def __init__(self, jsonl_file: str):
+        """
+        Writes twits to JSON Lines file one by one.
+
+        :param jsonl_file: JSON Lines file path
+        """
+        try:
+            self._file = open(jsonl_file, 'w', encoding='utf-8')
+        except Exception as e:
+            raise exceptions.TwitsConfigValidationError(
+                f"Unexpected error {str(e)}."
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, twit: Twit):
+        try:
+            data = twit.to_data()
+        except ValidationError as e:
+            raise exceptions.TwitsConfigValidationError(
+                f"Twit can't validated before saving: errors {e}"
+            )
+        self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
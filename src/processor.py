@@ -1,13 +1,29 @@
 #!/usr/bin/python
+import collections
 import logging
 import os
 import random
+import shutil
 import string
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
 
 import exceptions
 import models
-from helpers.headless_browser import create_browser
-from helpers.image_processor import ImageProcessor
+from helpers.browser_pool import BrowserPool, BrowserWorker
+from helpers.headless_browser import TWIT_ELEMENT_SELECTOR, TWIT_ITEM_ELEMENT_SELECTORS, TWIT_ITEM_ID
+from helpers.embed_cache import EmbedCache
+from helpers.embed_parser import EmbedData, EmbedParser
+from helpers.embed_prefetcher import EmbedPrefetcher
+from helpers.filename_allocator import FilenameAllocator
+from helpers.image_store import ImageStore
+from helpers.manifest import Manifest
+from helpers.metrics import Metrics
+from helpers.post_process_stage import PostProcessResult, PostProcessStage
+from helpers.render_batcher import RenderBatcher
+from helpers.throughput_controller import ThroughputController
 from helpers.twitter_embed_api import TwitterEmbedAPI
 
 app_logger = logging.getLogger("downloadTwits")
@@ -15,38 +31,184 @@ app_logger.setLevel(logging.INFO)
 
 CURRENT_PATH = os.getcwd()
 
+TwitResult = collections.namedtuple("TwitResult", ["twit", "status"])
+# Screenshot PNG; crop box of twit element, if screenshot is not cropped by browser;
+# clipped is True, if screenshot contains only twit element
+Screenshot = collections.namedtuple("Screenshot", ["png", "crop", "clipped"])
+# Twit, which waits for batch render, and future of its twit text and screenshot
+RenderItem = collections.namedtuple("RenderItem", ["twit", "embed_html", "twit_text", "future"])
+# Result of the first twit with status id, which is shared with its duplicates; unlike Twit object,
+# it's kept until the end of twits
+DuplicateSource = collections.namedtuple(
+    "DuplicateSource", ["url", "status", "image", "variants", "image_hash", "variant_hashes", "metadata"]
+)
+# Number of the last status ids, which results are kept for duplicates; duplicates of older twits are rendered again,
+# so memory doesn't grow with number of twits
+MAX_DUPLICATE_SOURCES = 10000
+
 
 class TwitProcessor:
+    STATUS_SKIPPED = "skipped"
+    STATUS_PROCESSED = "processed"
+    STATUS_FAILED = "failed"
+
+    TWIT_TEXT_XPATHS = ["//blockquote/div[2]/p", "//blockquote/p"]
+    # Twit fields, which are filled from twit embed
+    TWIT_METADATA_FIELDS = ("text", "author", "author_name", "date", "lang", "links", "emoji")
+
     def __init__(self, app_config: models.AppConfig, **kwargs):
         self.app_config = app_config
         self.logger = kwargs.get('logger', app_logger)
+        self.metrics = Metrics()
+
+        self.embed_cache = None
+        if self.app_config.embed_cache and kwargs.get('use_embed_cache', True):
+            self.embed_cache = EmbedCache.from_config(self.app_config.embed_cache)
+        self.prefetcher = EmbedPrefetcher(
+            self.app_config.embed_api,
+            self.app_config.twit_embed,
+            cache=self.embed_cache,
+            refresh_cache=kwargs.get('refresh_embed_cache', False),
+            metrics=self.metrics
+        )
 
-        self.browser = self.init_browser(self.app_config.headless_browser)
+        if self.app_config.postprocess:
+            self.post_process_stage = PostProcessStage(
+                workers=self.app_config.postprocess.workers,
+                max_pending=self.app_config.postprocess.max_pending,
+                metrics=self.metrics
+            )
+        else:
+            self.post_process_stage = PostProcessStage(workers=0, metrics=self.metrics)
+
+        self.manifest = None
+        if kwargs.get('manifest_file', None):
+            self.manifest = Manifest(kwargs['manifest_file'])
+        self.config_hash = self.get_config_hash()
+
+        # In text only mode, twits are not rendered, so browsers are not started
+        self.text_only = kwargs.get('text_only', False)
+        self.pool = None if self.text_only else self.init_browser_pool(self.app_config.headless_browser)
+        # Browsers for twits with media, if twits are rendered by card renderer; started with the first such twit
+        self.fallback_pool = None
+        self._fallback_pool_lock = threading.Lock()
+        self.filename_allocator = FilenameAllocator(
+            counters_path=self.app_config.download.counters_path,
+            directory_size=self.app_config.download.directory_size
+        )
+        self.controller = None
+        if self.app_config.autotune:
+            self.controller = ThroughputController(
+                self.app_config.autotune,
+                self.pool,
+                self.prefetcher,
+                self.post_process_stage,
+                self.metrics,
+                logger=self.logger
+            )
 
-    def init_browser(self, headless_browser_config: models.HeadlessBrowserConfig):
+    def init_browser_pool(self, headless_browser_config: models.HeadlessBrowserConfig) -> BrowserPool:
         try:
-            self.logger.debug(f"Creating browser {headless_browser_config.name}.")
-            browser = create_browser(headless_browser_config)
-            return browser
+            self.logger.debug(f"Creating {headless_browser_config.pool_size} browsers {headless_browser_config.name}.")
+            return BrowserPool(headless_browser_config, size=headless_browser_config.pool_size, logger=self.logger)
         except exceptions.HeadlessBrowserException as e:
             self.logger.error(f"{e}")
-            return None
+            raise
+
+    def get_render_pool(self, twit_embed_html: str) -> BrowserPool:
+        """
+        Returns pool, that renders twit: card renderer draws text only, so twits with media are rendered
+        by fallback browsers, if they are configured
+
+        :param twit_embed_html: twit embed HTML
+        :return: browser pool
+        """
+        headless_browser_config = self.app_config.headless_browser
+        if headless_browser_config.name != 'card' or not headless_browser_config.fallback:
+            return self.pool
+        if not EmbedParser.parse(twit_embed_html).has_media:
+            return self.pool
+        with self._fallback_pool_lock:
+            if self.fallback_pool is None:
+                fallback_config = models.HeadlessBrowserConfig(
+                    dict(headless_browser_config.to_primitive(), name=headless_browser_config.fallback, fallback=None)
+                )
+                self.fallback_pool = self.init_browser_pool(fallback_config)
+        return self.fallback_pool
 
-    def get_twit_text(self) -> str or None:
-        xpath_queries = ["//blockquote/div[2]/p", "//blockquote/p"]
-        for xpath_query in xpath_queries:
-            twit_text = self.browser.get_element_text(xpath_query)
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        if self.fallback_pool is not None:
+            self.fallback_pool.close()
+        self.prefetcher.close()
+        self.post_process_stage.close()
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.embed_cache is not None:
+            self.embed_cache.close()
+
+    def stats(self) -> str:
+        if self.pool is None:
+            return "text only"
+        fallback_stats = f"; fallback {self.fallback_pool.stats()}" if self.fallback_pool is not None else ""
+        return f"rendering: {self.pool.stats()}{fallback_stats}; {self.post_process_stage.stats()}"
+
+    def parse_twit_embed(self, twit: models.Twit, twit_embed_html: str) -> EmbedData:
+        """
+        Parses text and metadata of twit from embed HTML and sets them to Twit object
+
+        :param twit: Twit object
+        :param twit_embed_html: twit embed HTML
+        :return: twit data
+        """
+        with self.metrics.time("embed_parse"):
+            embed_data = EmbedParser.parse(twit_embed_html)
+        twit.text = embed_data.text or ""
+        twit.author = embed_data.author_screen_name
+        twit.author_name = embed_data.author_name
+        twit.date = embed_data.date
+        twit.lang = embed_data.lang
+        twit.links = embed_data.links or None
+        twit.emoji = embed_data.emoji
+        return embed_data
+
+    @staticmethod
+    def get_twit_text(worker: BrowserWorker) -> str or None:
+        for xpath_query in TwitProcessor.TWIT_TEXT_XPATHS:
+            twit_text = worker.browser.get_element_text(xpath_query)
             if twit_text is not None:
                 return twit_text
         return None
 
+    def wait_for_twit(self, twit: models.Twit, worker: BrowserWorker, count: int = 1) -> float:
+        """
+        Waits until twit is rendered in browser, using configured wait mode
+
+        :param twit: Twit object
+        :param worker: browser worker, that renders twit
+        :param count: number of twits on page, if twit is rendered in batch
+        :return: real waiting time (in sec)
+        """
+        headless_browser_config = self.app_config.headless_browser
+        if headless_browser_config.wait_mode == 'delay':
+            waited = worker.browser.wait_for_delay(headless_browser_config.delay)
+        else:
+            waited = worker.browser.wait_until_rendered(timeout=headless_browser_config.ready_timeout, count=count)
+            if waited >= headless_browser_config.ready_timeout:
+                batch_str = f" (batch of {count} twits)" if count > 1 else ""
+                self.logger.warning(
+                    f"Twit {twit.url}{batch_str} is not rendered in {headless_browser_config.ready_timeout} sec."
+                )
+        return waited
+
     def get_image_file_name(self, url_data: dict) -> str:
         """
 
         {id} - twit_id
         {author} - twit author
         {random} - random string with 8 digits and letters lowercase
-        {no} - no of twit in queue
+        {no} - no of twit in queue; if directory size is set, image is saved to numbered subdirectory
         :param url_data: URL data about twit (author & id)
         :return:
         """
@@ -63,60 +225,732 @@ class TwitProcessor:
             filename = filename.replace("{random}", random_string)
 
         if "{no}" in filename:
-            directory = os.path.dirname(os.path.join(CURRENT_PATH, filename))
-            filename_beginning, _ = filename.split("{no}")
-            no = sum((int(el.startswith(filename_beginning)) for el in os.listdir(directory)))
-            filename = filename.replace("{no}", str(no + 1))
+            # Numbers are allocated atomically, so twits of other workers don't get the same file name
+            filename = self.filename_allocator.allocate(filename)
 
         return filename
 
-    def process_twit(self, twit: models.Twit) -> models.Twit or None:
+    def take_twit_screenshot(self, twit: models.Twit, worker: BrowserWorker) -> Screenshot:
+        """
+        Takes screenshot of rendered twit; it's saved to image file by save_screenshot,
+        so unchanged image is not rewritten
+
+        :param twit: Twit object
+        :param worker: browser worker, that renders twit
+        :return: screenshot
+        """
+        if self.app_config.headless_browser.capture == 'element':
+            self.logger.debug(f"Taking screenshot of twit {twit.url} element...")
+            element_screenshot = worker.browser.get_element_screenshot_png(TWIT_ELEMENT_SELECTOR)
+            if element_screenshot is not None:
+                png, crop = element_screenshot
+                return Screenshot(png, crop, True)
+            self.logger.warning(f"Element of twit {twit.url} is not found; screenshot of page is taken.")
+        self.logger.debug(f"Taking screenshot of twit {twit.url}...")
+        return Screenshot(worker.browser.get_screenshot_png(), None, False)
+
+    def render_twit(self, twit: models.Twit, twit_embed_html: str, twit_text: str = None) -> (str, Screenshot):
+        """
+        Renders twit in browser and takes screenshot; screenshot is saved to image file by save_screenshot
+
+        :param twit: Twit object
+        :param twit_embed_html: twit embed HTML
+        :param twit_text: twit text from embed HTML; if not set, text is got from rendered twit
+        :return: twit text and screenshot
+        """
+        with self.get_render_pool(twit_embed_html).acquire() as worker:
+            started = time.monotonic()
+            self.logger.debug(f"Rendering HTML embed for twit {twit.url} in browser #{worker.no}...")
+            with self.metrics.time("render_html"):
+                worker.browser.render_html(twit_embed_html)
+            self.logger.debug(f"Rendered HTML embed for twit {twit.url} at file {worker.browser.current_opened_page}.")
+            self.logger.debug(f"Waiting for twit {twit.url} to be rendered...")
+            with self.metrics.time("render_wait"):
+                waited = self.wait_for_twit(twit, worker)
+            self.logger.debug(f"Waited for twit {twit.url} {waited:.2f} sec.")
+            if twit_text is None:
+                self.logger.debug(f"Getting text of twit for twit {twit.url}...")
+                with self.metrics.time("twit_text"):
+                    twit_text = self.get_twit_text(worker)
+                self.logger.debug(f"Getting text of twit for twit {twit.url} finished; found text {twit_text}")
+            with self.metrics.time("screenshot"):
+                screenshot = self.take_twit_screenshot(twit, worker)
+            render_time = time.monotonic() - started
+            worker.record(render_time)
+            self.metrics.record("render", render_time)
+        return twit_text, screenshot
+
+    def render_batch(self, twits: list, twit_embed_htmls: list, twit_texts: list = None) -> list:
+        """
+        Renders several twits on one page in browser: twits are waited for once, their texts are got in one call,
+        and elements of twits are cropped from one screenshot of page, so page and widgets startup
+        are shared by twits of batch
+
+        :param twits: Twit objects
+        :param twit_embed_htmls: twit embed HTMLs
+        :param twit_texts: twit texts from embed HTML; texts, which are not set, are got from rendered twits
+        :return: twit text and screenshot for every twit; None, if twit element is not found
         """
-        Downloads twit as image and saves it to file
+        twit_texts = list(twit_texts or [None] * len(twits))
+        with self.pool.acquire() as worker:
+            started = time.monotonic()
+            self.logger.debug(f"Rendering HTML embeds for batch of {len(twits)} twits in browser #{worker.no}...")
+            with self.metrics.time("render_html"):
+                worker.browser.render_batch(twit_embed_htmls)
+            with self.metrics.time("render_wait"):
+                waited = self.wait_for_twit(twits[0], worker, count=len(twits))
+            self.logger.debug(f"Waited for batch of {len(twits)} twits {waited:.2f} sec.")
+            if any(twit_text is None for twit_text in twit_texts):
+                with self.metrics.time("twit_text"):
+                    rendered_texts = worker.browser.get_elements_texts([
+                        [f"//*[@id='{TWIT_ITEM_ID.format(no=no)}']{xpath_query}"
+                         for xpath_query in self.TWIT_TEXT_XPATHS]
+                        for no in range(len(twits))
+                    ])
+                twit_texts = [rendered_text if twit_text is None else twit_text
+                              for twit_text, rendered_text in zip(twit_texts, rendered_texts)]
+            with self.metrics.time("screenshot"):
+                png, crops = worker.browser.get_elements_screenshot_png(
+                    [[selector.format(no=no) for selector in TWIT_ITEM_ELEMENT_SELECTORS] for no in range(len(twits))]
+                )
+            render_time = time.monotonic() - started
+            for _ in twits:
+                worker.record(render_time / len(twits))
+            self.metrics.record("render_batch", render_time)
+        rendered = list()
+        for no, twit in enumerate(twits):
+            crop = crops[no] if no < len(crops) else None
+            if crop is None:
+                self.logger.error(f"Element of twit {twit.url} is not found in batch.")
+                rendered.append(None)
+            else:
+                rendered.append((twit_texts[no], Screenshot(png, crop, True)))
+        return rendered
+
+    def process_twit(self, twit: models.Twit, image_filename: str = None, twit_embed_html: str = None,
+                     **options) -> models.Twit or None:
+        """
+        Downloads twit as image, post-processes it (if configured) and saves it to file
 
         :param twit: Twit object
+        :param image_filename: image file name; if not set, generated from template
+        :param twit_embed_html: twit embed HTML; if not set, it's requested from Twitter API
+        :param embed_params: Twitter embed parameters; if not set, application config is used
+        :param postprocess_config: post-processing config; if not set, application config is used
         :return: Twit object is not error; else None
         """
-        url_data = TwitterEmbedAPI.get_twit_url_data(twit.url)
-        self.logger.debug(f"Getting image file name for {twit.url}...")
-        image_filename = self.get_image_file_name(url_data)
-        self.logger.debug(f"Getting image file name for twit {twit.url} finished! File name is {image_filename}.")
-        self.logger.debug(f"Getting Twitter embed HTML for twit {twit.url}...")
-        twit_embed_html = TwitterEmbedAPI.get_twit_embed_html(
-            twit.url,
-            self.app_config.twit_embed
-        )
+        postprocess_config = options.get('postprocess_config', None)
+        with self.metrics.time("url_parse"):
+            url_data = TwitterEmbedAPI.get_twit_url_data(twit.url)
+        if not image_filename:
+            self.logger.debug(f"Getting image file name for {twit.url}...")
+            with self.metrics.time("file_name"):
+                image_filename = self.get_image_file_name(url_data)
+            self.logger.debug(f"Getting image file name for twit {twit.url} finished! File name is {image_filename}.")
+        if twit_embed_html is None:
+            self.logger.debug(f"Getting Twitter embed HTML for twit {twit.url}...")
+            twit_embed_html = self.prefetcher.fetch(twit.url, options.get('embed_params', None))
         if not twit_embed_html:
             self.logger.error(f"Unable to get twit embed for twit {twit.url}.")
             return None
-        self.logger.debug(f"Rendering HTML embed for twit {twit.url}...")
-        self.browser.render_html(twit_embed_html)
-        self.logger.debug(f"Rendered HTML embed for twit {twit.url} at file {self.browser.current_opened_page}.")
-        self.logger.debug(f"Getting text of twit for twit {twit.url}...")
-        twit_text = self.get_twit_text()
-        self.logger.debug(f"Getting text of twit for twit {twit.url} finished; found text {twit_text}")
-        self.logger.debug(f"Saving twit image for twit {twit.url} to {image_filename}...")
-        self.browser.take_screenshot(image_filename, delay=20)
+        embed_data = self.parse_twit_embed(twit, twit_embed_html)
+        twit_text, screenshot = self.render_twit(twit, twit_embed_html, twit_text=embed_data.text)
+        self.logger.debug(f"Post-processing twit image for twit {twit.url} and saving it to {image_filename}...")
+        image_hashes = self.save_screenshot(image_filename, screenshot, postprocess_config).result().image_hashes
+        return self.update_twit(
+            twit,
+            image_filename,
+            twit_text,
+            self.get_variant_file_names(image_filename, postprocess_config),
+            image_hashes
+        )
+
+    def update_twit(self, twit: models.Twit, image_filename: str, twit_text: str,
+                    variants: dict = None, image_hashes: dict = None) -> models.Twit:
+        """
+        Writes result of processing to Twit object
+
+        :param twit: Twit object
+        :param image_filename: image file name
+        :param twit_text: twit text
+        :param variants: variant file names by variant names
+        :param image_hashes: SHA-256 hashes of image and variants by file names
+        :return: Twit object
+        """
         self.logger.debug(f"Writing new data to Twit class for twit {twit.url}")
         twit.text = twit_text
         twit.image = image_filename
+        if variants:
+            twit.variants = variants
+        if image_hashes:
+            twit.image_hash = image_hashes.get(image_filename, None)
+            if variants:
+                twit.variant_hashes = {name: image_hashes.get(filename, None) for name, filename in variants.items()}
         return twit
 
-    def post_process_twit(self, twit: models.Twit) -> models.Twit or None:
+    @staticmethod
+    def get_image_hashes(twit: models.Twit) -> dict:
+        """
+        Returns SHA-256 hashes of twit image and its variants by file names
+
+        :param twit: processed Twit object
+        :return: hashes by file names
+        """
+        image_hashes = {twit.image: twit.image_hash} if twit.image_hash else dict()
+        for name, filename in (twit.variants or {}).items():
+            if (twit.variant_hashes or {}).get(name, None):
+                image_hashes[filename] = twit.variant_hashes[name]
+        return image_hashes
+
+    def get_variant_file_names(self, image_filename: str,
+                               postprocess_config: models.PostProcessConfig = None) -> dict:
+        """
+        Returns file names of image variants: variant name is added to image file name,
+        e.g. images/123_thumb.webp for images/123.png
+
+        :param image_filename: image file name
+        :param postprocess_config: post-processing config; if not set, application config is used
+        :return: variant file names by variant names; empty, if variants are not configured
         """
-        Post-process twit image
+        postprocess_config = postprocess_config or self.app_config.postprocess
+        if not postprocess_config or not postprocess_config.variants:
+            return dict()
+        root, _ = os.path.splitext(image_filename)
+        return {
+            variant.name: f"{root}_{variant.name}.{variant.file_extension}" for variant in postprocess_config.variants
+        }
+
+    def get_post_process_variants(self, image_filename: str,
+                                  postprocess_config: models.PostProcessConfig = None) -> list:
+        """
+        Returns image variants for ImageProcessor.post_process_image from config
+
+        :param image_filename: image file name
+        :param postprocess_config: post-processing config; if not set, application config is used
+        :return: arguments of ImageProcessor.save_variant for every variant
+        """
+        postprocess_config = postprocess_config or self.app_config.postprocess
+        filenames = self.get_variant_file_names(image_filename, postprocess_config)
+        return [{
+            "filename": filenames[variant.name],
+            "resize_options": variant.resize_options,
+            "image_format": variant.format,
+            "quality": variant.quality,
+        } for variant in (postprocess_config.variants if filenames else [])]
+
+    def get_post_process_operations(self, screenshot: Screenshot = None,
+                                    postprocess_config: models.PostProcessConfig = None) -> dict:
+        """
+        Returns post-processing operations for ImageProcessor.apply_operations from config
+
+        :param screenshot: screenshot to post-process; if not set, operations for saved image are returned
+        :param postprocess_config: post-processing config; if not set, application config is used
+        :return: operations; empty, if image shouldn't be post-processed
+        """
+        operations = dict()
+        if screenshot is not None and screenshot.crop:
+            operations["crop"] = screenshot.crop
+        postprocess_config = postprocess_config or self.app_config.postprocess
+        if postprocess_config:
+            # Screenshot of twit element has no whitespace to trim
+            if postprocess_config.trim and not (screenshot is not None and screenshot.clipped):
+                operations["trim"] = True
+            if postprocess_config.resize:
+                operations["resize_options"] = postprocess_config.resize_options or {}
+        return operations
+
+    def save_screenshot(self, image_filename: str, screenshot: Screenshot,
+                        postprocess_config: models.PostProcessConfig = None) -> Future:
+        """
+        Post-processes screenshot, if required, and saves it to image file
+
+        :param image_filename: image file name
+        :param screenshot: screenshot
+        :param postprocess_config: post-processing config; if not set, application config is used
+        :return: future with result of post-processing
+        """
+        operations = self.get_post_process_operations(screenshot, postprocess_config)
+        variants = self.get_post_process_variants(image_filename, postprocess_config)
+        if variants:
+            operations["variants"] = variants
+        if operations:
+            # Blocks, if too many screenshots wait for post-processing
+            return self.post_process_stage.submit(image_filename, screenshot.png, operations)
+        future = Future()
+        timings = dict()
+        try:
+            image_hash, _ = ImageStore.write(image_filename, screenshot.png, timings)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            timings = {f"image_{stage}": duration for stage, duration in timings.items()}
+            self.metrics.record_all(timings)
+            future.set_result(PostProcessResult(timings, {image_filename: image_hash}))
+        return future
+
+    def find_image(self, image_filename: str) -> str or None:
+        """
+        Finds image file; image path is relative to current path or download path.
+
+        :param image_filename: image file path
+        :return: path of existing image file or None
+        """
+        if not image_filename:
+            return None
+        for path in (CURRENT_PATH, os.path.join(CURRENT_PATH, self.app_config.download.path)):
+            if os.path.exists(os.path.join(path, image_filename)):
+                return os.path.join(path, image_filename)
+        return None
+
+    def image_exists(self, image_filename: str) -> bool:
+        """
+        Checks if image file exists; image path is relative to current path or download path.
+
+        :param image_filename: image file path
+        :return: True if image file exists
+        """
+        return self.find_image(image_filename) is not None
+
+    def link_image(self, image_filename: str, link_filename: str):
+        """
+        Hard-links image file to another file name; if hard links are not supported, image is copied.
+
+        :param image_filename: existing image file path
+        :param link_filename: new image file path
+        """
+        source = self.find_image(image_filename)
+        if source is None:
+            raise FileNotFoundError(f"Image {image_filename} is not found")
+        if os.path.exists(link_filename):
+            os.remove(link_filename)
+        try:
+            os.link(source, link_filename)
+        except OSError:
+            shutil.copyfile(source, link_filename)
+
+    def twit_image_exists(self, twit: models.Twit) -> bool:
+        return self.image_exists(twit.get('image', None))
+
+    def get_config_hash(self) -> str:
+        """
+        Returns hash of config options, that affect twit images
+        """
+        postprocess_config = self.app_config.postprocess
+        return Manifest.get_hash({
+            "twit_embed": self.app_config.twit_embed,
+            "browser": self.app_config.headless_browser.name,
+            "capture": self.app_config.headless_browser.capture,
+            "postprocess": {
+                "trim": postprocess_config.trim,
+                "resize": postprocess_config.resize,
+                "resize_options": postprocess_config.resize_options,
+                # Variants are added only if they are set, so hashes of configs without variants are not changed
+                **({"variants": [variant.to_primitive() for variant in postprocess_config.variants]}
+                   if postprocess_config.variants else {}),
+            } if postprocess_config else None,
+        })
+
+    def get_manifest_record(self, twit: models.Twit) -> dict or None:
+        """
+        Returns manifest record of twit, if twit is processed with current config and its image exists
 
         :param twit: Twit object
-        :return: Twit object if success else None
-        """
-        if self.app_config.postprocess.trim:
-            self.logger.debug(f"Trimming image for twit {twit.url}")
-            ImageProcessor.trim_image(twit.image, twit.image)
-        if self.app_config.postprocess.resize:
-            self.logger.debug(f"Resizing image for twit {twit.url}")
-            ImageProcessor.resize_image(
-                twit.image,
-                twit.image,
-                size=self.app_config.postprocess.resize_options
+        :return: manifest record or None
+        """
+        if self.manifest is None:
+            return None
+        record = self.manifest.get(twit.url)
+        if not record or record.get('status') != Manifest.STATUS_PROCESSED:
+            return None
+        if record.get('config_hash') != self.config_hash or not self.image_exists(record.get('image')):
+            return None
+        if not all(self.image_exists(filename) for filename in self.get_variant_file_names(record['image']).values()):
+            return None
+        return record
+
+    def record_to_manifest(self, twit: models.Twit, status: str, embed_hash: str = None):
+        """
+        Records result of twit processing to manifest
+
+        :param twit: Twit object
+        :param status: status of processing; skipped twit has valid image, so it's recorded as processed
+        :param embed_hash: hash of twit embed HTML; if not set, twit is rendered again on resume
+        """
+        processed = status != self.STATUS_FAILED
+        try:
+            self.manifest.record(
+                twit.url,
+                Manifest.STATUS_PROCESSED if processed else Manifest.STATUS_FAILED,
+                embed_hash=embed_hash,
+                config_hash=self.config_hash,
+                image=twit.image,
+                text=twit.text,
+                image_hashes=self.get_image_hashes(twit) if processed else None
             )
-        return twit
+        except (OSError, ValueError) as e:
+            # Twit is processed, but it's processed again on resume
+            self.logger.error(f"Unable to record twit {twit.url} to manifest: {e}")
+
+    def _render_twit_safely(self, twit: models.Twit, twit_embed_html: str,
+                            twit_text: str = None) -> (str, Screenshot) or None:
+        self.logger.info(f"Twit {twit.url} processing...")
+        try:
+            return self.render_twit(twit, twit_embed_html, twit_text=twit_text)
+        except Exception as e:
+            self.logger.error(f"Twit {twit.url} processing failed: {e}")
+            return None
+
+    def _render_batch_safely(self, items: list):
+        for item in items:
+            self.logger.info(f"Twit {item.twit.url} processing...")
+        try:
+            rendered = self.render_batch(
+                [item.twit for item in items],
+                [item.embed_html for item in items],
+                [item.twit_text for item in items]
+            )
+        except Exception as e:
+            self.logger.error(f"Batch of twits {', '.join(item.twit.url for item in items)} processing failed: {e}")
+            rendered = [None] * len(items)
+        for item, twit_rendered in zip(items, rendered):
+            item.future.set_result(twit_rendered)
+
+    def extract_twits(self, twits: Iterable[models.Twit]) -> Iterator[TwitResult]:
+        """
+        Fills text and metadata of twits from their embeds without rendering; results are returned in order of twits.
+        Embeds are requested concurrently, and only limited number of twits is kept in memory.
+
+        :param twits: Twit objects
+        :return: twits and statuses of processing
+        """
+        pending = collections.deque()
+        if self.controller is not None:
+            self.controller.start()
+        try:
+            for twit in twits:
+                pending.append((twit, self.prefetcher.submit(twit.url)))
+                while len(pending) >= self.app_config.embed_api.prefetch:
+                    yield self._extract_twit(*pending.popleft())
+            while pending:
+                yield self._extract_twit(*pending.popleft())
+        finally:
+            if self.controller is not None:
+                self.controller.stop()
+
+    def _extract_twit(self, twit: models.Twit, embed_future: Future) -> TwitResult:
+        try:
+            twit_embed_html = embed_future.result()
+        except Exception as e:
+            self.logger.error(f"Unable to get twit embed for twit {twit.url}: {e}")
+            return TwitResult(twit, self.STATUS_FAILED)
+        self.parse_twit_embed(twit, twit_embed_html)
+        if self.controller is not None:
+            self.controller.record_twit(processed=True)
+        return TwitResult(twit, self.STATUS_PROCESSED)
+
+    def process_twits(self, twits: Iterable[models.Twit], update: bool = False) -> Iterator[TwitResult]:
+        """
+        Processes twits in parallel by browsers of pool; results are returned in order of twits.
+        Twit embeds are prefetched ahead, and twits are rendered in order their embeds are received.
+        If manifest is used, twits, which embed and config are not changed since last run, are skipped.
+        Every twit is rendered once: duplicates (the same status under any URL form) share its image,
+        if they are found among MAX_DUPLICATE_SOURCES last different twits.
+
+        :param twits: Twit objects
+        :param update: update twit images, if they are already exist
+        :return: results of processing
+        """
+        if self.text_only:
+            yield from self.extract_twits(twits)
+            return
+        if self.controller is not None:
+            self.controller.start()
+        try:
+            yield from self._process_twits(twits, update)
+        finally:
+            if self.controller is not None:
+                self.controller.stop()
+
+    def _process_twits(self, twits: Iterable[models.Twit], update: bool = False) -> Iterator[TwitResult]:
+        headless_browser_config = self.app_config.headless_browser
+        # Card renderer draws twits without page, so twits are rendered one by one
+        batch_size = headless_browser_config.batch_size if headless_browser_config.name != 'card' else 1
+        max_pending = self.pool.size * batch_size + self.app_config.embed_api.prefetch
+        pending = collections.deque()
+        # Embed parameters are the same for all twits of batch, so twits with equal status ids are duplicates;
+        # only results, which duplicates need, are kept for recently seen status ids
+        source_futures = collections.OrderedDict()
+        with ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="render") as executor:
+            batcher = None
+            if batch_size > 1:
+                batcher = RenderBatcher(
+                    batch_size,
+                    lambda items: self._submit_batch(items, executor),
+                    wait=headless_browser_config.batch_wait
+                )
+            for twit in twits:
+                with self.metrics.time("url_parse"):
+                    try:
+                        url_data = TwitterEmbedAPI.get_twit_url_data(twit.url)
+                    except AttributeError:
+                        url_data = None
+                source_future = source_futures.get(url_data['id'], None) if url_data is not None else None
+                if source_future is not None:
+                    source_futures.move_to_end(url_data['id'])
+                manifest_record = None if update or source_future is not None or url_data is None \
+                    else self.get_manifest_record(twit)
+                if url_data is None:
+                    # Malformed URL fails only its twit, not the whole batch
+                    self.logger.error(f"Twit {twit.url} processing failed: URL is not twit URL.")
+                    future = Future()
+                    future.set_result(TwitResult(twit, self.STATUS_FAILED))
+                elif manifest_record is None and self.twit_image_exists(twit) and not update:
+                    future = Future()
+                    future.set_result(TwitResult(twit, self.STATUS_SKIPPED))
+                elif source_future is not None:
+                    duplicate_record = None if update else self.get_manifest_record(twit)
+                    image_filename = None
+                    if self.app_config.download.duplicates == 'link':
+                        if duplicate_record is not None:
+                            # File name of duplicate is reused on resume, so links and {no} numbers aren't leaked
+                            image_filename = duplicate_record['image']
+                        else:
+                            with self.metrics.time("file_name"):
+                                image_filename = self.get_image_file_name(url_data)
+                    future = self._submit_duplicate(twit, source_future, image_filename, duplicate_record)
+                else:
+                    if manifest_record is not None:
+                        image_filename = manifest_record['image']
+                    else:
+                        # File names are taken in order of twits, so {no} numbering is deterministic
+                        with self.metrics.time("file_name"):
+                            image_filename = self.get_image_file_name(url_data)
+                    future = self._submit_twit(twit, image_filename, executor, manifest_record, batcher)
+                if source_future is None and url_data is not None:
+                    source_futures[url_data['id']] = self._get_duplicate_source(future)
+                    if len(source_futures) > MAX_DUPLICATE_SOURCES:
+                        source_futures.popitem(last=False)
+                pending.append(future)
+                while len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            if batcher is not None:
+                # The last batch is submitted as soon as all twits are arrived, without waiting for batch timer
+                batcher.close()
+            while pending:
+                yield pending.popleft().result()
+
+    def _get_duplicate_source(self, primary_future: Future) -> Future:
+        """
+        Returns future with result of the first twit, which is shared with its duplicates; Twit object itself
+        isn't referenced, so it's released, as soon as it's returned.
+
+        :param primary_future: future with result of the first twit with status id
+        :return: future with DuplicateSource
+        """
+        source_future = Future()
+
+        def keep_source(done_future: Future):
+            try:
+                primary_twit, status = done_future.result()
+                source = DuplicateSource(
+                    url=primary_twit.url,
+                    status=status,
+                    image=primary_twit.image,
+                    variants=primary_twit.variants,
+                    image_hash=primary_twit.image_hash,
+                    variant_hashes=primary_twit.variant_hashes,
+                    metadata={field: primary_twit[field] for field in self.TWIT_METADATA_FIELDS}
+                )
+            except Exception as e:
+                # Duplicates are failed too
+                source_future.set_exception(e)
+            else:
+                source_future.set_result(source)
+
+        primary_future.add_done_callback(keep_source)
+        return source_future
+
+    def _submit_duplicate(self, twit: models.Twit, source_future: Future, image_filename: str = None,
+                          manifest_record: dict = None) -> Future:
+        """
+        Shares result of the same twit, processed earlier in batch: duplicate references its image,
+        or image is hard-linked to own file name of duplicate. Result of duplicate is recorded to manifest.
+
+        :param twit: Twit object of duplicate
+        :param source_future: future with DuplicateSource of the first twit with the same status id
+        :param image_filename: image file name of duplicate; if not set, image of the first twit is referenced
+        :param manifest_record: manifest record of duplicate from previous run
+        :return: future with result of processing
+        """
+        future = Future()
+
+        def share(done_future: Future):
+            source = done_future.result()
+            status = source.status
+            image, variants = source.image, source.variants
+            # Linked images have the same content, so their hashes are the same
+            image_hash, variant_hashes = source.image_hash, source.variant_hashes or {}
+            if status != self.STATUS_FAILED and image_filename and image_filename != image:
+                link_variants = self.get_variant_file_names(image_filename)
+                try:
+                    self.link_image(image, image_filename)
+                    for name, variant_filename in link_variants.items():
+                        self.link_image(variants[name], variant_filename)
+                except (OSError, KeyError, TypeError) as e:
+                    self.logger.error(f"Unable to link image {image} of twit {twit.url} to {image_filename}: {e}")
+                    status = self.STATUS_FAILED
+                else:
+                    image, variants = image_filename, link_variants
+            if status != self.STATUS_FAILED:
+                self.logger.debug(f"Twit {twit.url} is duplicate of twit {source.url}; image {image} is used.")
+                for field, value in source.metadata.items():
+                    twit[field] = list(value) if isinstance(value, list) else value
+                image_hashes = {image: image_hash}
+                image_hashes.update({filename: variant_hashes.get(name, None)
+                                     for name, filename in (variants or {}).items()})
+                self.update_twit(twit, image, source.metadata['text'], variants, image_hashes)
+            if self.manifest is not None and not (status == self.STATUS_SKIPPED and manifest_record is not None
+                                                  and manifest_record.get('image') == image):
+                # Embed of duplicate isn't hashed, so it's rendered again, if it's the first twit on resume
+                self.record_to_manifest(twit, status)
+            future.set_result(TwitResult(twit, status))
+
+        source_future.add_done_callback(self._guard_callback(twit, future, share))
+        return future
+
+    def _guard_callback(self, twit: models.Twit, future: Future,
+                        callback: Callable[[Future], None]) -> Callable[[Future], None]:
+        """
+        Wraps done callback of twit processing: exceptions in done callbacks are only logged by concurrent.futures,
+        so twit is failed, if callback raises exception; otherwise results of twits would wait for it forever.
+
+        :param twit: Twit object
+        :param future: future with result of twit processing
+        :param callback: done callback
+        :return: wrapped callback
+        """
+        def guarded(done_future: Future):
+            try:
+                callback(done_future)
+            except Exception as e:
+                self.logger.error(f"Twit {twit.url} processing failed: {e}")
+                if not future.done():
+                    future.set_result(TwitResult(twit, self.STATUS_FAILED))
+
+        return guarded
+
+    def _submit_batch(self, items: list, executor: ThreadPoolExecutor):
+        """
+        Submits batch of twits to render
+
+        :param items: RenderItem objects
+        :param executor: render executor
+        """
+        try:
+            executor.submit(self._render_batch_safely, items)
+        except RuntimeError as e:
+            for item in items:
+                self.logger.error(f"Twit {item.twit.url} processing is cancelled: {e}")
+                item.future.set_result(None)
+
+    def _submit_twit(self, twit: models.Twit, image_filename: str, executor: ThreadPoolExecutor,
+                     manifest_record: dict = None, batcher: RenderBatcher = None) -> Future:
+        """
+        Starts getting twit embed; as soon as embed is received, twit is submitted to render,
+        and as soon as twit is rendered, screenshot is submitted to post-processing.
+
+        :param twit: Twit object
+        :param image_filename: image file name
+        :param executor: render executor
+        :param manifest_record: manifest record of twit; if twit embed is not changed, twit is skipped
+        :param batcher: if set, twit is rendered in batch with other twits
+        :return: future with result of processing
+        """
+        future = Future()
+        embed_hash = None
+
+        def complete(status: str, twit_text: str = None, image_hashes: dict = None):
+            if status == self.STATUS_PROCESSED:
+                self.update_twit(
+                    twit,
+                    image_filename,
+                    twit_text,
+                    self.get_variant_file_names(image_filename),
+                    image_hashes
+                )
+            # Twits without embed aren't rendered, so they don't change render error rate
+            if self.controller is not None and status != self.STATUS_SKIPPED and embed_hash is not None:
+                self.controller.record_twit(processed=status == self.STATUS_PROCESSED)
+            if self.manifest is not None and status != self.STATUS_SKIPPED:
+                self.record_to_manifest(twit, status, embed_hash)
+            future.set_result(TwitResult(twit, status))
+
+        def render(embed_future: Future):
+            nonlocal embed_hash
+            try:
+                twit_embed_html = embed_future.result()
+            except Exception as e:
+                self.logger.error(f"Unable to get twit embed for twit {twit.url}: {e}")
+                complete(self.STATUS_FAILED)
+                return
+            embed_hash = Manifest.get_hash(twit_embed_html)
+            twit_text = self.parse_twit_embed(twit, twit_embed_html).text
+            if manifest_record is not None and manifest_record.get('embed_hash') == embed_hash:
+                self.update_twit(
+                    twit,
+                    image_filename,
+                    manifest_record.get('text'),
+                    self.get_variant_file_names(image_filename),
+                    manifest_record.get('image_hashes', None)
+                )
+                complete(self.STATUS_SKIPPED)
+                return
+            if batcher is not None:
+                render_future = Future()
+                render_future.add_done_callback(self._guard_callback(twit, future, post_process))
+                batcher.add(RenderItem(twit, twit_embed_html, twit_text, render_future))
+                return
+            try:
+                render_future = executor.submit(self._render_twit_safely, twit, twit_embed_html, twit_text)
+            except RuntimeError as e:
+                self.logger.error(f"Twit {twit.url} processing is cancelled: {e}")
+                complete(self.STATUS_FAILED)
+                return
+            render_future.add_done_callback(self._guard_callback(twit, future, post_process))
+
+        def post_process(render_future: Future):
+            rendered = render_future.result()
+            if rendered is None:
+                complete(self.STATUS_FAILED)
+                return
+            twit_text, screenshot = rendered
+            try:
+                # Blocks render thread, if too many screenshots wait for post-processing
+                post_process_future = self.save_screenshot(image_filename, screenshot)
+            except Exception as e:
+                self.logger.error(f"Twit {twit.url} post-processing failed: {e}")
+                complete(self.STATUS_FAILED)
+                return
+            post_process_future.add_done_callback(
+                self._guard_callback(twit, future, lambda f: finish(f, twit_text))
+            )
+
+        def finish(post_process_future: Future, twit_text: str):
+            if post_process_future.exception() is not None:
+                self.logger.error(f"Twit {twit.url} post-processing failed: {post_process_future.exception()}")
+                complete(self.STATUS_FAILED)
+            else:
+                complete(self.STATUS_PROCESSED, twit_text, post_process_future.result().image_hashes)
+
+        def render_in_batch(embed_future: Future):
+            try:
+                render(embed_future)
+            finally:
+                batcher.arrive()
+
+        if batcher is not None:
+            batcher.expect()
+        self.prefetcher.submit(twit.url).add_done_callback(
+            self._guard_callback(twit, future, render if batcher is None else render_in_batch)
+        )
+        return future
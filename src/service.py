@@ -0,0 +1,253 @@
+#!/usr/bin/python
+import sys
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import exceptions
+import models
+from helpers.twitter_embed_api import TwitterEmbedAPI
+from processor import TwitProcessor
+
+
+class RenderService:
+    RESPONSE_IMAGE = "image"
+    RESPONSE_PATH = "path"
+
+    def __init__(self, processor: TwitProcessor, concurrency: int, max_queue: int, logger: logging.Logger):
+        """
+        Renders twits on demand with warm browsers of twit processor.
+
+        :param processor: twit processor
+        :param concurrency: maximum number of twits, rendered at the same time
+        :param max_queue: maximum number of requests, that wait for rendering; other requests are rejected
+        :param logger: application logger
+        """
+        self.processor = processor
+        self.logger = logger
+        self._running = threading.BoundedSemaphore(concurrency)
+        self._accepted = threading.BoundedSemaphore(concurrency + max_queue)
+
+    @staticmethod
+    def parse_request(request: dict) -> (models.Twit, dict, models.PostProcessConfig or None, str):
+        """
+        Validates render request.
+
+        :param request: request data
+        :return: Twit object, embed parameters, post-processing config and response type
+        """
+        if not isinstance(request, dict) or not isinstance(request.get('url', None), str):
+            raise exceptions.RenderServiceRequestError(400, "Twit URL is required.")
+        try:
+            TwitterEmbedAPI.get_twit_url_data(request['url'])
+        except AttributeError:
+            raise exceptions.RenderServiceRequestError(400, f"{request['url']} is not twit URL.")
+        embed_params = request.get('twit_embed', None)
+        if embed_params is not None and (not isinstance(embed_params, dict) or
+                                         not all(isinstance(v, str) for v in embed_params.values())):
+            raise exceptions.RenderServiceRequestError(400, "Twit embed parameters should be strings.")
+        postprocess_config = None
+        if request.get('postprocess', None) is not None:
+            try:
+                postprocess_config = models.PostProcessConfig(request['postprocess'])
+                postprocess_config.validate()
+            except Exception as e:
+                raise exceptions.RenderServiceRequestError(400, f"Post-processing config can't validated: {e}")
+        response_type = request.get('response', RenderService.RESPONSE_IMAGE)
+        if response_type not in (RenderService.RESPONSE_IMAGE, RenderService.RESPONSE_PATH):
+            raise exceptions.RenderServiceRequestError(400, f"Response type {response_type} is not supported.")
+        return models.Twit({"url": request['url']}), embed_params, postprocess_config, response_type
+
+    def render(self, request: dict) -> (models.Twit, bytes or None):
+        """
+        Renders twit by request.
+
+        :param request: request data: url, twit_embed, postprocess and response (image or path)
+        :return: Twit object and image (if image response is requested)
+        """
+        twit, embed_params, postprocess_config, response_type = self.parse_request(request)
+        if not self._accepted.acquire(blocking=False):
+            raise exceptions.RenderServiceRequestError(503, "Too many requests in queue.")
+        try:
+            with self._running:
+                return self._render(twit, embed_params, postprocess_config, response_type)
+        finally:
+            self._accepted.release()
+
+    def _render(self, twit: models.Twit, embed_params: dict, postprocess_config: models.PostProcessConfig,
+                response_type: str) -> (models.Twit, bytes or None):
+        if response_type == self.RESPONSE_PATH:
+            image_filename = None
+        else:
+            file_descriptor, image_filename = tempfile.mkstemp(suffix=".png")
+            os.close(file_descriptor)
+        try:
+            try:
+                updated_twit = self.processor.process_twit(
+                    twit,
+                    image_filename,
+                    embed_params=embed_params,
+                    postprocess_config=postprocess_config
+                )
+            except exceptions.TwitterAPIRequestError as e:
+                raise exceptions.RenderServiceRequestError(502, f"{e}")
+            except Exception as e:
+                self.logger.error(f"Twit {twit.url} processing failed: {e}")
+                raise exceptions.RenderServiceRequestError(500, f"Twit {twit.url} processing failed.")
+            if not updated_twit:
+                raise exceptions.RenderServiceRequestError(500, f"Twit {twit.url} processing failed.")
+            if response_type == self.RESPONSE_PATH:
+                return updated_twit, None
+            with open(image_filename, 'rb') as f:
+                return updated_twit, f.read()
+        finally:
+            if image_filename and response_type != self.RESPONSE_PATH:
+                variant_filenames = self.processor.get_variant_file_names(image_filename, postprocess_config)
+                for filename in [image_filename, *variant_filenames.values()]:
+                    if os.path.exists(filename):
+                        os.remove(filename)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.service.processor.metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/health":
+            self.send_json(404, {"error": "Not found."})
+            return
+        self.send_json(200, {"status": "ok", "stats": self.service.processor.stats()})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self.send_json(404, {"error": "Not found."})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            self.send_json(400, {"error": "Request body should be JSON."})
+            return
+        try:
+            twit, image = self.service.render(request)
+        except exceptions.RenderServiceRequestError as e:
+            self.send_json(e.status_code, {"error": str(e)})
+            return
+        if image is None:
+            self.send_json(200, twit.to_primitive())
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(image)))
+        self.end_headers()
+        self.wfile.write(image)
+
+    def send_json(self, status_code: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        if status_code == 503:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Clients of Unix socket have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        self.service.logger.debug(f"{self.address_string()} {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    """
+    The entry point of render service
+    """
+    logger = logging.getLogger("downloadTwits")
+    logger.setLevel(logging.INFO)
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    # noinspection SpellCheckingInspection
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s')
+    stdout_handler.setFormatter(formatter)
+    logger.addHandler(stdout_handler)
+
+    # Reads command line arguments
+    parser = argparse.ArgumentParser(description="Service, that renders twits as images on demand.")
+    parser.add_argument("--config-file", nargs="?", default="config.json", help="Application configuration file")
+    parser.add_argument("--logging", nargs="?", default="INFO", help="Logging level. Default: INFO")
+    parser.add_argument("--host", nargs="?", default="127.0.0.1", help="HTTP host. Default: 127.0.0.1")
+    parser.add_argument("--port", nargs="?", type=int, default=8080, help="HTTP port. Default: 8080")
+    parser.add_argument("--socket", nargs="?", default=None, help="Unix socket path; if set, host and port are ignored")
+    parser.add_argument("--concurrency", nargs="?", type=int, default=None,
+                        help="Maximum number of twits, rendered at the same time. Default: browser pool size")
+    parser.add_argument("--max-queue", nargs="?", type=int, default=32,
+                        help="Maximum number of requests, waiting for rendering. Default: 32")
+    parser.add_argument("--no-embed-cache", action='store_const', const=True,
+                        help="Don't use cache of Twitter embeds, even if it's configured.")
+    command_line_args = parser.parse_args()
+
+    try:
+        app_config = models.AppConfig.load_from_file(command_line_args.config_file)
+    except Exception as e:
+        logger.error(f"Unexpected error while reading application config: {e}")
+        sys.exit(1)
+
+    logger.setLevel(command_line_args.logging)
+    app_config.download.template = os.path.join(os.curdir, app_config.download.path, app_config.download.template)
+
+    logger.info(f"Initializing twit processor for headless browser {app_config.headless_browser.name}...")
+    try:
+        processor = TwitProcessor(app_config, logger=logger, use_embed_cache=not command_line_args.no_embed_cache)
+    except exceptions.HeadlessBrowserException:
+        sys.exit(1)
+    except exceptions.EmbedCacheException as e:
+        logger.error(f"{e}")
+        sys.exit(1)
+
+    RenderRequestHandler.service = RenderService(
+        processor,
+        concurrency=command_line_args.concurrency or processor.pool.size,
+        max_queue=command_line_args.max_queue,
+        logger=logger
+    )
+    if command_line_args.socket:
+        if os.path.exists(command_line_args.socket):
+            os.remove(command_line_args.socket)
+        server = ThreadingUnixHTTPServer(command_line_args.socket, RenderRequestHandler)
+        logger.info(f"Listening on {command_line_args.socket}...")
+    else:
+        server = ThreadingHTTPServer((command_line_args.host, command_line_args.port), RenderRequestHandler)
+        logger.info(f"Listening on http://{command_line_args.host}:{command_line_args.port}...")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        processor.close()
+        if command_line_args.socket and os.path.exists(command_line_args.socket):
+            os.remove(command_line_args.socket)
+    logger.info(f"Stopped. Stats: {processor.stats()}.")
+
+
+if __name__ == "__main__":
+    main()
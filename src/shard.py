@@ -0,0 +1,239 @@
+#!/usr/bin/python
+import sys
+
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import time
+
+import exceptions
+
+CURRENT_PATH = os.getcwd()
+
+
+def load_twits(twits_file: str, logger: logging.Logger):
+    import models
+
+    logger.info(f"Getting twits from file {twits_file}...")
+    if models.Twits.is_json_lines_file(twits_file):
+        return models.Twits.iter_from_file(twits_file)
+    try:
+        twits = models.Twits.load_from_file(twits_file).twits
+    except exceptions.TwitsConfigValidationError as e:
+        logger.error(f"Unable to parse file {twits_file}, errors: {e}.")
+        sys.exit(1)
+    logger.info(f"Read {len(twits)} twits from file {twits_file}")
+    return twits
+
+
+def split(args, logger: logging.Logger):
+    """
+    Splits twits file into shards of shared queue
+    """
+    from helpers.shard_queue import ShardQueue
+
+    queue = ShardQueue.create(args.queue, load_twits(args.twits_file, logger), shard_size=args.shard_size)
+    logger.info(f"Created queue {args.queue}: {queue.info['twits']} twits in {queue.info['shards']} shards.")
+
+
+def work(args, logger: logging.Logger):
+    """
+    Claims shards of queue and processes them one by one, until all shards are done
+    """
+    import models
+    from helpers.shard_queue import ShardQueue, ShardHeartbeat
+    from processor import TwitProcessor
+
+    # Processor module sets default logging level on import
+    logger.setLevel(args.logging)
+    try:
+        app_config = models.AppConfig.load_from_file(args.config_file)
+    except Exception as e:
+        logger.error(f"Unexpected error while reading application config: {e}")
+        sys.exit(1)
+    queue = ShardQueue(args.queue, lease_timeout=args.lease_timeout)
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    logger.info(f"Worker {worker_id}: initializing twit processor for headless browser "
+                f"{app_config.headless_browser.name}...")
+    try:
+        processor = TwitProcessor(
+            app_config,
+            logger=logger,
+            use_embed_cache=not args.no_embed_cache,
+            text_only=bool(args.text_only)
+        )
+    except exceptions.HeadlessBrowserException:
+        sys.exit(1)
+    except exceptions.EmbedCacheException as e:
+        logger.error(f"{e}")
+        sys.exit(1)
+    app_config.download.template = os.path.join(os.curdir, app_config.download.path, app_config.download.template)
+
+    shards_count = 0
+    try:
+        while True:
+            shard = queue.claim(worker_id)
+            if shard is None:
+                status = queue.status()
+                if queue.is_finished() or not status[ShardQueue.CLAIMED]:
+                    break
+                # Other workers process the last shards; their shards are claimed again, if workers die
+                logger.debug(f"Worker {worker_id}: no pending shards, waiting for {status[ShardQueue.CLAIMED]} "
+                             f"claimed shards...")
+                time.sleep(args.poll_interval)
+                continue
+
+            logger.info(f"Worker {worker_id}: processing shard {shard.name}...")
+            heartbeat = ShardHeartbeat(queue, shard)
+            heartbeat.start()
+            output_filename = queue.get_output_filename(worker_id, shard)
+            twits_writer = models.TwitsWriter(output_filename)
+            try:
+                twits = models.Twits.iter_from_file(shard.path)
+                for twit, status in processor.process_twits(twits, update=bool(args.update)):
+                    if status == TwitProcessor.STATUS_FAILED:
+                        logger.info(f"Twit {twit.url} can't updated. Check logs.")
+                    twits_writer.write(twit)
+                twits_writer.close()
+                queue.complete(shard, output_filename)
+            except BaseException:
+                twits_writer.close()
+                queue.release(shard)
+                if os.path.exists(output_filename):
+                    os.remove(output_filename)
+                raise
+            finally:
+                heartbeat.stop()
+            shards_count += 1
+            logger.info(f"Worker {worker_id}: shard {shard.name} is done.")
+    except KeyboardInterrupt:
+        logger.info(f"Worker {worker_id}: interrupted; claimed shard is returned to queue.")
+    finally:
+        processor.close()
+    logger.info(f"Worker {worker_id}: finished {shards_count} shards. Stats: {processor.stats()}.")
+
+
+def merge(args, logger: logging.Logger):
+    """
+    Merges processed twits of all shards into one file in order of source twits file
+    """
+    import models
+    from helpers.shard_queue import ShardQueue
+
+    queue = ShardQueue(args.queue)
+    twits = queue.iter_results(partial=bool(args.partial))
+    logger.info(f"Saving twits to {args.output_twits_file}...")
+    if models.Twits.is_json_lines_file(args.output_twits_file):
+        twits_writer = models.TwitsWriter(args.output_twits_file)
+        try:
+            for twit in twits:
+                twits_writer.write(twit)
+        finally:
+            twits_writer.close()
+    else:
+        merged_twits = models.Twits()
+        merged_twits.twits = list(twits)
+        merged_twits.save_to_file(args.output_twits_file)
+
+
+def status(args, logger: logging.Logger):
+    """
+    Prints number of pending, claimed and done shards
+    """
+    from helpers.shard_queue import ShardQueue
+
+    queue_status = ShardQueue(args.queue, lease_timeout=args.lease_timeout).status()
+    print(", ".join(f"{key}: {value}" for key, value in queue_status.items()))
+
+
+def run(args, logger: logging.Logger):
+    """
+    Splits twits file, processes shards by several local workers and merges results
+    """
+    split(args, logger)
+    worker_args = [
+        sys.executable, os.path.abspath(__file__), "work", "--queue", args.queue, "--config-file", args.config_file,
+        "--logging", args.logging, "--lease-timeout", str(args.lease_timeout),
+        "--poll-interval", str(args.poll_interval),
+    ]
+    if args.update:
+        worker_args.append("--update")
+    if args.no_embed_cache:
+        worker_args.append("--no-embed-cache")
+    if args.text_only:
+        worker_args.append("--text-only")
+    logger.info(f"Starting {args.workers} workers...")
+    workers = [subprocess.Popen(worker_args) for _ in range(args.workers)]
+    try:
+        return_codes = [worker.wait() for worker in workers]
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.wait()
+        raise
+    if any(return_codes):
+        logger.error(f"Some workers are failed: return codes {return_codes}.")
+    merge(args, logger)
+
+
+def main():
+    """
+    The entry point of sharded batch processing; workers on several hosts share queue directory
+    """
+    logger = logging.getLogger("downloadTwits")
+    logger.setLevel(logging.INFO)
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    # noinspection SpellCheckingInspection
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s')
+    stdout_handler.setFormatter(formatter)
+    logger.addHandler(stdout_handler)
+
+    # Reads command line arguments
+    parser = argparse.ArgumentParser(description="Process twits file by several workers on one or several hosts.")
+    parser.add_argument("--config-file", nargs="?", default="config.json", help="Application configuration file")
+    parser.add_argument("--logging", nargs="?", default="INFO", help="Logging level. Default: INFO")
+    parser.add_argument("--queue", required=True, help="Queue directory, shared by all workers")
+    parser.add_argument("--lease-timeout", type=int, default=300,
+                        help="Time (in sec), after which shard of dead worker is processed again. Default: 300")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="Time (in sec) between checks of queue, while shards of other workers are processed.")
+    parser.add_argument("--twits-file", nargs="?", default="", help="JSON or JSON Lines file with twits (split, run)")
+    parser.add_argument("--shard-size", type=int, default=100, help="Number of twits in shard (split, run)")
+    parser.add_argument("--worker-id", nargs="?", default=None,
+                        help="Unique worker id (work). Default: host name and process id")
+    parser.add_argument("--workers", type=int, default=2, help="Number of local workers (run)")
+    parser.add_argument("--update", action='store_const', const=True,
+                        help="Update twit images, if they are already exist (work, run).")
+    parser.add_argument("--no-embed-cache", action='store_const', const=True,
+                        help="Don't use cache of Twitter embeds, even if it's configured (work, run).")
+    parser.add_argument("--text-only", action='store_const', const=True,
+                        help="Get text and metadata of twits without rendering images (work, run).")
+    parser.add_argument("--output-twits-file", nargs="?", default=None,
+                        help="JSON or JSON Lines file to store results (merge, run)")
+    parser.add_argument("--partial", action='store_const', const=True,
+                        help="Merge done shards, even if queue is not finished (merge).")
+    parser.add_argument("command", choices=["split", "work", "merge", "status", "run"], help="Command")
+    command_line_args = parser.parse_args()
+
+    if command_line_args.command in ("split", "run") and not command_line_args.twits_file:
+        parser.error(f"--twits-file is required for {command_line_args.command}")
+    if command_line_args.command in ("merge", "run") and not command_line_args.output_twits_file:
+        parser.error(f"--output-twits-file is required for {command_line_args.command}")
+    if command_line_args.shard_size < 1 or command_line_args.workers < 1:
+        parser.error("--shard-size and --workers should be positive")
+
+    # Sets logging level
+    logger.setLevel(command_line_args.logging)
+
+    commands = {"split": split, "work": work, "merge": merge, "status": status, "run": run}
+    try:
+        commands[command_line_args.command](command_line_args, logger)
+    except exceptions.ShardQueueException as e:
+        logger.error(f"{e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import sys
+
+import os
+import time
+
+import pytest
+
+# Tests use application modules the same way as src/cli.py does
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module_path in (os.path.join(ROOT_PATH, "src"), os.path.join(ROOT_PATH, "benchmarks")):
+    if module_path not in sys.path:
+        sys.path.insert(0, module_path)
+
+import models  # noqa: E402
+from helpers import browser_pool, headless_browser  # noqa: E402
+
+# Screenshot of fake browser; it's saved as is, if post-processing isn't configured
+FAKE_PNG = b"\x89PNG\r\n\x1a\nfake screenshot"
+
+# Size of fake browser window, and height and margin of twit widget in item of batch page (in pixels)
+FAKE_WINDOW_SIZE = {"width": 800, "height": 600}
+FAKE_WIDGET_HEIGHT = 400
+FAKE_WIDGET_MARGIN = 10
+
+
+class FakeDriver:
+    def __init__(self, render_delay: float = 0.0):
+        """
+        WebDriver stub: injected twits become rendered widgets after render delay, like twits, which widgets script
+        is loaded slowly; DOM is changed until then.
+
+        :param render_delay: time between injecting twits and rendering their widgets (in sec)
+        """
+        self.render_delay = render_delay
+        self.injected = None
+        self.twits = 0
+        self.screenshots = 0
+        self.window_size = dict(FAKE_WINDOW_SIZE)
+        # Bounding boxes of page elements by CSS selectors
+        self.elements = dict()
+
+    def get(self, url: str):
+        self.injected = time.monotonic()
+        self.twits = 1
+
+    def execute_script(self, script: str, *args):
+        if script == "return 1;":
+            return 1
+        if script == headless_browser.INJECT_SCRIPT:
+            self.injected, self.twits = time.monotonic(), 1
+            return True
+        if script == headless_browser.INJECT_BATCH_SCRIPT:
+            self.injected, self.twits = time.monotonic(), len(args[0])
+            self.elements = self.get_batch_elements(self.twits)
+            return True
+        if script == headless_browser.PAGE_HEIGHT_SCRIPT:
+            return max((rect["top"] + rect["height"] for rect in self.elements.values()), default=0)
+        if script == headless_browser.ELEMENTS_RECTS_SCRIPT:
+            return [next((self.elements[selector] for selector in selectors if selector in self.elements), None)
+                    for selectors in args[0]]
+        if script == headless_browser.READINESS_SCRIPT:
+            since_injected = time.monotonic() - self.injected if self.injected is not None else 0.0
+            rendered = self.injected is not None and since_injected >= self.render_delay
+            return {
+                "rendered": rendered and self.twits >= (args[0] or 1),
+                "images": True,
+                "fonts": True,
+                # The last DOM mutation is rendering of widgets
+                "idle": (since_injected - self.render_delay) * 1000 if rendered else 0,
+            }
+        return None
+
+    @staticmethod
+    def get_batch_elements(count: int) -> dict:
+        """
+        Returns elements of batch page: items of twits fill the width of window, and widgets of twits are narrower.
+
+        :param count: number of twits on page
+        :return: bounding boxes of items and widgets by CSS selectors
+        """
+        item_height = FAKE_WIDGET_HEIGHT + 2 * FAKE_WIDGET_MARGIN
+        elements = dict()
+        for no in range(count):
+            item_id = headless_browser.TWIT_ITEM_ID.format(no=no)
+            elements[f"#{item_id}"] = {
+                "left": 0, "top": no * item_height, "width": FAKE_WINDOW_SIZE["width"], "height": item_height
+            }
+            elements[f"#{item_id} twitter-widget"] = {
+                "left": FAKE_WIDGET_MARGIN, "top": no * item_height + FAKE_WIDGET_MARGIN,
+                "width": FAKE_WINDOW_SIZE["width"] // 2, "height": FAKE_WIDGET_HEIGHT
+            }
+        return elements
+
+    def get_window_size(self) -> dict:
+        return dict(self.window_size)
+
+    def set_window_size(self, width: int, height: int):
+        self.window_size = {"width": width, "height": height}
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.screenshots += 1
+        return FAKE_PNG
+
+    def find_element_by_xpath(self, xpath: str):
+        raise LookupError(f"Element {xpath} is not found.")
+
+    def quit(self):
+        pass
+
+
+class FakeBrowser(headless_browser.HeadlessBrowser):
+    def __init__(self, render_delay: float = 0.0, **options):
+        super().__init__(**options)
+        self.browser = FakeDriver(render_delay)
+
+    def get_memory_usage(self) -> int or None:
+        return None
+
+
+@pytest.fixture
+def fake_browsers(monkeypatch) -> list:
+    """
+    Replaces browsers of browser pool with fake browsers.
+
+    :return: created fake browsers
+    """
+    browsers = list()
+
+    def create_browser(options: models.HeadlessBrowserConfig) -> FakeBrowser:
+        browser = FakeBrowser(**options.to_primitive())
+        browsers.append(browser)
+        return browser
+
+    monkeypatch.setattr(browser_pool, "create_browser", create_browser)
+    return browsers
+
+
+@pytest.fixture
+def oembed_server():
+    """
+    Local Twitter oEmbed API with embeds of benchmark fixtures.
+    """
+    from fake_oembed_server import FakeOEmbedServer
+
+    server = FakeOEmbedServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def app_config(tmp_path, oembed_server) -> models.AppConfig:
+    """
+    Application config with fake browsers and local oEmbed API; images are saved to temporary directory.
+    """
+    config = models.AppConfig({
+        "headless_browser": {"name": "chrome", "executable_path": "chromedriver", "pool_size": 2},
+        "embed_api": {"url": oembed_server.oembed_url, "max_retries": 0, "timeout": 5},
+        "download": {
+            "path": str(tmp_path / "images"),
+            "template": os.path.join(str(tmp_path / "images"), "{id}.png"),
+            "counters_path": str(tmp_path / "counters"),
+        },
+    })
+    config.validate()
+    os.makedirs(config.download.path)
+    return config
@@ -0,0 +1,110 @@
+import logging
+import os
+
+import pytest
+
+import exceptions
+import models
+from fake_oembed_server import load_embed_fixtures
+from helpers.embed_parser import EmbedParser
+from processor import TwitProcessor
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def is_image_magick_installed() -> bool:
+    try:
+        import wand.image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+requires_image_magick = pytest.mark.skipif(not is_image_magick_installed(), reason="ImageMagick is not installed")
+
+
+def get_fixture_embed(name: str) -> str:
+    # Fixtures are sorted by file name: links, long, short
+    return load_embed_fixtures()[["links", "long", "short"].index(name)]
+
+
+def test_twits_with_media_are_rendered_by_fallback_browser(app_config, fake_browsers):
+    app_config.headless_browser = models.HeadlessBrowserConfig(
+        {"name": "card", "fallback": "chrome", "executable_path": "chromedriver"}
+    )
+    processor = TwitProcessor(app_config, logger=logging.getLogger("downloadTwits"), use_embed_cache=False)
+    try:
+        # Fixture of twit 1 has text only
+        assert processor.process_twit(models.Twit({"url": "https://twitter.com/bench/status/1"}))
+        assert processor.fallback_pool is None
+        # Fixture of twit 3 has photo
+        assert processor.process_twit(models.Twit({"url": "https://twitter.com/bench/status/3"}))
+        assert processor.fallback_pool is not None
+    finally:
+        processor.close()
+
+    assert [browser.options['name'] for browser in fake_browsers] == ["card", "chrome"]
+    assert fake_browsers[0].browser.screenshots == 1
+    assert fake_browsers[1].browser.screenshots == 1
+
+
+@pytest.mark.skipif(is_image_magick_installed(), reason="ImageMagick is installed")
+def test_card_renderer_requires_image_magick():
+    from helpers.card_renderer import CardRenderer
+
+    with pytest.raises(exceptions.HeadlessBrowserException, match="ImageMagick is not installed"):
+        CardRenderer(name="card")
+
+
+@requires_image_magick
+def test_card_is_drawn_from_embed():
+    from wand.image import Image as WandImage
+    from helpers.card_renderer import CARD_WIDTH, CardRenderer
+
+    renderer = CardRenderer(name="card")
+    sizes = dict()
+    for name in ("short", "long"):
+        assert renderer.render_html(get_fixture_embed(name))
+        png = renderer.get_screenshot_png()
+        assert png.startswith(PNG_SIGNATURE)
+        with WandImage(blob=png) as img:
+            sizes[name] = img.size
+
+    assert sizes["short"][0] == sizes["long"][0] == CARD_WIDTH
+    # Long text is wrapped over several lines
+    assert sizes["long"][1] > sizes["short"][1]
+    assert renderer.get_element_text("//blockquote/p") == EmbedParser.parse(get_fixture_embed("long")).text
+
+
+@requires_image_magick
+def test_text_is_wrapped_by_width():
+    from wand.drawing import Drawing
+    from wand.image import Image as WandImage
+    from helpers.card_renderer import CardRenderer, TEXT_COLOR, TEXT_FONT_SIZE
+
+    renderer = CardRenderer(name="card")
+    with WandImage(width=1, height=1) as img, Drawing() as draw:
+        renderer.set_font(draw, TEXT_FONT_SIZE, TEXT_COLOR)
+        lines = renderer.wrap_text(draw, img, "word " * 40 + "\nhttps://example.com/" + "x" * 100, 300)
+
+        assert all(draw.get_font_metrics(img, line).text_width <= 300 for line in lines)
+    assert len(lines) > 3
+    # Words are kept, and long link is broken by characters
+    assert "".join(lines).replace(" ", "") == "word" * 40 + "https://example.com/" + "x" * 100
+
+
+@requires_image_magick
+def test_twits_are_rendered_as_cards(app_config):
+    app_config.headless_browser = models.HeadlessBrowserConfig({"name": "card"})
+    processor = TwitProcessor(app_config, logger=logging.getLogger("downloadTwits"), use_embed_cache=False)
+    try:
+        twits = [models.Twit({"url": f"https://twitter.com/bench/status/{no}"}) for no in range(1, 4)]
+        results = list(processor.process_twits(twits))
+    finally:
+        processor.close()
+
+    assert [status for _, status in results] == [TwitProcessor.STATUS_PROCESSED] * 3
+    for twit, _ in results:
+        with open(twit.image, 'rb') as f:
+            assert f.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE
+    assert sorted(os.listdir(app_config.download.path)) == ["1.png", "2.png", "3.png"]
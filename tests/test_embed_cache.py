@@ -0,0 +1,88 @@
+import types
+
+import pytest
+
+from helpers import embed_cache
+from helpers.embed_cache import EmbedCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Wall clock of embed cache, moved by tests.
+    """
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(embed_cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def cache_path(tmp_path) -> str:
+    return str(tmp_path / "cache" / "embeds.sqlite")
+
+
+def test_key_depends_on_twit_and_embed_params():
+    key = EmbedCache.get_key("1", {"theme": "dark", "lang": "en"})
+
+    assert key == EmbedCache.get_key("1", {"lang": "en", "theme": "dark"})
+    assert key != EmbedCache.get_key("2", {"theme": "dark", "lang": "en"})
+    assert key != EmbedCache.get_key("1", {"theme": "light", "lang": "en"})
+    assert EmbedCache.get_key("1", None) == EmbedCache.get_key("1", {})
+
+
+def test_embed_is_persisted(cache_path):
+    cache = EmbedCache(cache_path)
+    cache.put("key", "<blockquote>twit</blockquote>")
+    cache.close()
+
+    cache = EmbedCache(cache_path)
+    assert cache.get("key") == "<blockquote>twit</blockquote>"
+    assert cache.get("missing") is None
+    cache.close()
+
+
+def test_embed_expires_after_ttl(cache_path, clock):
+    cache = EmbedCache(cache_path, ttl=60)
+    cache.put("key", "html")
+
+    clock.now += 60
+    assert cache.get("key") == "html"
+    # Reading embed doesn't prolong its life
+    clock.now += 1
+    assert cache.get("key") is None
+
+
+def test_expired_embeds_are_evicted_on_put(cache_path, clock):
+    cache = EmbedCache(cache_path, ttl=60)
+    cache.put("old", "html")
+    clock.now += 61
+    cache.put("new", "html")
+
+    assert cache._connection.execute("SELECT key FROM embeds").fetchall() == [("new",)]
+
+
+def test_least_recently_used_embeds_are_evicted_over_max_size(cache_path, clock):
+    cache = EmbedCache(cache_path, max_size=30)
+    for key in ("first", "second", "third"):
+        cache.put(key, "x" * 10)
+        clock.now += 1
+    # The first embed is used, so the second is the least recently used one
+    assert cache.get("first") == "x" * 10
+    clock.now += 1
+
+    cache.put("fourth", "x" * 15)
+
+    assert cache.get("second") is None
+    assert cache.get("third") is None
+    assert cache.get("first") == "x" * 10
+    assert cache.get("fourth") == "x" * 15
+
+
+def test_embed_larger_than_max_size_is_not_kept(cache_path, clock):
+    cache = EmbedCache(cache_path, max_size=10)
+    cache.put("small", "x" * 5)
+    clock.now += 1
+    cache.put("large", "x" * 11)
+
+    assert cache.get("large") is None
+    assert cache.get("small") is None
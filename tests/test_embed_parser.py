@@ -0,0 +1,66 @@
+from fake_oembed_server import load_embed_fixtures
+from helpers.embed_parser import EmbedData, EmbedParser
+
+
+def get_fixture_embed(name: str) -> str:
+    # Fixtures are sorted by file name: links, long, short
+    return load_embed_fixtures()[["links", "long", "short"].index(name)]
+
+
+def test_twit_data_is_parsed_from_embed():
+    assert EmbedParser.parse(get_fixture_embed("short")) == EmbedData(
+        text="Benchmark twit: short text.",
+        author_name="Benchmark",
+        author_screen_name="bench",
+        date="March 24, 2019",
+        lang="en",
+        links=[],
+        emoji="",
+        has_media=False,
+    )
+
+
+def test_long_text_is_kept_whole():
+    embed_data = EmbedParser.parse(get_fixture_embed("long"))
+
+    assert embed_data.text.startswith("Benchmark twit with long text, that wraps over several lines of embed. ")
+    assert embed_data.text.endswith(" velit esse cillum dolore eu fugiat nulla pariatur.")
+    assert (embed_data.author_name, embed_data.date) == ("Benchmark", "March 24, 2019")
+
+
+def test_links_are_parsed_without_tracking_parameters():
+    embed_data = EmbedParser.parse(get_fixture_embed("links"))
+
+    assert embed_data.text == "Твіт для бенчмарку з посиланнями 🚀 #benchmark @bench https://t.co/abcdefghij " \
+                              "pic.twitter.com/klmnopqrst"
+    assert embed_data.links == [
+        "https://twitter.com/hashtag/benchmark?src=hash",
+        "https://twitter.com/bench",
+        "https://t.co/abcdefghij",
+        "https://t.co/klmnopqrst",
+    ]
+    assert embed_data.has_media
+    assert embed_data.emoji == "🚀"
+    assert (embed_data.author_name, embed_data.author_screen_name) == ("Бенчмарк", "bench")
+    assert (embed_data.date, embed_data.lang) == ("24 березня 2019 р.", "uk")
+
+
+def test_line_breaks_and_emoji_sequences_are_kept():
+    embed_html = '<blockquote class="twitter-tweet"><p lang="en" dir="ltr">Hello<br>world 👍🏽<br>' \
+                 '👨‍👩‍👧 🇺🇦 &amp; 1️⃣</p>&mdash; Jack (@jack) ' \
+                 '<a href="https://twitter.com/jack/status/1">March 21, 2006</a></blockquote>' \
+                 '<blockquote><p>Other blockquote</p></blockquote>'
+
+    embed_data = EmbedParser.parse(embed_html)
+
+    assert embed_data.text == "Hello\nworld 👍🏽\n👨‍👩‍👧 🇺🇦 & 1️⃣"
+    assert embed_data.emoji == "👍🏽👨‍👩‍👧🇺🇦1️⃣"
+    assert (embed_data.author_name, embed_data.author_screen_name) == ("Jack", "jack")
+
+
+def test_missing_fields_are_none():
+    embed_data = EmbedParser.parse("<p>Twit is not found.</p>")
+
+    assert embed_data == EmbedData(
+        text=None, author_name=None, author_screen_name=None, date=None, lang=None, links=[], emoji="", has_media=False
+    )
@@ -0,0 +1,88 @@
+import sys
+
+import os
+import subprocess
+
+import pytest
+
+import exceptions
+from conftest import ROOT_PATH
+from helpers.filename_allocator import FilenameAllocator
+
+# Allocates file names in own process and creates files, like workers do
+ALLOCATE_SCRIPT = """
+import sys
+
+sys.path.insert(0, sys.argv[1])
+from helpers.filename_allocator import FilenameAllocator
+
+allocator = FilenameAllocator(counters_path=sys.argv[2])
+for _ in range(int(sys.argv[4])):
+    filename = allocator.allocate(sys.argv[3])
+    open(filename, 'w').close()
+    print(filename)
+"""
+
+
+def test_numbers_continue_after_existing_files(tmp_path):
+    images_path = tmp_path / "images"
+    os.makedirs(images_path)
+    for name in ("image-2.png", "image-7.png", "image-7_thumb.webp", "other-9.png"):
+        (images_path / name).touch()
+    allocator = FilenameAllocator(counters_path=str(tmp_path / "counters"))
+
+    assert allocator.allocate(str(images_path / "image-{no}.png")) == str(images_path / "image-8.png")
+    assert allocator.allocate(str(images_path / "image-{no}.png")) == str(images_path / "image-9.png")
+    assert allocator.allocate(str(images_path / "other-{no}.png")) == str(images_path / "other-10.png")
+    # Counters are kept, so the next allocator doesn't scan directory
+    (images_path / "image-20.png").touch()
+    allocator = FilenameAllocator(counters_path=str(tmp_path / "counters"))
+    assert allocator.allocate(str(images_path / "image-{no}.png")) == str(images_path / "image-10.png")
+
+
+def test_counters_are_not_written_to_images_directory(tmp_path):
+    images_path = tmp_path / "images"
+    os.makedirs(images_path)
+    allocator = FilenameAllocator(counters_path=str(tmp_path / "state" / "counters"))
+
+    allocator.allocate(str(images_path / "{no}.png"))
+
+    assert os.listdir(images_path) == []
+    assert os.listdir(tmp_path / "state" / "counters")
+
+
+def test_images_are_saved_to_numbered_subdirectories(tmp_path):
+    images_path = tmp_path / "images"
+    os.makedirs(images_path)
+    allocator = FilenameAllocator(counters_path=str(tmp_path / "counters"), directory_size=2)
+
+    filenames = [allocator.allocate(str(images_path / "{no}.png")) for _ in range(3)]
+
+    assert filenames == [str(images_path / "0001" / "1.png"), str(images_path / "0001" / "2.png"),
+                         str(images_path / "0002" / "3.png")]
+    assert os.path.isdir(images_path / "0002")
+
+
+def test_number_in_directory_is_not_supported(tmp_path):
+    allocator = FilenameAllocator(counters_path=str(tmp_path / "counters"))
+
+    with pytest.raises(exceptions.TwitsConfigValidationError, match="in file name only"):
+        allocator.allocate(str(tmp_path / "{no}" / "image.png"))
+
+
+def test_processes_do_not_get_the_same_number(tmp_path):
+    images_path = tmp_path / "images"
+    os.makedirs(images_path)
+    (images_path / "image-3.png").touch()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", ALLOCATE_SCRIPT, os.path.join(ROOT_PATH, "src"), str(tmp_path / "counters"),
+             str(images_path / "image-{no}.png"), "25"],
+            stdout=subprocess.PIPE, universal_newlines=True
+        )
+        for _ in range(4)
+    ]
+    filenames = [filename for process in processes for filename in process.communicate(timeout=60)[0].split()]
+
+    assert [process.returncode for process in processes] == [0] * 4
+    assert sorted(filenames) == sorted(str(images_path / f"image-{no}.png") for no in range(4, 104))
@@ -0,0 +1,126 @@
+import json
+import shutil
+import subprocess
+import time
+
+import pytest
+
+import models
+from conftest import FakeBrowser
+from fake_oembed_server import FakeOEmbedRequestHandler, FakeOEmbedServer, load_embed_fixtures, WIDGETS_URL
+from helpers import headless_browser
+
+# Load time of slow widgets.js (in sec)
+WIDGETS_LATENCY = 1.0
+
+# Runs browser script in Node.js with stub of page: elements are found by CSS selectors in elements map
+NODE_PAGE_SCRIPT = """
+var elements = JSON.parse(process.argv[1]);
+var window = {devicePixelRatio: 2, pageXOffset: 0, pageYOffset: 0, scrollTo: function () {}};
+var document = {
+    querySelector: function (selector) {
+        var rect = elements[selector];
+        return rect ? {getBoundingClientRect: function () { return rect; }} : null;
+    }
+};
+// Script gets its arguments, like in WebDriver execute_script
+var script = new Function(
+    "window", "document", "args", "return (function () {" + process.argv[2] + "}).apply(null, args);"
+);
+console.log(JSON.stringify(script(window, document, JSON.parse(process.argv[3]))));
+"""
+
+
+def test_wait_until_rendered_waits_for_slow_widgets():
+    browser = FakeBrowser(render_delay=0.5, render_mode="inject")
+    assert browser.render_html("<blockquote class=\"twitter-tweet\"></blockquote>")
+
+    elapsed = browser.wait_until_rendered(timeout=5, settle=0.2, poll_interval=0.05)
+
+    # Twit is ready only after widget is rendered and DOM isn't changed for settle time
+    assert 0.7 <= elapsed < 2
+
+
+def test_wait_until_rendered_waits_for_all_twits_of_batch():
+    browser = FakeBrowser(render_delay=0.2, render_mode="inject")
+    assert browser.render_batch(["<p>1</p>", "<p>2</p>", "<p>3</p>"])
+
+    assert browser.wait_until_rendered(timeout=5, settle=0.1, poll_interval=0.05, count=3) < 2
+    # Page has fewer twits, than expected
+    assert browser.wait_until_rendered(timeout=0.3, settle=0.1, poll_interval=0.05, count=4) >= 0.3
+
+
+def test_wait_until_rendered_stops_after_timeout():
+    browser = FakeBrowser(render_delay=10, render_mode="inject")
+    assert browser.render_html("<p>twit</p>")
+
+    started = time.monotonic()
+    elapsed = browser.wait_until_rendered(timeout=0.3, settle=0.1, poll_interval=0.05)
+
+    assert 0.3 <= elapsed < 1
+    assert time.monotonic() - started < 1
+
+
+def test_wait_until_rendered_stops_after_timeout_if_browser_fails():
+    browser = FakeBrowser(render_mode="inject")
+
+    def execute_script(script, *args):
+        raise RuntimeError("Browser is not responding.")
+
+    browser.browser.execute_script = execute_script
+
+    assert browser.wait_until_rendered(timeout=0.2, settle=0.1, poll_interval=0.05) >= 0.2
+
+
+class SlowWidgetsRequestHandler(FakeOEmbedRequestHandler):
+    def do_GET(self):
+        if self.path == "/widgets.js":
+            time.sleep(WIDGETS_LATENCY)
+        super().do_GET()
+
+
+@pytest.mark.skipif(shutil.which("chromedriver") is None, reason="chromedriver is not installed")
+def test_wait_until_rendered_waits_for_slow_widgets_script_in_chrome():
+    server = FakeOEmbedServer()
+    server.RequestHandlerClass = SlowWidgetsRequestHandler
+    server.start()
+    config = models.HeadlessBrowserConfig({
+        "name": "chrome", "executable_path": shutil.which("chromedriver"), "render_mode": "file"
+    })
+    browser = headless_browser.create_browser(config)
+    try:
+        # Fixture page keeps its widgets.js script, which is loaded from local server slowly
+        embed_html = load_embed_fixtures()[0].replace(WIDGETS_URL, server.widgets_url)
+        browser.render_html(embed_html)
+
+        elapsed = browser.wait_until_rendered(timeout=10, settle=0.2)
+
+        assert WIDGETS_LATENCY <= elapsed < 10
+        assert browser.browser.execute_script(headless_browser.READINESS_SCRIPT, 1)['rendered']
+    finally:
+        browser.quit()
+        server.stop()
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="Node.js is not installed")
+def test_elements_rects_script_prefers_twit_widget_to_item():
+    elements = {
+        "#twit-item-0": {"left": 0, "top": 0, "width": 800, "height": 420},
+        "#twit-item-0 twitter-widget": {"left": 10, "top": 10, "width": 400, "height": 400},
+        "#twit-item-1": {"left": 0, "top": 420, "width": 800, "height": 100},
+    }
+    selectors = [[selector.format(no=no) for selector in headless_browser.TWIT_ITEM_ELEMENT_SELECTORS]
+                 for no in range(3)]
+
+    output = subprocess.run(
+        ["node", "-e", NODE_PAGE_SCRIPT, json.dumps(elements), headless_browser.ELEMENTS_RECTS_SCRIPT,
+         json.dumps([selectors])],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True, timeout=30
+    ).stdout
+
+    # Boxes are in screenshot pixels; item is cropped, only if twit isn't rendered
+    assert json.loads(output) == [
+        {"left": 20, "top": 20, "width": 800, "height": 800},
+        {"left": 0, "top": 840, "width": 1600, "height": 200},
+        None,
+    ]
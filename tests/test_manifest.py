@@ -0,0 +1,59 @@
+import json
+
+from helpers.manifest import Manifest
+
+
+def read_lines(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+
+def test_the_last_record_of_twit_is_actual(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(path)
+    manifest.record("https://twitter.com/jack/status/1", Manifest.STATUS_FAILED)
+    manifest.record("https://twitter.com/jack/status/1", Manifest.STATUS_PROCESSED, image="1.png")
+    manifest.close()
+
+    manifest = Manifest(path)
+
+    assert manifest.get("https://twitter.com/jack/status/1") == {
+        "url": "https://twitter.com/jack/status/1", "status": Manifest.STATUS_PROCESSED, "image": "1.png"
+    }
+    assert manifest.get("https://twitter.com/jack/status/2") is None
+    manifest.close()
+
+
+def test_incomplete_line_is_dropped(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"url": "1", "status": Manifest.STATUS_PROCESSED}) + "\n")
+        # Previous run was interrupted while record was written
+        f.write('{"url": "2", "status": "proc')
+
+    manifest = Manifest(path)
+    manifest.record("3", Manifest.STATUS_PROCESSED)
+    manifest.close()
+
+    assert [json.loads(line)["url"] for line in read_lines(path)] == ["1", "3"]
+    assert Manifest(path).get("2") is None
+
+
+def test_superseded_records_are_dropped(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(path)
+    for _ in range(4):
+        manifest.record("1", Manifest.STATUS_PROCESSED)
+    manifest.record("2", Manifest.STATUS_PROCESSED)
+    manifest.close()
+    assert len(read_lines(path)) == 5
+
+    Manifest(path).close()
+
+    assert [json.loads(line)["url"] for line in read_lines(path)] == ["1", "2"]
+
+
+def test_hash_of_data_does_not_depend_on_key_order():
+    assert Manifest.get_hash({"a": 1, "b": [1, 2]}) == Manifest.get_hash({"b": [1, 2], "a": 1})
+    assert Manifest.get_hash({"a": 1}) != Manifest.get_hash({"a": 2})
+    assert Manifest.get_hash("<blockquote>") != Manifest.get_hash("<blockquote> ")
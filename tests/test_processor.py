@@ -0,0 +1,211 @@
+import logging
+import os
+
+import pytest
+
+import models
+import processor as processor_module
+from conftest import FakeDriver
+from processor import TwitProcessor
+
+
+def create_twits(*urls: str) -> list:
+    return [models.Twit({"url": url}) for url in urls]
+
+
+@pytest.fixture
+def create_processor(app_config, fake_browsers):
+    """
+    Creates twit processors with fake browsers; they are closed after test.
+    """
+    processors = list()
+
+    def create_processor(**kwargs) -> TwitProcessor:
+        processor = TwitProcessor(app_config, logger=logging.getLogger("downloadTwits"), use_embed_cache=False,
+                                  **kwargs)
+        processors.append(processor)
+        return processor
+
+    yield create_processor
+    for processor in processors:
+        processor.close()
+
+
+def test_malformed_url_fails_only_its_twit(create_processor):
+    processor = create_processor()
+    twits = create_twits(
+        "https://twitter.com/jack/status/1",
+        "https://example.com/not-twit",
+        "https://twitter.com/jack/status/2",
+    )
+
+    results = list(processor.process_twits(twits))
+
+    assert [(twit.url, status) for twit, status in results] == [
+        (twits[0].url, TwitProcessor.STATUS_PROCESSED),
+        (twits[1].url, TwitProcessor.STATUS_FAILED),
+        (twits[2].url, TwitProcessor.STATUS_PROCESSED),
+    ]
+
+
+def test_duplicates_share_image_of_the_first_twit(create_processor, oembed_server, fake_browsers):
+    processor = create_processor()
+    twits = create_twits(
+        "https://twitter.com/jack/status/1",
+        "https://mobile.twitter.com/jack/status/1",
+        "https://twitter.com/jack/status/2",
+        "https://twitter.com/jack/status/1?s=20",
+    )
+
+    results = list(processor.process_twits(twits))
+
+    assert [status for _, status in results] == [TwitProcessor.STATUS_PROCESSED] * 4
+    assert results[1].twit.image == results[3].twit.image == results[0].twit.image
+    assert results[1].twit.text == results[0].twit.text
+    assert oembed_server.requests == 2
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 2
+
+
+def test_results_are_kept_for_last_twits_only(create_processor, oembed_server, monkeypatch):
+    monkeypatch.setattr(processor_module, "MAX_DUPLICATE_SOURCES", 2)
+    processor = create_processor()
+    twits = create_twits(*(f"https://twitter.com/jack/status/{no}" for no in (1, 2, 1, 3, 1, 2)))
+
+    results = list(processor.process_twits(twits))
+
+    assert [status for _, status in results] == [TwitProcessor.STATUS_PROCESSED] * 6
+    # Status 1 is used again, so status 2 is forgotten, when status 3 is added, and it's rendered again
+    assert oembed_server.requests == 4
+
+
+def test_linked_duplicates_reuse_file_names_on_resume(app_config, create_processor, tmp_path, fake_browsers):
+    app_config.download.duplicates = "link"
+    app_config.download.template = str(tmp_path / "images" / "{no}.png")
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    urls = [f"https://{host}twitter.com/jack/status/{no}" for no in (1, 2) for host in ("", "mobile.")]
+
+    first_results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+    images = sorted(name for name in os.listdir(tmp_path / "images") if name.endswith(".png"))
+    second_results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+
+    assert images == ["1.png", "2.png", "3.png", "4.png"]
+    assert [twit.image for twit, _ in first_results] == [str(tmp_path / "images" / name) for name in images]
+    assert [twit.image for twit, _ in second_results] == [twit.image for twit, _ in first_results]
+    assert [status for _, status in second_results] == [TwitProcessor.STATUS_SKIPPED] * 4
+    assert sorted(os.listdir(tmp_path / "images")) == images
+    # The second run is not rendered
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 2
+
+
+def test_unchanged_twits_are_skipped_on_resume(create_processor, tmp_path, oembed_server, fake_browsers):
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    twits = create_twits(*(f"https://twitter.com/jack/status/{no}" for no in range(1, 4)))
+    first_results = list(create_processor(manifest_file=manifest_file).process_twits(twits))
+
+    second_results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(
+        *(twit.url for twit in twits)
+    )))
+
+    assert [status for _, status in first_results] == [TwitProcessor.STATUS_PROCESSED] * 3
+    assert [status for _, status in second_results] == [TwitProcessor.STATUS_SKIPPED] * 3
+    assert [(twit.image, twit.text, twit.image_hash) for twit, _ in second_results] == \
+        [(twit.image, twit.text, twit.image_hash) for twit, _ in first_results]
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 3
+
+
+def test_twits_with_changed_embed_are_rendered_again(create_processor, tmp_path, oembed_server, fake_browsers):
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    urls = [f"https://twitter.com/jack/status/{no}" for no in range(1, 4)]
+    list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+    # Embed of twits with id % 3 == 1 is changed, e.g. twit is edited
+    oembed_server.embeds[1] = oembed_server.embeds[1].replace("</blockquote>", "edited</blockquote>")
+
+    results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+
+    assert [status for _, status in results] == [
+        TwitProcessor.STATUS_PROCESSED, TwitProcessor.STATUS_SKIPPED, TwitProcessor.STATUS_SKIPPED
+    ]
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 4
+
+
+def test_twits_are_rendered_again_if_config_is_changed(app_config, create_processor, tmp_path, fake_browsers):
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    urls = [f"https://twitter.com/jack/status/{no}" for no in range(1, 3)]
+    list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+    app_config.twit_embed = {"theme": "dark"}
+
+    results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+
+    assert [status for _, status in results] == [TwitProcessor.STATUS_PROCESSED] * 2
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 4
+
+
+def test_twits_are_rendered_again_if_image_is_removed(create_processor, tmp_path, fake_browsers):
+    manifest_file = str(tmp_path / "manifest.jsonl")
+    urls = [f"https://twitter.com/jack/status/{no}" for no in range(1, 3)]
+    first_results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+    os.remove(first_results[0].twit.image)
+
+    results = list(create_processor(manifest_file=manifest_file).process_twits(create_twits(*urls)))
+
+    assert [status for _, status in results] == [TwitProcessor.STATUS_PROCESSED, TwitProcessor.STATUS_SKIPPED]
+    assert os.path.exists(first_results[0].twit.image)
+
+
+def test_twits_are_streamed_in_order_with_bounded_look_ahead(app_config, create_processor, tmp_path, fake_browsers):
+    app_config.embed_api.prefetch = 4
+    processor = create_processor()
+    # The first browser is slow, so twits are rendered out of order
+    fake_browsers[0].browser.render_delay = 0.3
+    max_pending = processor.pool.size + app_config.embed_api.prefetch
+    twits_file = str(tmp_path / "twits.jsonl")
+    with models.TwitsWriter(twits_file) as writer:
+        for no in range(1, 21):
+            writer.write(models.Twit({"url": f"https://twitter.com/jack/status/{no}"}))
+    read = list()
+
+    def read_twits():
+        for twit in models.Twits.iter_from_file(twits_file):
+            read.append(twit.url)
+            yield twit
+
+    output_file = str(tmp_path / "twits.output.jsonl")
+    with models.TwitsWriter(output_file) as writer:
+        for no, (twit, status) in enumerate(processor.process_twits(read_twits()), start=1):
+            # Twits are read ahead of written twits by limited number only
+            assert len(read) <= no + max_pending - 1
+            writer.write(twit)
+            assert len(list(models.Twits.iter_from_file(output_file))) == no
+
+    output_twits = list(models.Twits.iter_from_file(output_file))
+    assert [twit.url for twit in output_twits] == read
+    assert all(twit.image and twit.text for twit in output_twits)
+
+
+def test_twits_of_batch_are_cropped_to_their_widgets(create_processor, fake_browsers):
+    processor = create_processor()
+    twits = create_twits(*(f"https://twitter.com/jack/status/{no}" for no in range(1, 4)))
+
+    rendered = processor.render_batch(twits, [f"<p>Twit {no}</p>" for no in range(1, 4)], ["1", "2", "3"])
+
+    elements = FakeDriver.get_batch_elements(len(twits))
+    assert [screenshot.crop for _, screenshot in rendered] == \
+        [elements[f"#twit-item-{no} twitter-widget"] for no in range(len(twits))]
+    # Widgets are cropped from one screenshot, so they have no whitespace to trim
+    assert all(screenshot.clipped for _, screenshot in rendered)
+    assert fake_browsers[0].browser.screenshots == 1
+    # Window is extended to page height, so twits below visible part of page are captured
+    assert fake_browsers[0].browser.window_size["height"] == elements["#twit-item-2"]["top"] + \
+        elements["#twit-item-2"]["height"]
+
+
+def test_render_wait_of_every_twit_is_recorded(app_config, create_processor):
+    processor = create_processor()
+    twits = create_twits("https://twitter.com/jack/status/1", "https://twitter.com/jack/status/2")
+
+    assert [status for _, status in processor.process_twits(twits)] == [TwitProcessor.STATUS_PROCESSED] * 2
+
+    count, total = processor.metrics.totals()["render_wait"]
+    assert count == 2
+    # Rendered twits are waited for until DOM is settled, not for the whole timeout
+    assert total < app_config.headless_browser.ready_timeout
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from helpers.render_batcher import RenderBatcher
+
+
+class Batches:
+    def __init__(self):
+        """
+        Submit function of batcher, which keeps submitted batches.
+        """
+        self.batches = list()
+        self.submitted = threading.Event()
+
+    def __call__(self, batch: list):
+        self.batches.append(batch)
+        self.submitted.set()
+
+
+def test_full_batch_is_submitted_at_once():
+    batches = Batches()
+    batcher = RenderBatcher(2, batches, wait=10)
+
+    for no in range(5):
+        batcher.add(no)
+
+    assert batches.batches == [[0, 1], [2, 3]]
+    batcher.flush()
+    assert batches.batches == [[0, 1], [2, 3], [4]]
+
+
+def test_incomplete_batch_is_submitted_after_wait_time():
+    batches = Batches()
+    batcher = RenderBatcher(3, batches, wait=0.2)
+
+    started = time.monotonic()
+    batcher.add(0)
+    batcher.add(1)
+
+    assert batches.submitted.wait(5)
+    assert time.monotonic() - started >= 0.2
+    assert batches.batches == [[0, 1]]
+
+
+def test_last_batch_is_submitted_when_expected_twits_are_arrived():
+    batches = Batches()
+    batcher = RenderBatcher(3, batches, wait=10)
+    for _ in range(2):
+        batcher.expect()
+
+    batcher.add(0)
+    batcher.arrive()
+    batcher.close()
+    # The second twit is still expected, e.g. its embed is requested
+    assert batches.batches == [[0]]
+
+    batcher.add(1)
+    assert batches.batches == [[0]]
+    batcher.arrive()
+    assert batches.batches == [[0], [1]]
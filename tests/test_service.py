@@ -0,0 +1,144 @@
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import exceptions
+from conftest import FAKE_PNG
+from processor import TwitProcessor
+from service import RenderRequestHandler, RenderService
+
+TWIT_URL = "https://twitter.com/jack/status/20"
+
+
+@pytest.fixture
+def processor(app_config, fake_browsers):
+    processor = TwitProcessor(app_config, logger=logging.getLogger("downloadTwits"), use_embed_cache=False)
+    yield processor
+    processor.close()
+
+
+@pytest.fixture
+def service(processor) -> RenderService:
+    return RenderService(processor, concurrency=2, max_queue=2, logger=logging.getLogger("downloadTwits"))
+
+
+@pytest.fixture
+def service_url(service) -> str:
+    """
+    URL of render service, served by local HTTP server.
+    """
+    RenderRequestHandler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RenderRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    RenderRequestHandler.service = None
+
+
+def post(url: str, body: bytes) -> (int, dict, bytes):
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+@pytest.mark.parametrize("request_data, message", [
+    (None, "Twit URL is required."),
+    ({}, "Twit URL is required."),
+    ({"url": "https://example.com/twit"}, "is not twit URL"),
+    ({"url": TWIT_URL, "twit_embed": {"maxwidth": 550}}, "should be strings"),
+    ({"url": TWIT_URL, "postprocess": {"workers": "many"}}, "Post-processing config"),
+    ({"url": TWIT_URL, "response": "json"}, "is not supported"),
+])
+def test_invalid_request_is_rejected(service, fake_browsers, request_data, message):
+    with pytest.raises(exceptions.RenderServiceRequestError, match=message) as e:
+        service.render(request_data)
+
+    assert e.value.status_code == 400
+    assert all(browser.browser.screenshots == 0 for browser in fake_browsers)
+
+
+def test_twit_image_is_rendered(service, oembed_server, fake_browsers):
+    twit, image = service.render({"url": TWIT_URL})
+
+    assert image == FAKE_PNG
+    assert twit.url == TWIT_URL
+    assert oembed_server.requests == 1
+    assert sum(browser.browser.screenshots for browser in fake_browsers) == 1
+
+
+def test_twit_is_rendered_without_image_response(service, app_config):
+    twit, image = service.render({"url": TWIT_URL, "response": "path"})
+
+    assert image is None
+    assert twit.url == TWIT_URL
+
+
+def test_oembed_api_error_is_bad_gateway(service, app_config, oembed_server):
+    app_config.embed_api.url = f"{oembed_server.base_url}/missing"
+
+    with pytest.raises(exceptions.RenderServiceRequestError) as e:
+        service.render({"url": TWIT_URL})
+
+    assert e.value.status_code == 502
+
+
+def test_requests_over_queue_are_rejected(processor, monkeypatch):
+    service = RenderService(processor, concurrency=1, max_queue=0, logger=logging.getLogger("downloadTwits"))
+    started, finished = threading.Event(), threading.Event()
+    process_twit = processor.process_twit
+
+    def blocked_process_twit(*args, **kwargs):
+        started.set()
+        finished.wait(10)
+        return process_twit(*args, **kwargs)
+
+    monkeypatch.setattr(processor, "process_twit", blocked_process_twit)
+    results = list()
+    thread = threading.Thread(target=lambda: results.append(service.render({"url": TWIT_URL})))
+    thread.start()
+    try:
+        assert started.wait(10)
+        with pytest.raises(exceptions.RenderServiceRequestError) as e:
+            service.render({"url": TWIT_URL})
+        assert e.value.status_code == 503
+    finally:
+        finished.set()
+        thread.join(30)
+
+    # Slot is released after render
+    assert results[0][1] == FAKE_PNG
+    assert service.render({"url": TWIT_URL})[1] == FAKE_PNG
+
+
+def test_render_endpoint(service_url):
+    status_code, headers, body = post(f"{service_url}/render", json.dumps({"url": TWIT_URL}).encode('utf-8'))
+    assert (status_code, headers["Content-Type"], body) == (200, "image/png", FAKE_PNG)
+
+    status_code, headers, body = post(
+        f"{service_url}/render", json.dumps({"url": TWIT_URL, "response": "path"}).encode('utf-8')
+    )
+    assert status_code == 200
+    assert json.loads(body)["url"] == TWIT_URL
+
+    status_code, headers, body = post(f"{service_url}/render", b"not json")
+    assert status_code == 400
+    assert json.loads(body) == {"error": "Request body should be JSON."}
+
+    status_code, headers, body = post(f"{service_url}/render", json.dumps({"url": "twit"}).encode('utf-8'))
+    assert status_code == 400
+
+
+def test_health_endpoint(service_url):
+    with urllib.request.urlopen(f"{service_url}/health", timeout=10) as response:
+        assert response.status == 200
+        assert json.loads(response.read())["status"] == "ok"
@@ -0,0 +1,151 @@
+import sys
+
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+import exceptions
+import models
+from conftest import ROOT_PATH
+from helpers.shard_queue import ShardQueue
+
+SHARD_SCRIPT = os.path.join(ROOT_PATH, "src", "shard.py")
+
+
+def create_twits(count: int) -> list:
+    return [models.Twit({"url": f"https://twitter.com/jack/status/{no}"}) for no in range(1, count + 1)]
+
+
+def expire_lease(shard_path: str):
+    expired = time.time() - 60
+    os.utime(shard_path, (expired, expired))
+
+
+def test_twits_are_split_into_shards(tmp_path):
+    queue = ShardQueue.create(str(tmp_path / "queue"), create_twits(5), shard_size=2)
+
+    assert queue.info["shards"] == 3
+    assert queue.info["twits"] == 5
+    assert queue.status() == {"shards": 3, "pending": 3, "claimed": 0, "done": 0}
+    with pytest.raises(exceptions.ShardQueueException, match="already exists"):
+        ShardQueue.create(str(tmp_path / "queue"), create_twits(1))
+
+
+def test_shard_is_claimed_by_one_worker(tmp_path):
+    ShardQueue.create(str(tmp_path / "queue"), create_twits(5), shard_size=2)
+    first_queue, second_queue = ShardQueue(str(tmp_path / "queue")), ShardQueue(str(tmp_path / "queue"))
+
+    shards = [first_queue.claim("first"), second_queue.claim("second"), first_queue.claim("first")]
+
+    assert [shard.name for shard in shards] == [ShardQueue.get_shard_name(no) for no in (1, 2, 3)]
+    assert first_queue.claim("first") is None
+    assert first_queue.status() == {"shards": 3, "pending": 0, "claimed": 3, "done": 0}
+    assert [twit.url for twit in models.Twits.iter_from_file(shards[1].path)] == \
+        [twit.url for twit in create_twits(4)[2:]]
+
+
+def test_expired_shard_is_claimed_again(tmp_path):
+    queue = ShardQueue.create(str(tmp_path / "queue"), create_twits(2), shard_size=2, lease_timeout=30)
+    shard = queue.claim("dead")
+
+    # Shard of live worker is not claimed
+    assert queue.claim("other") is None
+    expire_lease(shard.path)
+    claimed_shard = queue.claim("other")
+
+    assert claimed_shard.name == shard.name
+    assert claimed_shard.path != shard.path
+    assert not os.path.exists(shard.path)
+
+
+def test_heartbeat_extends_lease(tmp_path):
+    queue = ShardQueue.create(str(tmp_path / "queue"), create_twits(2), shard_size=2, lease_timeout=30)
+    shard = queue.claim("worker")
+    expire_lease(shard.path)
+
+    queue.heartbeat(shard)
+
+    assert queue.requeue_expired() == 0
+    assert queue.status()["claimed"] == 1
+
+
+def test_shard_completed_after_lease_is_expired_is_done(tmp_path):
+    queue = ShardQueue.create(str(tmp_path / "queue"), create_twits(2), shard_size=2, lease_timeout=30)
+    shard = queue.claim("slow")
+    expire_lease(shard.path)
+    assert queue.requeue_expired() == 1
+
+    output_filename = queue.get_output_filename("slow", shard)
+    writer = models.TwitsWriter(output_filename)
+    writer.write(create_twits(1)[0])
+    writer.close()
+    queue.complete(shard, output_filename)
+
+    assert queue.status() == {"shards": 1, "pending": 0, "claimed": 0, "done": 1}
+    assert queue.is_finished()
+
+
+def test_results_are_read_in_order_of_shards(tmp_path):
+    queue = ShardQueue.create(str(tmp_path / "queue"), create_twits(5), shard_size=2)
+    shards = [queue.claim("worker") for _ in range(3)]
+    with pytest.raises(exceptions.ShardQueueException, match="is not finished"):
+        list(queue.iter_results())
+
+    # Shards are completed in reverse order
+    for shard in reversed(shards):
+        output_filename = queue.get_output_filename("worker", shard)
+        writer = models.TwitsWriter(output_filename)
+        for twit in models.Twits.iter_from_file(shard.path):
+            writer.write(twit)
+        writer.close()
+        queue.complete(shard, output_filename)
+        if shard is shards[1]:
+            assert [twit.url for twit in queue.iter_results(partial=True)] == \
+                [twit.url for twit in create_twits(5)[2:]]
+
+    assert [twit.url for twit in queue.iter_results()] == [twit.url for twit in create_twits(5)]
+
+
+def test_workers_process_shards_and_results_are_merged_in_order(tmp_path, oembed_server):
+    config_filename = str(tmp_path / "config.json")
+    with open(config_filename, 'w', encoding='utf-8') as f:
+        json.dump({
+            "headless_browser": {"name": "chrome", "executable_path": "chromedriver"},
+            "embed_api": {"url": oembed_server.oembed_url, "max_retries": 0},
+            "download": {"path": str(tmp_path / "images")},
+        }, f)
+    twits_filename = str(tmp_path / "twits.jsonl")
+    writer = models.TwitsWriter(twits_filename)
+    for twit in create_twits(23):
+        writer.write(twit)
+    writer.close()
+    queue_path = str(tmp_path / "queue")
+    output_filename = str(tmp_path / "twits.output.jsonl")
+
+    def shard_command(*args: str) -> list:
+        return [sys.executable, SHARD_SCRIPT, "--queue", queue_path, "--config-file", config_filename, *args]
+
+    subprocess.run(shard_command("--twits-file", twits_filename, "--shard-size", "3", "split"), check=True)
+    # Worker died while processing the first shard, so shard is processed again after lease timeout
+    expire_lease(ShardQueue(queue_path).claim("dead").path)
+    workers = [
+        subprocess.Popen(
+            shard_command("--worker-id", f"worker-{no}", "--lease-timeout", "30", "--poll-interval", "0.1",
+                          "--no-embed-cache", "--text-only", "work"),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
+        )
+        for no in range(3)
+    ]
+    logs = [worker.communicate(timeout=120)[0] for worker in workers]
+    subprocess.run(shard_command("--output-twits-file", output_filename, "merge"), check=True)
+
+    assert [worker.returncode for worker in workers] == [0, 0, 0]
+    # Every shard is processed once
+    assert sum(log.count("is done.") for log in logs) == 8
+    assert oembed_server.requests == 23
+    merged_twits = list(models.Twits.iter_from_file(output_filename))
+    assert [twit.url for twit in merged_twits] == [twit.url for twit in create_twits(23)]
+    assert all(twit.text for twit in merged_twits)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import exceptions
+import models
+
+
+def write_lines(path: str, lines: list):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_twits_are_read_from_json_lines_file(tmp_path):
+    path = str(tmp_path / "twits.jsonl")
+    write_lines(path, [
+        json.dumps({"url": "https://twitter.com/jack/status/1"}),
+        "",
+        json.dumps({"url": "https://twitter.com/jack/status/2", "links": ["https://example.com"]}),
+    ])
+
+    twits = list(models.Twits.iter_from_file(path))
+
+    assert [twit.url for twit in twits] == ["https://twitter.com/jack/status/1", "https://twitter.com/jack/status/2"]
+    assert twits[1].links == ["https://example.com"]
+
+
+def test_twits_are_read_one_by_one(tmp_path):
+    path = str(tmp_path / "twits.jsonl")
+    write_lines(path, [json.dumps({"url": "https://twitter.com/jack/status/1"}), "not json"])
+
+    twits = models.Twits.iter_from_file(path)
+
+    # Invalid line is found only when it's read
+    assert next(twits).url == "https://twitter.com/jack/status/1"
+    with pytest.raises(exceptions.TwitsConfigValidationError, match="at line 2"):
+        next(twits)
+
+
+def test_invalid_twit_is_reported_with_line_number(tmp_path):
+    path = str(tmp_path / "twits.jsonl")
+    write_lines(path, [json.dumps({"url": "https://twitter.com/jack/status/1"}), json.dumps({"text": "no URL"})])
+
+    with pytest.raises(exceptions.TwitsConfigValidationError, match="at line 2"):
+        list(models.Twits.iter_from_file(path))
+    with pytest.raises(exceptions.TwitsConfigValidationError, match="is not found"):
+        list(models.Twits.iter_from_file(str(tmp_path / "missing.jsonl")))
+
+
+def test_twits_are_written_one_by_one(tmp_path):
+    path = str(tmp_path / "twits.output.jsonl")
+    twits = [models.Twit({"url": f"https://twitter.com/jack/status/{no}", "text": f"Twit {no}"}) for no in (1, 2)]
+
+    with models.TwitsWriter(path) as writer:
+        writer.write(twits[0])
+        # Written twit is flushed, so it's saved, even if processing is interrupted
+        with open(path, 'r', encoding='utf-8') as f:
+            assert [json.loads(line)["url"] for line in f] == [twits[0].url]
+        writer.write(twits[1])
+
+    assert [(twit.url, twit.text) for twit in models.Twits.iter_from_file(path)] == \
+        [(twit.url, twit.text) for twit in twits]
+
+
+def test_json_lines_file_is_detected_by_extension():
+    assert models.Twits.is_json_lines_file("twits.jsonl")
+    assert models.Twits.is_json_lines_file("twits.NDJSON")
+    assert not models.Twits.is_json_lines_file("twits.json")
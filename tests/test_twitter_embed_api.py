@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+import types
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import exceptions
+from helpers.embed_cache import EmbedCache
+from helpers.rate_limiter import RateLimiter
+from helpers.twitter_embed_api import TwitterEmbedAPI
+
+TWIT_URL = "https://twitter.com/jack/status/20"
+
+
+def test_embed_html_is_returned_from_oembed_api(oembed_server):
+    html = TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {}, api_url=oembed_server.oembed_url)
+
+    assert "twitter-tweet" in html
+    # Widgets script of fixture is loaded from local server
+    assert oembed_server.widgets_url in html
+    assert oembed_server.requests == 1
+
+
+def test_cached_embed_html_is_not_requested_again(oembed_server, tmp_path):
+    cache = EmbedCache(str(tmp_path / "embeds.sqlite"))
+
+    html = TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {}, api_url=oembed_server.oembed_url, cache=cache)
+    cached_html = TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {}, api_url=oembed_server.oembed_url, cache=cache)
+
+    assert cached_html == html
+    assert oembed_server.requests == 1
+
+    # Embeds with other parameters are cached separately
+    TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {"theme": "dark"}, api_url=oembed_server.oembed_url, cache=cache)
+    assert oembed_server.requests == 2
+
+
+def test_cached_embed_html_is_refreshed(oembed_server, tmp_path):
+    cache = EmbedCache(str(tmp_path / "embeds.sqlite"))
+    cache.put(cache.get_key("20", {}), "<p>stale</p>")
+
+    html = TwitterEmbedAPI.get_twit_embed_html(
+        TWIT_URL, {}, api_url=oembed_server.oembed_url, cache=cache, refresh_cache=True
+    )
+
+    assert html != "<p>stale</p>"
+    assert cache.get(cache.get_key("20", {})) == html
+    assert oembed_server.requests == 1
+
+
+class ScriptedRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(time.monotonic())
+        status_code, headers, body = self.server.responses.pop(0) if self.server.responses else self.server.last
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def scripted_server():
+    """
+    Local oEmbed API, that returns scripted responses in order; the last response is repeated.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedRequestHandler)
+    server.daemon_threads = True
+    server.requests = list()
+    server.responses = list()
+    server.last = (200, {"Content-Type": "application/json"}, json.dumps({"html": "<p>twit</p>"}).encode('utf-8'))
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/oembed"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_is_retried_after_retry_after_delay(scripted_server):
+    scripted_server.responses = [
+        (429, {"Retry-After": "0.3"}, b"Rate limit exceeded."),
+        (503, {}, b"Service unavailable."),
+    ]
+    rate_limiter = RateLimiter()
+
+    html = TwitterEmbedAPI.get_twit_embed_html(
+        TWIT_URL, {}, api_url=scripted_server.url, max_retries=2, backoff_factor=0.01, rate_limiter=rate_limiter
+    )
+
+    assert html == "<p>twit</p>"
+    assert len(scripted_server.requests) == 3
+    # Retry-After of rate-limited response is respected; backoff is used without it
+    assert scripted_server.requests[1] - scripted_server.requests[0] >= 0.3
+    assert scripted_server.requests[2] - scripted_server.requests[1] < 0.3
+    assert (rate_limiter.requests, rate_limiter.throttled) == (3, 2)
+
+
+def test_error_is_raised_when_retries_are_exhausted(scripted_server):
+    scripted_server.last = (503, {"Retry-After": "0"}, b"Service unavailable.")
+
+    with pytest.raises(exceptions.TwitterAPIRequestError, match="503"):
+        TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {}, api_url=scripted_server.url, max_retries=2)
+    assert len(scripted_server.requests) == 3
+
+
+def test_client_error_is_not_retried(scripted_server):
+    scripted_server.last = (404, {}, b"Not found.")
+
+    with pytest.raises(exceptions.TwitterAPIRequestError, match="404"):
+        TwitterEmbedAPI.get_twit_embed_html(TWIT_URL, {}, api_url=scripted_server.url, max_retries=2)
+    assert len(scripted_server.requests) == 1
+
+
+def test_connection_error_is_retried_and_raised():
+    # Nothing listens on closed server port
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedRequestHandler)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/oembed"
+    server.server_close()
+    rate_limiter = RateLimiter()
+
+    with pytest.raises(exceptions.TwitterAPIRequestError):
+        TwitterEmbedAPI.get_twit_embed_html(
+            TWIT_URL, {}, api_url=api_url, max_retries=1, backoff_factor=0.01, rate_limiter=rate_limiter
+        )
+    assert (rate_limiter.requests, rate_limiter.throttled) == (2, 2)
+
+
+def test_retry_delay():
+    def response(retry_after: str or None):
+        return types.SimpleNamespace(headers={"Retry-After": retry_after} if retry_after is not None else {})
+
+    assert TwitterEmbedAPI.get_retry_delay(response("5"), 3, 1.0) == 5.0
+    assert TwitterEmbedAPI.get_retry_delay(response("-5"), 0, 1.0) == 0.0
+    retry_date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < TwitterEmbedAPI.get_retry_delay(response(retry_date), 0, 1.0) <= 30
+    # Invalid or missing Retry-After: exponential backoff
+    assert TwitterEmbedAPI.get_retry_delay(response("soon"), 2, 0.5) == 2.0
+    assert TwitterEmbedAPI.get_retry_delay(response(None), 0, 0.5) == 0.5
+    assert TwitterEmbedAPI.get_retry_delay(None, 3, 1.0) == 8.0